@@ -10,6 +10,7 @@ setup(name='Berrymill',
           where="src"
           ),
       package_dir={"": "src"},
+      package_data={"": ["manifest.yaml"]},
       #packages=['src/berry_mill', 'src/berry_mill/imgdescr'],
       zip_safe=False,
      )
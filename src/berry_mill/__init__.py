@@ -1,17 +1,47 @@
-from berry_mill.mill import ImageMill
+from __future__ import annotations
+
+from typing import Any
 from berry_mill.plugins import PluginException
 
 version = "0.3"
 
 
+def __getattr__(name: str) -> Any:
+    """
+    CLI machinery is imported only when used, so the library parts
+    (e.g. the description engine) are importable on their own.
+    """
+    if name == "ImageMill":
+        from berry_mill.mill import ImageMill
+
+        return ImageMill
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def main() -> None:
     """
-    Main runtime
+    Main runtime, the job is passed to the daemon, if it is running
+    """
+    import sys
+
+    if "serve" not in sys.argv[1:]:
+        from berry_mill.daemon import forward
+
+        code: int | None = forward(sys.argv)
+        if code is not None:
+            sys.exit(code)
+
+    run_local()
+
+
+def run_local() -> None:
+    """
+    Run berrymill in the current process
     """
 
-    from typing import Any
     import sys
     import kiwi.logger  # type: ignore
+    from berry_mill.mill import ImageMill
 
     log = kiwi.logging.getLogger("kiwi")
 
@@ -0,0 +1,312 @@
+"""
+Python API to build images without the command line.
+
+Builds do not touch process-global state: there is no argument parsing,
+the working directory is not changed, the command line is never replaced
+for longer than kiwi needs to read it, and failures are returned as
+results instead of exiting the process.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+from typing_extensions import Unpack
+import kiwi.logger  # type: ignore
+from berry_mill.appliance import ApplianceStage
+from berry_mill.cfgh import ConfigHandler
+from berry_mill.localrepos import add_local_repos
+from berry_mill.params import KiwiBuildOptions
+from berry_mill.repokeys import RepoKeys
+from berry_mill.sysinfo import get_local_arch
+from berry_mill.tracing import Span, span, traced, tracer
+
+log = kiwi.logging.getLogger("kiwi")
+
+
+class BuildResult:
+    """
+    Result of one image build
+    """
+
+    def __init__(
+        self,
+        description: str,
+        profile: str | None = None,
+        arch: str = "",
+        target_dir: str = "",
+        ok: bool = False,
+        error: str = "",
+        time: float = 0.0,
+        cached: bool = False,
+    ) -> None:
+        self.description: str = description
+        self.profile: str | None = profile
+        self.arch: str = arch
+        self.target_dir: str = target_dir  # Directory of the image results: target_dir/image_name[/profile]
+        self.ok: bool = ok
+        self.error: str = error
+        self.time: float = time
+        self.cached: bool = cached  # Image results were restored from the build cache
+
+    @property
+    def artifacts(self) -> List[str]:
+        """
+        Paths of all files in the image results directory
+        """
+        out: List[str] = []
+        if self.ok and os.path.isdir(self.target_dir):
+            for root, _, files in os.walk(self.target_dir):
+                out += [os.path.join(root, f) for f in files]
+        return sorted(out)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__, artifacts=self.artifacts)
+
+    def __repr__(self) -> str:
+        return "<{} of {} ({}, {}): {}>".format(
+            self.__class__.__name__, self.description, self.profile, self.arch, self.ok and "ok" or self.error
+        )
+
+
+def load_config(*config: str) -> ConfigHandler:
+    """
+    Load configuration: the default one, overlaid by the given config files in order
+    """
+    cfg: ConfigHandler = ConfigHandler()
+    for pth in config:
+        cfg.add_config(pth)
+    cfg.load()
+    add_local_repos(cfg)
+    return cfg
+
+
+def _get_cross(arch: str, host: str, cross: bool = False, local: bool = False) -> bool:
+    """
+    Whether the architecture is cross built on the host.
+    Raises an exception, if the host is unable to build it.
+    """
+    if arch == host and not cross:
+        return False
+    if cross and arch != "arm64":
+        raise Exception(f"Cross build targets arm64, not {arch}")
+    if host != "amd64" or arch != "arm64" or local:
+        raise Exception(f"Unable to build {arch} image on {host} host")
+    return True
+
+
+def build(
+    description: str,
+    target_dir: str,
+    profile: str | None = None,
+    arch: str | None = None,
+    repos: Dict[str, Dict[str, str]] | None = None,
+    config: ConfigHandler | None = None,
+    prune_profiles: bool = False,
+    **kw: Unpack[KiwiBuildOptions],
+) -> BuildResult:
+    """
+    Build an image of the description into target_dir/image_name[/profile].
+
+    Repositories are taken as given for the target architecture, or from
+    the configuration (loaded with load_config() if not given). Other
+    keywords are build parameters, as the ones of the command line; the boxed
+    plugin configuration defaults to boxed_plugin_conf of the configuration.
+    An arm64 image is cross built on an amd64 host, other architectures
+    than the host one fail.
+    """
+    # Cross build implies an amd64 host and an arm64 target
+    host: str = get_local_arch()
+    arch = arch or (kw.get("cross") and "arm64" or host)
+    res: BuildResult = BuildResult(os.path.abspath(description), profile=profile, arch=arch)
+    opts: Dict[str, Any] = dict(kw)
+    try:
+        opts["cross"] = _get_cross(arch, host, cross=bool(kw.get("cross")), local=bool(kw.get("local")))
+    except Exception as exc:
+        res.error = str(exc)
+        return res
+
+    def setup() -> Tuple[ApplianceStage, Dict[str, Dict[str, str]]]:
+        cfg: ConfigHandler | None = config
+        if repos is None:
+            cfg = cfg or load_config()
+        if cfg is not None:
+            opts.setdefault("boxed_plugin_conf", cfg.config.get("boxed_plugin_conf") or "")
+        stage: ApplianceStage = ApplianceStage(
+            description,
+            profile=prune_profiles and profile or None,
+            cache_dir=cfg is not None and cfg.config.get("cache_dir") or "",
+        )
+        return stage, repos if repos is not None else cfg.get_repos(arch)  # type: ignore [union-attr]
+
+    return _build(res, target_dir, setup, opts)
+
+
+def _build(
+    res: BuildResult,
+    target_dir: str,
+    setup: Callable[[], Tuple[ApplianceStage, Dict[str, Dict[str, str]]]],
+    kw: Mapping[str, Any],
+) -> BuildResult:
+    """
+    Build an image, setup gives the appliance stage and the repositories
+    """
+    from berry_mill.builder import KiwiBuilder
+
+    start: float = time.monotonic()
+    stage: ApplianceStage | None = None
+    builder: KiwiBuilder | None = None
+    try:
+        stage, repos = setup()
+        params: Dict[str, Any] = dict(
+            kw, profile=res.profile, target_dir=os.path.abspath(target_dir), debug=kw.get("debug", False)
+        )
+        builder = KiwiBuilder(stage.setup(), **params)
+        with span("repo.setup"):
+            builder.add_repos({rname: dict(repo) for rname, repo in repos.items()})
+
+        res.target_dir = builder.get_target_dir()
+        res.ok = builder.process()
+        res.cached = builder.cached
+        if not res.ok:
+            res.error = "Build failed, see the log for details"
+    except SystemExit as exc:
+        # Wrappers exit on errors, which they have logged already
+        res.error = str(exc.code) if isinstance(exc.code, str) else "Build failed, see the log for details"
+    except Exception as exc:
+        log.error(f"Build of {res.description} failed: {exc}")
+        res.error = str(exc)
+    finally:
+        if builder is not None:
+            builder.cleanup()
+        if stage is not None:
+            stage.cleanup()
+        res.time = time.monotonic() - start
+
+    return res
+
+
+def _build_cell(
+    res: BuildResult, target_dir: str, stage: ApplianceStage, repos: Dict[str, Dict[str, str]], kw: Dict[str, Any]
+) -> BuildResult:
+    with span("build", profile=res.profile or "", arch=res.arch):
+        return _build(res, target_dir, lambda: (stage, repos), kw)
+
+
+def _build_cell_process(*args: Any) -> Tuple[BuildResult, List[Span]]:
+    """
+    Build a cell in a worker process, returning also its spans to the tracer of the parent
+    """
+    tracer.reset()
+    return _build_cell(*args), tracer.spans
+
+
+@traced("build.matrix")
+def build_matrix(
+    description: str,
+    target_dir: str,
+    profiles: List[str] | None = None,
+    archs: List[str] | None = None,
+    jobs: int = 2,
+    repos: Dict[str, Dict[str, Dict[str, str]]] | None = None,
+    config: ConfigHandler | None = None,
+    prune_profiles: bool = False,
+    **kw: Unpack[KiwiBuildOptions],
+) -> List[BuildResult]:
+    """
+    Build the description for every combination of the profiles and the architectures,
+    running up to the given number of builds in parallel processes.
+    Returns results of all the cells, by profiles, then architectures.
+
+    Description is rendered once per profile and keys of all repositories
+    are fetched once. Repositories are given by architectures or taken from
+    the configuration. Results of each architecture, if given, are stored in
+    target_dir/arch/image_name/profile. Without profiles, the description is built without any.
+    """
+    host: str = get_local_arch()
+    all_profiles: List[str | None] = [p for p in profiles] if profiles else [None]
+    cells: List[BuildResult] = [
+        BuildResult(os.path.abspath(description), profile=p, arch=a)
+        for p in all_profiles
+        for a in (archs or [kw.get("cross") and "arm64" or host])
+    ]
+
+    keys: RepoKeys | None = None
+    todo: List[Tuple[BuildResult, str, ApplianceStage, Dict[str, Dict[str, str]], Dict[str, Any]]] = []
+    try:
+        cfg: ConfigHandler | None = config
+        if repos is None:
+            cfg = cfg or load_config()
+
+        keys = RepoKeys(offline=bool(kw.get("offline")))
+        resolved: Dict[str, Dict[str, Dict[str, str]]] = {}
+        stages: Dict[str | None, ApplianceStage] = {}
+        for res in cells:
+            # Without pruning, the rendered description is the same for all profiles
+            profile: str | None = prune_profiles and res.profile or None
+            if profile not in stages:
+                stages[profile] = ApplianceStage(
+                    description, profile=profile, cache_dir=cfg is not None and cfg.config.get("cache_dir") or ""
+                )
+                stages[profile].render()
+
+            cell_kw: Dict[str, Any] = dict(kw)
+            if cfg is not None:
+                cell_kw.setdefault("boxed_plugin_conf", cfg.config.get("boxed_plugin_conf") or "")
+            try:
+                cell_kw["cross"] = _get_cross(res.arch, host, cross=bool(kw.get("cross")), local=bool(kw.get("local")))
+            except Exception as exc:
+                res.error = str(exc)
+                continue
+
+            if res.arch not in resolved:
+                resolved[res.arch] = keys.resolve(
+                    repos.get(res.arch, {}) if repos is not None else cfg.get_repos(res.arch)  # type: ignore [union-attr]
+                )
+            cell_target: str = archs and os.path.join(target_dir, res.arch) or target_dir
+            todo.append((res, cell_target, stages[profile].copy(), resolved[res.arch], cell_kw))
+
+        if jobs > 1 and len(todo) > 1:
+            from concurrent.futures import Future, ProcessPoolExecutor
+
+            # Kiwi keeps its state in globals, so each build gets a process on its own
+            with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+                futures: List[Future] = [pool.submit(_build_cell_process, *args) for args in todo]
+                for args, f in zip(todo, futures):
+                    try:
+                        cells[cells.index(args[0])], spans = f.result()
+                        tracer.extend(spans)
+                    except Exception as exc:
+                        args[0].error = f"Build process failed: {exc}"
+        else:
+            for args in todo:
+                _build_cell(*args)
+    except SystemExit:
+        # Wrappers exit on errors, which they have logged already
+        for res in cells:
+            res.error = res.error or "Build failed, see the log for details"
+    except Exception as exc:
+        log.error(f"Build of {description} failed: {exc}")
+        for res in cells:
+            res.error = res.error or str(exc)
+    finally:
+        if keys is not None:
+            keys.cleanup()
+
+    return cells
+
+
+def report(results: List[BuildResult]) -> str:
+    """
+    Human-readable report of the build results
+    """
+    rows: List[Tuple[str, ...]] = [("PROFILE", "ARCH", "RESULT", "TIME, s", "TARGET / ERROR")]
+    for r in results:
+        status: str = r.ok and (r.cached and "cached" or "ok") or "FAILED"
+        rows.append((r.profile or "-", r.arch, status, "{:.1f}".format(r.time), r.ok and r.target_dir or r.error))
+
+    widths: List[int] = [max([len(row[i]) for row in rows]) for i in range(4)]
+    out: List[str] = ["  ".join([c.ljust(w) for c, w in zip(row[:4], widths)] + [row[4]]) for row in rows]
+    out.append("{} of {} builds succeeded".format(len([r for r in results if r.ok]), len(results)))
+    return "\n".join(out)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import copy
+import shutil
+from tempfile import mkdtemp
+from typing import Tuple
+import kiwi.logger  # type: ignore
+import lxml.etree as ET  # type: ignore
+from berry_mill.imgdescr.loader import Loader
+from berry_mill.imgdescr.cache import DescriptionCache, get_cache_dir
+from berry_mill.imgdescr.rendered import RenderedDescription
+from berry_mill.tracing import span, traced
+
+log = kiwi.logging.getLogger("kiwi")
+
+
+def get_appliance_path_info(image: str) -> Tuple[str, str]:
+    """
+    Return Appliance Dirname, Basename.
+    If no image is given, the first description in the current directory is taken.
+    """
+
+    appliance_path: str = os.path.abspath(os.path.dirname(image or "."))
+    if appliance_path == ".":
+        appliance_path = ""
+
+    appliance_descr: str = os.path.basename(image or ".")
+    if appliance_descr == ".":
+        appliance_descr = ""
+
+    if not appliance_path:
+        for pth in os.listdir(appliance_path or "."):
+            if pth.split(".")[-1] in ["kiwi", "xml"]:
+                appliance_descr = pth
+                appliance_path = os.path.abspath(os.getcwd())
+                break
+
+    if not appliance_descr:
+        raise Exception("Appliance description was not found.")
+
+    if not appliance_path:
+        raise Exception("Appliance Path not found")
+
+    return appliance_path, appliance_descr
+
+
+class ApplianceStage:
+    """
+    Rendered appliance description, staged for kiwi.
+
+    Each build gets a private work directory next to the description, where
+    the rendered description is written and the entries of the appliance kiwi reads
+    (and of the base one for derived descriptions) are hard-linked, directories
+    as trees of hard links. There are no symlinks to the host paths, which would
+    dangle in the box VM. Originals are never moved or changed, so any number of
+    builds can run from the same directory at once.
+    """
+
+    PREFIX: str = ".berrymill-build-"
+    # Entries of the description directory, kiwi reads on its own
+    ENTRIES: list[str] = [
+        "root",
+        "root.tar.gz",
+        "config.sh",
+        "config-overlay.sh",
+        "config-host-overlay.sh",
+        "images.sh",
+        "disk.sh",
+        "pre_disk_sync.sh",
+        "post_bootstrap.sh",
+        "edit_boot_config.sh",
+        "edit_boot_install.sh",
+    ]
+    ENTRY_PREFIXES: list[str] = ["config-cdroot.tar"]
+    # Attributes of the description, which may refer to files next to it
+    REFS: list[str] = ["//archive/@name", "//file/@name", "//repository/@customize", "//source/@path", "//signing/@key"]
+
+    def __init__(self, image: str, profile: str | None = None, cache_dir: str = "") -> None:
+        """
+        If profile is given, sections of all other profiles are dropped from the rendered description.
+        """
+        self.path, self.descr = get_appliance_path_info(image)
+        self.abspath: str = os.path.join(self.path, self.descr)
+        self.profile: str | None = profile
+        self.cache_dir: str = cache_dir or get_cache_dir()
+        self.rendered: RenderedDescription | None = None
+        self.work_dir: str = ""
+
+        # Rendering, shared by copies of the stage
+        self._xml: str = ""
+        self._dom: ET.Element | None = None
+        self._is_derived: bool = False
+        self._main_pth: str = ""
+
+    def render(self) -> None:
+        """
+        Render the appliance description, unless already rendered
+        """
+        if self._xml:
+            return
+
+        appliance_loader: Loader = Loader(profile=self.profile)
+        with span("description.render", description=self.abspath, profile=self.profile or ""):
+            self._xml = DescriptionCache(os.path.join(self.cache_dir, "descr")).load(self.abspath, appliance_loader)
+        # Cached descriptions have no tree and are parsed only if needed
+        self._dom = appliance_loader.dom
+        self._is_derived = appliance_loader.is_derived
+        self._main_pth = appliance_loader.main_appliance_pth
+
+    def copy(self) -> ApplianceStage:
+        """
+        Another stage of the same rendered description, e.g. to build it for other architectures.
+        It has its own work directory and parses the rendered description on its own.
+        """
+        self.render()
+        out: ApplianceStage = copy.copy(self)
+        out.rendered = None
+        out.work_dir = ""
+        out._dom = None
+        return out
+
+    @staticmethod
+    def _link_file(src: str, dst: str) -> None:
+        """
+        Hard-link a file, copy it if that is not possible
+        """
+        try:
+            os.link(src, dst)
+        except OSError as exc:
+            # Other file system or not allowed
+            log.debug(f"Unable to hard-link {src}, copying it: {exc}")
+            shutil.copy2(src, dst)
+
+    def _link(self, src: str, dst: str) -> None:
+        """
+        Link an appliance entry to the work directory, directories are hard-link copied.
+        Symlinked entries are staged as their targets, since the work directory is one level deeper
+        and relative links would not resolve from there. Symlinks inside the trees,
+        e.g. of the root overlay, are kept as they are.
+        """
+        if os.path.islink(src):
+            if not os.path.exists(src):
+                log.warning(f"Skipping dangling link {src}")
+                return
+            src = os.path.realpath(src)
+
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, symlinks=True, copy_function=self._link_file)
+        else:
+            self._link_file(src, dst)
+
+    def _get_refs(self) -> set[str]:
+        """
+        Top entries of the description directory, which the rendered description refers to
+        or which are overlays of its profiles
+        """
+        assert self.rendered is not None
+        out: set[str] = set(self.rendered.profiles)
+        for ref in self.rendered.dom.xpath("|".join(self.REFS)):
+            ref = str(ref)
+            if ref.startswith("this://"):
+                ref = ref[len("this://") :]
+            elif "://" in ref:
+                continue
+            ref = os.path.normpath(ref)
+            if not os.path.isabs(ref) and not ref.startswith(os.pardir):
+                out.add(ref.split(os.sep)[0])
+
+        return out
+
+    def _link_all(self, src_dir: str, names: set[str], skip: list[str] | None = None) -> None:
+        """
+        Link the entries of the directory kiwi reads, those are not in the work directory yet.
+        Anything else, such as other descriptions, build results or work directories
+        of the other builds, is not staged.
+        """
+        for entry in os.scandir(src_dir):
+            if entry.name.startswith(self.PREFIX) or entry.name in (skip or []):
+                continue
+            if entry.name not in names and not [p for p in self.ENTRY_PREFIXES if entry.name.startswith(p)]:
+                continue
+            dst: str = os.path.join(self.work_dir, entry.name)
+            if os.path.lexists(dst):
+                continue
+            self._link(entry.path, dst)
+
+    @traced("appliance.stage")
+    def setup(self) -> RenderedDescription:
+        """
+        Render the appliance description to the work directory and link everything else kiwi needs
+        """
+        self.render()
+        self.work_dir = mkdtemp(prefix=self.PREFIX, dir=self.path)
+        self.rendered = RenderedDescription(os.path.join(self.work_dir, self.descr), dom=self._dom, xml=self._xml)
+        self.rendered.write()
+
+        names: set[str] = set(self.ENTRIES) | self._get_refs()
+        self._link_all(self.path, names, skip=[self.descr])
+        if self._is_derived:
+            main_appliance_dir = os.path.dirname(os.path.abspath(self._main_pth))
+            log.debug(f"Base Appliance detected under: {main_appliance_dir}")
+            # Kiwi gets only the rendered description
+            self._link_all(main_appliance_dir, names, skip=[os.path.basename(self._main_pth)])
+
+        log.debug(f"Appliance is staged at {self.work_dir}")
+        return self.rendered
+
+    def cleanup(self) -> None:
+        """
+        Remove the work directory. Links are removed, their originals stay.
+        """
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir = ""
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+import kiwi.logger  # type: ignore
+from berry_mill.imgdescr.cache import get_cache_dir
+from berry_mill.tracing import traced
+
+log = kiwi.logging.getLogger("kiwi")
+
+# Scripts kiwi runs from the appliance directory
+HOOK_SCRIPTS: List[str] = [
+    "config.sh",
+    "images.sh",
+    "config-overlay.sh",
+    "config-host-overlay.sh",
+    "post_bootstrap.sh",
+    "pre_disk_sync.sh",
+    "disk.sh",
+    "edit_boot_config.sh",
+    "edit_boot_install.sh",
+]
+
+
+def parse_size(size: str | int) -> int:
+    """
+    Parse size in bytes with an optional K, M, G or T suffix, e.g. "20G"
+    """
+    m = re.fullmatch(r"\s*(\d+)\s*([KMGT]?)i?B?\s*", str(size), re.IGNORECASE)
+    if m is None:
+        raise Exception(f'Wrong size "{size}", expected a number with an optional K, M, G or T suffix')
+    return int(m.group(1)) << (10 * " KMGT".index(m.group(2).upper() or " "))
+
+
+class BuildDigest:
+    """
+    Digest over everything a build result depends on
+    """
+
+    def __init__(self) -> None:
+        import berry_mill
+        from kiwi.version import __version__ as kiwi_version  # type: ignore
+
+        self._h = hashlib.sha256(f"berrymill {getattr(berry_mill, 'version', '')}\0kiwi {kiwi_version}".encode("utf-8"))
+
+    def add(self, name: str, data: str | bytes) -> BuildDigest:
+        """
+        Add named data
+        """
+        self._h.update(b"\0" + name.encode("utf-8") + b"\0")
+        self._h.update(data.encode("utf-8") if isinstance(data, str) else data)
+        return self
+
+    def add_file(self, name: str, pth: str) -> BuildDigest:
+        """
+        Add named file content, its link target for symlinks
+        """
+        self._h.update(b"\0" + name.encode("utf-8") + b"\0")
+        if os.path.islink(pth):
+            self._h.update(b"link\0" + os.readlink(pth).encode("utf-8"))
+            return self
+
+        self._h.update(b"mode\0%o\0" % (os.stat(pth).st_mode & 0o7777))
+        with open(pth, "rb") as fr:
+            for chunk in iter(lambda: fr.read(0x100000), b""):
+                self._h.update(chunk)
+        return self
+
+    def add_repos(self, repos: Dict[str, Dict[str, str]]) -> BuildDigest:
+        """
+        Add repositories, with the content of their keys instead of the key paths
+        """
+        out: Dict[str, Dict[str, str]] = {}
+        for reponame, repodata in repos.items():
+            out[reponame] = dict(repodata)
+            key: str = repodata.get("key", "")
+            if key:
+                try:
+                    with open(urlparse(key).path, "rb") as fr:
+                        out[reponame]["key"] = hashlib.sha256(fr.read()).hexdigest()
+                except OSError:
+                    pass
+        return self.add("repos", json.dumps(out, sort_keys=True))
+
+    def add_tree(self, name: str, pth: str) -> BuildDigest:
+        """
+        Add all entries of a directory tree, e.g. the root overlay
+        """
+        if not os.path.isdir(pth):
+            return self
+
+        for root, dirs, files in os.walk(pth):
+            dirs.sort()
+            rel: str = os.path.relpath(root, pth)
+            self.add(f"{name}/{rel}/", "")
+            for f in sorted(files + [d for d in dirs if os.path.islink(os.path.join(root, d))]):
+                self.add_file(f"{name}/{rel}/{f}", os.path.join(root, f))
+        return self
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+class BuildCache:
+    """
+    Content-addressed cache of build results.
+
+    Each entry holds the image files of one build, keyed by the digest over all
+    its inputs. Least recently used entries are evicted above the size limit.
+    """
+
+    MAX_SIZE: int = 20 << 30
+
+    def __init__(self, path: str = "", max_size: int = MAX_SIZE) -> None:
+        self.path: str = path or get_cache_dir("builds")
+        self.max_size: int = max_size
+
+    @traced("cache.restore")
+    def restore(self, digest: str, target_dir: str) -> bool:
+        """
+        Copy cached build results to the target directory. Returns False if not cached.
+        """
+        entry: str = os.path.join(self.path, digest)
+        if not os.path.isdir(entry):
+            return False
+
+        try:
+            os.utime(entry)
+            os.makedirs(target_dir, exist_ok=True)
+            for e in os.scandir(entry):
+                shutil.copy2(e.path, os.path.join(target_dir, e.name))
+        except OSError as exc:
+            log.warning(f"Unable to restore cached build results: {exc}")
+            return False
+
+        return True
+
+    @traced("cache.store")
+    def store(self, digest: str, target_dir: str) -> None:
+        """
+        Store image files of the target directory, replacing the cached ones.
+        Kiwi build tree in subdirectories is not cached.
+        """
+        files: List[os.DirEntry] = [e for e in os.scandir(target_dir) if e.is_file()] if os.path.isdir(target_dir) else []
+        if not files:
+            log.debug("Build has no results to cache")
+            return
+
+        tmp_pth: str = ""
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_pth = tempfile.mkdtemp(prefix=".tmp-", dir=self.path)
+            for e in files:
+                shutil.copy2(e.path, os.path.join(tmp_pth, e.name))
+
+            entry: str = os.path.join(self.path, digest)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp_pth, entry)
+            tmp_pth = ""
+            log.info(f"Build results are cached as {digest}")
+            self.evict()
+        except OSError as exc:
+            log.warning(f"Unable to cache build results: {exc}")
+        finally:
+            if tmp_pth:
+                shutil.rmtree(tmp_pth, ignore_errors=True)
+
+    def get_entries(self) -> List[Dict[str, Any]]:
+        """
+        Cached entries with their sizes, most recently used first
+        """
+        out: List[Dict[str, Any]] = []
+        if not os.path.isdir(self.path):
+            return out
+
+        for e in os.scandir(self.path):
+            if not e.is_dir() or e.name.startswith("."):
+                continue
+            out.append(
+                {
+                    "digest": e.name,
+                    "path": e.path,
+                    "mtime": e.stat().st_mtime,
+                    "size": sum([f.stat().st_size for f in os.scandir(e.path) if f.is_file()]),
+                }
+            )
+        out.sort(key=lambda x: x["mtime"], reverse=True)
+        return out
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries above the size limit
+        """
+        total: int = 0
+        for entry in self.get_entries():
+            total += entry["size"]
+            if total > self.max_size:
+                log.debug(f"Evicting cached build results {entry['digest']}")
+                shutil.rmtree(entry["path"], ignore_errors=True)
+
+    def clear(self) -> None:
+        """
+        Drop the entire cache
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
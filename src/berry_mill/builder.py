@@ -10,11 +10,15 @@ from typing import Dict, List
 from platform import machine
 import kiwi.logger  # type: ignore
 from typing_extensions import Unpack
-from lxml import etree  # type: ignore
 from kiwi.exceptions import KiwiError, KiwiPrivilegesError, KiwiRootDirExists  # type: ignore
 from berry_mill.kiwiapp import KiwiAppLocal, KiwiAppBox  # type: ignore
 from .kiwrap import KiwiParent
+from .buildcache import HOOK_SCRIPTS, BuildCache, BuildDigest
+from .imgdescr.cache import get_cache_dir
+from .imgdescr.rendered import RenderedDescription
 from .params import KiwiBuildParams
+from .sysinfo import get_local_arch
+from .tracing import traced
 
 log = kiwi.logging.getLogger("kiwi")
 
@@ -24,8 +28,10 @@ class KiwiBuilder(KiwiParent):
     Main Class for Berrymill to prepare the kiwi-ng system (box)build calls
     """
 
-    def __init__(self, descr: str, **kw: Unpack[KiwiBuildParams]):
-        super().__init__(descr=descr, profile=kw.get("profile", ""), debug=kw.get("debug", False))
+    def __init__(self, descr: str | RenderedDescription, **kw: Unpack[KiwiBuildParams]):
+        super().__init__(
+            descr=descr, profile=kw.get("profile", ""), debug=kw.get("debug", False), offline=kw.get("offline", False)
+        )
 
         self._params: KiwiBuildParams = kw
 
@@ -35,6 +41,8 @@ class KiwiBuilder(KiwiParent):
         self._boxrootdir: str = os.path.join(self._appliance_path, "boxroot")
         log.debug(f"Using box root at {self._boxrootdir}")
         self._fcleanbox: bool = False
+        # Image results were restored from the build cache
+        self.cached: bool = False
         # tmp boxroot dir only needed when build mode is not local
         if not self._params.get("local"):
             if not os.path.exists(self._boxrootdir):
@@ -75,34 +83,54 @@ class KiwiBuilder(KiwiParent):
                 return False
         return True
 
-    def process(self) -> None:
+    def get_target_dir(self) -> str:
         """
-        Run builder. It supposed to be already within that directory (os.chdir).
-        Directory is changed by the parent caller of the KiwiBuilder class.
+        Get directory of the build results: target_dir/image_name[/profile]
         """
-        try:
-            config_tree = etree.parse(f"{self._appliance_descr}")
-        except Exception as err:
-            log.error(f"Failure while parsing appliance description", exc_info=err)
-            return
+        assert self._params.get("target_dir") is not None, log.warning("No Target Directory for built image files specified")
 
+        target_dir = os.path.join(self._params.get("target_dir", ""), self._descr.image_name)
+        if self._kiwiparams.get("profile"):
+            target_dir = os.path.join(target_dir, self._kiwiparams.get("profile", ""))
+
+        return target_dir
+
+    @traced("cache.digest")
+    def get_input_digest(self) -> str:
+        """
+        Get digest over all inputs of the build: the rendered description, repositories and their keys,
+        the profile, the target architecture, the hook scripts and the root overlay tree
+        """
+        digest: BuildDigest = BuildDigest()
+        digest.add("description", self._descr.to_str())
+        digest.add_repos(self._repos)
+        digest.add("profile", self._kiwiparams.get("profile") or "")
+        digest.add("arch", self._params.get("cross") and machine() == "x86_64" and "arm64" or get_local_arch())
+        for script in HOOK_SCRIPTS:
+            pth: str = os.path.join(self._appliance_path, script)
+            if os.path.exists(pth):
+                digest.add_file(script, pth)
+        digest.add_tree("root", os.path.join(self._appliance_path, "root"))
+
+        return digest.hexdigest()
+
+    @traced("builder.process")
+    def process(self) -> bool:
+        """
+        Run builder on the appliance directory. Returns True on success.
+        """
         try:
-            image_name: list = config_tree.xpath("//image/@name")
+            self._descr.image_name
         except Exception as err:
             log.error(f"Failure while trying to extract image name", exc_info=err)
-            return
+            return False
 
-        assert self._params.get("target_dir") is not None, log.warning("No Target Directory for built image files specified")
-
-        target_dir = os.path.join(self._params.get("target_dir", ""), image_name[0])
-
-        if self._kiwiparams.get("profile"):
-            target_dir = os.path.join(target_dir, self._kiwiparams.get("profile", ""))
+        target_dir = self.get_target_dir()
 
         # if target_dir exists with no --clean option, fail early.
         if not self._params.get("clean", False) and os.path.isdir(target_dir):
             log.error("Target directory already exists. Hint: use --clean option.")
-            return
+            return False
 
         # options that are solely accepted by kiwi-ng
         kiwi_options = self._kiwi_options
@@ -131,38 +159,68 @@ class KiwiBuilder(KiwiParent):
         if self._params.get("clean"):
             shutil.rmtree(target_dir, ignore_errors=True)
 
+        cache: BuildCache | None = None
+        digest: str = ""
+        if not self._params.get("no_cache"):
+            cache = BuildCache(
+                os.path.join(self._params.get("cache_dir") or get_cache_dir(), "builds"),
+                max_size=self._params.get("cache_size") or BuildCache.MAX_SIZE,
+            )
+            digest = self.get_input_digest()
+            if not self._params.get("refresh") and cache.restore(digest, target_dir):
+                log.info(f"Nothing has changed, image results are restored from the build cache to {target_dir}")
+                self.cached = True
+                return True
+
         if self._params.get("local"):
-            command = ["kiwi-ng"] + kiwi_options + ["system", "build", "--description", "."] + ["--target-dir", target_dir]
+            command = (
+                ["kiwi-ng"]
+                + kiwi_options
+                + ["system", "build", "--description", self._appliance_path]
+                + ["--target-dir", target_dir]
+            )
             try:
                 log.info("Starting Kiwi for local build")
                 KiwiAppLocal(command, repos=self._repos).run()
             except KiwiPrivilegesError:
                 log.error("Operation requires root privileges")
+                return False
             except KiwiRootDirExists as exc:
                 log.error(exc.message)
+                return False
             except KiwiError as kiwierr:
                 log.error(f"KiwiError: {type(kiwierr).__name__} [{kiwierr.message}]")
-                return
+                return False
         else:
             if not self._write_repokeys_box(self._repos):
-                return
+                return False
             command = (
                 ["kiwi-ng"]
                 + kiwi_options
                 + ["system", "boxbuild"]
                 + box_options
-                + ["--", "--description", "."]
+                + ["--", "--description", self._appliance_path]
                 + ["--target-dir", target_dir]
             )
             try:
                 log.info("Starting Kiwi Box")
-                KiwiAppBox(command, repos=self._repos, args_tmp_dir=self._boxtmpargdir).run()
+                KiwiAppBox(
+                    command,
+                    repos=self._repos,
+                    args_tmp_dir=self._boxtmpargdir,
+                    plugin_cfg=self._params.get("boxed_plugin_conf") or "",
+                ).run()
             except KiwiError as kiwierr:
                 if "mkdir" in kiwierr.message and "Permission denied" in kiwierr.message:
                     log.error(kiwierr.message)
-                    return
+                    return False
                 log.error(f"KiwiError: {type(kiwierr).__name__} [{kiwierr.message}]")
-                return
+                return False
+
+        if cache is not None:
+            cache.store(digest, target_dir)
+
+        return True
 
     def cleanup(self) -> None:
         """
@@ -0,0 +1,29 @@
+"""
+Location of berrymill caches and writing to them
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+
+def get_cache_dir(*sub: str) -> str:
+    """
+    Return default berrymill cache directory, following XDG base directory spec.
+    """
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "berrymill", *sub)
+
+
+def atomic_write(pth: str, data: bytes) -> None:
+    """
+    Write data to a file, so the readers would never see it half-written.
+    """
+    fd, tmp_pth = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(pth))
+    try:
+        with os.fdopen(fd, "wb") as fw:
+            fw.write(data)
+        os.replace(tmp_pth, pth)
+    except Exception:
+        os.path.exists(tmp_pth) and os.remove(tmp_pth)  # type: ignore [func-returns-value]
+        raise
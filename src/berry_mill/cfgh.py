@@ -2,8 +2,12 @@ import copy
 import yaml  # type: ignore
 import os
 import sys
-from typing import Any, List
+import pickle
+import hashlib
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterator, List
 import kiwi.logger  # type: ignore
+from berry_mill.cachedir import atomic_write, get_cache_dir
 
 log = kiwi.logging.getLogger("kiwi")
 
@@ -20,11 +24,189 @@ class Autodict(dict):
         return super().__setitem__(__key, __value)
 
 
+_MISSING: Any = object()
+
+# libyaml is many times faster, if available
+YamlLoader: Any = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def merge(dst: dict, src: dict) -> dict:
+    """
+    Deep-merge src into dst: mappings are merged per key,
+    any other value (e.g. a list) replaces the one of dst.
+    """
+    for k, v in src.items():
+        cur: Any = dict.get(dst, k, _MISSING)
+        if isinstance(v, dict) and isinstance(cur, dict):
+            merge(cur, v)
+        else:
+            dict.__setitem__(dst, k, v)
+    return dst
+
+
+def _view(value: Any) -> Any:
+    """
+    Wrap containers of the configuration into read-only views
+    """
+    if isinstance(value, dict):
+        return ConfigView(value)
+    if isinstance(value, list):
+        return ConfigList(value)
+    return value
+
+
+class ConfigView(Mapping):
+    """
+    Read-only view of a configuration mapping.
+
+    Nothing is copied: nested mappings and lists are wrapped into views on access,
+    sharing the data with the configuration. Writers take their own copy
+    with to_dict() (or copy.deepcopy()).
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: dict) -> None:
+        self._data: dict = data
+
+    def __getitem__(self, __key: Any) -> Any:
+        value: Any = dict.get(self._data, __key, _MISSING)
+        if value is _MISSING:
+            # Missing sections of the configuration are empty, but never created by reading
+            if isinstance(self._data, Autodict):
+                return ConfigView(Autodict())
+            raise KeyError(__key)
+        return _view(value)
+
+    def get(self, __key: Any, default: Any = None) -> Any:
+        value: Any = dict.get(self._data, __key, _MISSING)
+        return default if value is _MISSING else _view(value)
+
+    def __contains__(self, __key: Any) -> bool:
+        return __key in self._data
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._data!r})"
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> dict:
+        return copy.deepcopy(self._data, memo)
+
+    def to_dict(self) -> dict:
+        """
+        Return a mutable deep copy of the data
+        """
+        return copy.deepcopy(self._data)
+
+
+class ConfigList(Sequence):
+    """
+    Read-only view of a configuration list
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: list) -> None:
+        self._data: list = data
+
+    def __getitem__(self, __idx: Any) -> Any:
+        if isinstance(__idx, slice):
+            return ConfigList(self._data[__idx])
+        return _view(self._data[__idx])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Sequence) and not isinstance(other, str) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._data!r})"
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> list:
+        return copy.deepcopy(self._data, memo)
+
+    def to_list(self) -> list:
+        """
+        Return a mutable deep copy of the data
+        """
+        return copy.deepcopy(self._data)
+
+
+for _dumper in (yaml.Dumper, yaml.SafeDumper):
+    _dumper.add_representer(ConfigView, lambda d, v: d.represent_dict(v))
+    _dumper.add_representer(ConfigList, lambda d, v: d.represent_list(v))
+
+
+class ConfigSnapshots:
+    """
+    Persisted merged configurations, keyed by path, mtime and size of each of their files,
+    so loading unchanged configuration files skips the YAML parsing entirely.
+    """
+
+    MAX_ENTRIES: int = 32
+
+    def __init__(self, path: str = "") -> None:
+        self.path: str = path or get_cache_dir("config")
+
+    @staticmethod
+    def get_key(paths: List[str]) -> str | None:
+        """
+        Get key of the configuration files, None if any of them cannot be accessed
+        """
+        import berry_mill
+
+        h = hashlib.sha256(getattr(berry_mill, "version", "").encode("utf-8"))
+        for pth in paths:
+            try:
+                st: os.stat_result = os.stat(pth)
+            except OSError:
+                return None
+            h.update(f"\0{os.path.abspath(pth)}\0{st.st_mtime_ns}\0{st.st_size}".encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Autodict | None:
+        """
+        Return the merged configuration, if stored
+        """
+        pth: str = os.path.join(self.path, key + ".pickle")
+        try:
+            with open(pth, "rb") as fr:
+                conf: Any = pickle.load(fr)
+            os.utime(pth)
+        except Exception:
+            return None
+        return conf if isinstance(conf, Autodict) else None
+
+    def put(self, key: str, conf: Autodict) -> None:
+        """
+        Store the merged configuration, evicting the least recently used ones
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            atomic_write(os.path.join(self.path, key + ".pickle"), pickle.dumps(conf, protocol=pickle.HIGHEST_PROTOCOL))
+            entries: List[os.DirEntry] = [e for e in os.scandir(self.path) if e.name.endswith(".pickle")]
+            entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+            for e in entries[self.MAX_ENTRIES :]:
+                os.remove(e.path)
+        except Exception as exc:
+            log.debug(f"Unable to store configuration snapshot: {exc}")
+
+
 class ConfigHandler:
-    def __init__(self, cf_path: str = ""):
-        """ """
+    def __init__(self, cf_path: str = "", snapshots: ConfigSnapshots | None = None):
+        """
+        Configuration files are given by add_config(), the default one is used unless cf_path is given.
+        Merged configuration is stored to the snapshots, the default ones unless given.
+        """
         self._cfg: List[str] = []
         self.__conf: Autodict = Autodict()
+        self._snapshots: ConfigSnapshots = snapshots or ConfigSnapshots()
 
         if not cf_path:
             # Load default /etc/berrymill/berrymill.conf
@@ -49,37 +231,61 @@ class ConfigHandler:
 
     def _parse_config(self, cf_path: str) -> None:
         """
-        Parse YAML config from the path and store it to the main storage.
+        Parse YAML config from the path and deep-merge it to the main storage.
         """
         try:
-            data: Any = yaml.load(open(cf_path), Loader=yaml.SafeLoader)
+            with open(cf_path) as fr:
+                data: Any = yaml.load(fr, Loader=YamlLoader)
         except Exception as exc:
             log.error("unable to load configuration at {}: {}".format(cf_path, exc))
             sys.exit(1)
 
-        data is not None and self.__conf.update(data)
+        data is not None and merge(self.__conf, data)
 
     def load(self) -> None:
         """
-        Load all the configs
+        Load all the configs, each later one is deep-merged over the former ones.
+        Unchanged configs are taken from the snapshot of their last load.
         """
         if not self._cfg:
             log.error("no configuration found")
             sys.exit(1)
 
+        key: str | None = self._snapshots.get_key(self._cfg)
+        snapshot: Autodict | None = self._snapshots.get(key) if key is not None else None
+        if snapshot is not None:
+            log.debug("Using configuration snapshot")
+            merge(self.__conf, snapshot)
+            return
+
         for cfgpath in self._cfg:
             self._parse_config(cf_path=cfgpath)
 
+        if key is not None:
+            self._snapshots.put(key, self.__conf)
+
     @property
-    def config(self) -> dict:
+    def config(self) -> ConfigView:
         """
-        Return a deep copy of the configuration.
-        This prevents from its accidental modification.
+        Return a read-only view of the configuration.
+        It is shared, not copied: use its to_dict() for a modifiable copy.
         """
-        return copy.deepcopy(self.__conf)
+        return ConfigView(self.__conf)
 
     def raw_unsafe_config(self) -> dict:
         """
         Return the original config, which may be modified.
         """
         return self.__conf
+
+    def get_repos(self, arch: str) -> Dict[str, Dict[str, str]]:
+        """
+        Return repositories of all the sections for the given architecture.
+        Repositories of the later sections override those of the same name.
+        """
+        out: Dict[str, Dict[str, str]] = {}
+        repos: ConfigView = self.config.get("repos") or ConfigView({})
+        for r in repos:
+            # Repositories are modified by the builders, so they get their own copies
+            out.update({name: repo.to_dict() for name, repo in (repos[r].get(arch) or {}).items()})
+        return out
@@ -0,0 +1,367 @@
+"""
+Resident daemon, running berrymill jobs without paying for the startup every time.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import errno
+import signal
+import socket
+import struct
+import tempfile
+import importlib
+import threading
+import traceback
+from typing import Any
+
+# Modules, imported by the daemon in advance. Each job runs in a process,
+# forked from the daemon, so it does not import them again.
+WARM_MODULES: list[str] = [
+    "berry_mill.mill",
+    "berry_mill.builder",
+    "berry_mill.preparer",
+    "berry_mill.imgdescr",
+    "berry_mill.mountpoint",
+    "berry_mill.imagefinder",
+    "kiwi.tasks.system_build",
+    "kiwi.tasks.system_prepare",
+    "kiwi_boxed_plugin.tasks.system_boxbuild",
+    "requests",
+    "inquirer",
+]
+
+ENV_SOCKET: str = "BERRYMILL_SOCKET"
+ENV_NO_DAEMON: str = "BERRYMILL_NO_DAEMON"
+
+
+def get_socket_path() -> str:
+    """
+    Get path of the daemon socket of the current user
+    """
+    return os.environ.get(ENV_SOCKET) or os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "berrymill-{}.sock".format(os.getuid())
+    )
+
+
+def _send(sock: socket.socket, msg: dict[str, Any], fds: list[int] | None = None) -> None:
+    data: bytes = json.dumps(msg).encode("utf-8") + b"\n"
+    if fds:
+        sent: int = socket.send_fds(sock, [data], fds)
+        data = data[sent:]
+    sock.sendall(data)
+
+
+class _Reader:
+    """
+    Reader of newline-delimited JSON messages
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock: socket.socket = sock
+        self.buff: bytes = b""
+
+    def get_fds(self, maxfds: int) -> list[int]:
+        """
+        Receive the first chunk along with the passed file descriptors
+        """
+        data, fds, _, _ = socket.recv_fds(self.sock, 0x10000, maxfds)
+        self.buff += data
+        return fds
+
+    def get(self) -> dict[str, Any] | None:
+        """
+        Get next message, None if the peer is gone
+        """
+        while b"\n" not in self.buff:
+            data: bytes = self.sock.recv(0x10000)
+            if not data:
+                return None
+            self.buff += data
+        line, self.buff = self.buff.split(b"\n", 1)
+        return json.loads(line)
+
+
+def _get_std_fds() -> tuple[list[int], list[int]]:
+    """
+    Get standard streams to pass to the daemon, closed ones are replaced with /dev/null.
+    Returns passed descriptors and those to close afterwards.
+    """
+    fds: list[int] = []
+    opened: list[int] = []
+    for fd in range(3):
+        try:
+            os.fstat(fd)
+            fds.append(fd)
+        except OSError:
+            opened.append(os.open(os.devnull, os.O_RDWR))
+            fds.append(opened[-1])
+    return fds, opened
+
+
+def forward(argv: list[str]) -> int | None:
+    """
+    Run the command line by the daemon, if it is running.
+    Returns exit code of the job, or None if there is no daemon to run it.
+    """
+    if os.environ.get(ENV_NO_DAEMON):
+        return None
+
+    pth: str = get_socket_path()
+    try:
+        # Do not talk to a socket of someone else
+        if os.stat(pth).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+
+    sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(pth)
+    except OSError:
+        sock.close()
+        return None  # Stale socket of a daemon, which is not running
+
+    with sock:
+        fds, opened = _get_std_fds()
+        try:
+            _send(sock, {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ), "umask": _get_umask()}, fds)
+        finally:
+            for fd in opened:
+                os.close(fd)
+
+        reader: _Reader = _Reader(sock)
+        while True:
+            try:
+                msg: dict[str, Any] | None = reader.get()
+            except KeyboardInterrupt:
+                _send(sock, {"signal": signal.SIGINT})
+                continue
+
+            if msg is None:
+                sys.stderr.write("Connection to berrymill daemon is lost\n")
+                return 1
+            if "exit" in msg:
+                return msg["exit"]
+
+
+def _get_umask() -> int:
+    umask: int = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+class Daemon:
+    """
+    Daemon, accepting jobs of berrymill clients over a Unix socket.
+
+    Everything, what each run needs (interpreter, kiwi, plugins, system probes),
+    is loaded once. Every job is then run in a forked process on the client's
+    standard streams, working directory and environment, so jobs do not share
+    any state and a failing job does not affect the daemon.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path: str = path or get_socket_path()
+        self._sock: socket.socket | None = None
+        self._jobs: set[int] = set()
+        self._stop: threading.Event = threading.Event()
+
+    def warmup(self) -> None:
+        """
+        Import and probe everything jobs would do on their own otherwise
+        """
+        import kiwi.logger  # type: ignore
+        from berry_mill import plugin
+        from berry_mill import sysinfo
+
+        log = kiwi.logging.getLogger("kiwi")
+        for m in WARM_MODULES:
+            try:
+                importlib.import_module(m)
+            except Exception as exc:
+                log.debug(f'Daemon skips preloading "{m}": {exc}')
+
+        # Jobs pass their own arguments to the plugins
+        plugin.registry.args = None
+        for n in plugin.registry.plugins():
+            plugin.registry[n]
+
+        try:
+            sysinfo.get_local_arch()
+            sysinfo.is_vm() and sysinfo.has_virtualization()
+        except Exception as exc:
+            log.debug(f"Daemon skips probing virtualization: {exc}")
+
+    def _bind(self) -> socket.socket:
+        if os.path.exists(self.path):
+            probe: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise Exception(f'Daemon is already running at "{self.path}"')
+            except OSError:
+                os.unlink(self.path)
+            finally:
+                probe.close()
+
+        sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask: int = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        sock.listen(16)
+        sock.settimeout(0.5)
+        return sock
+
+    def stop(self, *args: Any) -> None:
+        self._stop.set()
+
+    def serve(self) -> None:
+        """
+        Accept jobs until stopped by SIGTERM, SIGINT or stop()
+        """
+        import kiwi.logger  # type: ignore
+
+        log = kiwi.logging.getLogger("kiwi")
+        self.warmup()
+        self._sock = self._bind()
+
+        handlers: dict[signal.Signals, Any] = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in [signal.SIGTERM, signal.SIGINT]:
+                handlers[sig] = signal.signal(sig, self.stop)
+
+        log.info(f'Daemon is accepting jobs at "{self.path}"')
+        try:
+            while not self._stop.is_set():
+                self._reap()
+                try:
+                    conn, _ = self._sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError as exc:
+                    if exc.errno == errno.EINTR:
+                        continue
+                    raise
+
+                with conn:
+                    if not self._is_trusted(conn):
+                        log.warning("Daemon rejects a job of another user")
+                        continue
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    pid: int = os.fork()
+                    if not pid:
+                        code: int = 1
+                        try:
+                            self._sock.close()
+                            for sig in handlers:
+                                signal.signal(sig, signal.default_int_handler if sig == signal.SIGINT else signal.SIG_DFL)
+                            code = self._run_job(conn)
+                        finally:
+                            os._exit(code)
+                    self._jobs.add(pid)
+        finally:
+            for sig, h in handlers.items():
+                signal.signal(sig, h)
+            self._sock.close()
+            self._sock = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            log.info(f"Daemon is stopped, waiting for {len(self._jobs)} running jobs")
+            while self._jobs:
+                self._reap(block=True)
+
+    def _reap(self, block: bool = False) -> None:
+        """
+        Collect finished jobs
+        """
+        for pid in list(self._jobs):
+            try:
+                if os.waitpid(pid, 0 if block else os.WNOHANG)[0]:
+                    self._jobs.discard(pid)
+            except ChildProcessError:
+                self._jobs.discard(pid)
+
+    def _is_trusted(self, conn: socket.socket) -> bool:
+        """
+        Only jobs of the same user are accepted
+        """
+        fmt: str = "3i"
+        _, uid, _ = struct.unpack(fmt, conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize(fmt)))
+        return uid == os.getuid()
+
+    def _run_job(self, conn: socket.socket) -> int:
+        """
+        Run one job in the forked process, as if berrymill was called by the client
+        """
+        code: int = 1
+        try:
+            reader: _Reader = _Reader(conn)
+            fds: list[int] = reader.get_fds(3)
+            msg: dict[str, Any] | None = reader.get()
+            if msg is None or len(fds) != 3:
+                return code
+
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+                os.close(fd)
+            os.chdir(msg["cwd"])
+            os.environ.clear()
+            os.environ.update(msg["env"])
+            os.umask(msg["umask"])
+            sys.argv = msg["argv"]
+
+            threading.Thread(target=self._watch_client, args=(reader,), daemon=True).start()
+            code = self._call()
+
+            # Client disconnects once it gets the exit code
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            _send(conn, {"exit": code})
+        except Exception:
+            traceback.print_exc()
+        return code
+
+    def _call(self) -> int:
+        """
+        Call berrymill, returning its exit code
+        """
+        from berry_mill import run_local
+
+        code: int = 0
+        try:
+            run_local()
+        except SystemExit as exc:
+            if isinstance(exc.code, int):
+                code = exc.code
+            elif exc.code is not None:
+                sys.stderr.write(f"{exc.code}\n")
+                code = 1
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        return code
+
+    def _watch_client(self, reader: _Reader) -> None:
+        """
+        Pass signals from the client to the job, interrupt the job if the client is gone
+        """
+        while True:
+            try:
+                msg: dict[str, Any] | None = reader.get()
+            except Exception:
+                msg = None
+
+            if msg is None:
+                os.kill(os.getpid(), signal.SIGINT)
+                return
+            if "signal" in msg:
+                os.kill(os.getpid(), msg["signal"])
@@ -1,2 +1,6 @@
 from berry_mill.imgdescr.descr import ApplianceDescription
 from berry_mill.imgdescr.loader import Loader
+from berry_mill.imgdescr.cache import DescriptionCache
+from berry_mill.imgdescr.render import Renderer, RenderResult
+from berry_mill.imgdescr.rendered import RenderedDescription
+from berry_mill.imgdescr.stats import FlattenStats, OpStats
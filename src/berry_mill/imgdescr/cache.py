@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any
+from berry_mill.cachedir import atomic_write, get_cache_dir
+from berry_mill.imgdescr.loader import Loader
+
+log = logging.getLogger("kiwi")
+
+
+class DescriptionCache:
+    """
+    Content-addressed cache of flattened appliance descriptions.
+
+    Rendered descriptions are keyed by the content of every file in the inheritance
+    chain and the berrymill version. Each entry description has a manifest with its
+    last known inheritance chain, so the cache is checked without parsing anything.
+    Least recently used entries are evicted once the size or count limits are reached.
+    """
+
+    def __init__(self, path: str = "", max_size: int = 0x4000000, max_entries: int = 0x400) -> None:
+        self.path: str = path or get_cache_dir("descr")
+        self.max_size: int = max_size
+        self.max_entries: int = max_entries
+
+        self._obj_pth: str = os.path.join(self.path, "objects")
+        self._mft_pth: str = os.path.join(self.path, "manifests")
+
+    @staticmethod
+    def _version() -> str:
+        import berry_mill
+
+        return getattr(berry_mill, "version", "")
+
+    def _get_manifest_path(self, pth: str, profile: str | None = None) -> str:
+        # Inherited paths are relative to the current directory
+        return os.path.join(
+            self._mft_pth,
+            hashlib.sha256(f"{os.getcwd()}\0{os.path.abspath(pth)}\0{profile or ''}".encode("utf-8")).hexdigest() + ".json",
+        )
+
+    def get_digest(self, chain: list[str], profile: str | None = None) -> str | None:
+        """
+        Compute a digest over the whole inheritance chain.
+        Returns None if any of the files cannot be read.
+        """
+        h = hashlib.sha256(f"{self._version()}\0{profile or ''}".encode("utf-8"))
+        for pth in chain:
+            try:
+                with open(pth, "rb") as fr:
+                    h.update(b"\0" + pth.encode("utf-8") + b"\0" + fr.read())
+            except OSError:
+                return None
+        return h.hexdigest()
+
+    def get(self, pth: str, profile: str | None = None) -> tuple[str, dict[str, Any]] | None:
+        """
+        Return rendered description and its manifest, if cached and still valid.
+        Descriptions, rendered for a specific profile are cached separately.
+        """
+        try:
+            with open(self._get_manifest_path(pth, profile)) as fr:
+                mft: dict[str, Any] = json.load(fr)
+        except (OSError, ValueError):
+            return None
+
+        digest: str | None = self.get_digest(mft.get("chain", []) + mft.get("includes", []), profile)
+        if digest is None or digest != mft.get("digest"):
+            return None
+
+        obj_pth: str = os.path.join(self._obj_pth, digest + ".xml")
+        try:
+            with open(obj_pth) as fr:
+                out: str = fr.read()
+            os.utime(obj_pth)
+        except OSError:
+            return None
+
+        return out, mft
+
+    def put(
+        self,
+        pth: str,
+        chain: list[str],
+        main_pth: str,
+        is_derived: bool,
+        rendered: str,
+        profile: str | None = None,
+        includes: list[str] | None = None,
+    ) -> None:
+        """
+        Store rendered description.
+        Included files, such as package lists, are part of the digest as well.
+        """
+        includes = includes or []
+        digest: str | None = self.get_digest(chain + includes, profile)
+        if digest is None:
+            return
+
+        try:
+            os.makedirs(self._obj_pth, exist_ok=True)
+            os.makedirs(self._mft_pth, exist_ok=True)
+            atomic_write(os.path.join(self._obj_pth, digest + ".xml"), rendered.encode("utf-8"))
+            atomic_write(
+                self._get_manifest_path(pth, profile),
+                json.dumps(
+                    {"digest": digest, "chain": chain, "includes": includes, "main": main_pth, "derived": is_derived}
+                ).encode("utf-8"),
+            )
+            self.evict()
+        except OSError as exc:
+            log.warning(f"Unable to cache rendered description {pth}: {exc}")
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries above the limits
+        """
+        for d, max_size in ((self._obj_pth, self.max_size), (self._mft_pth, 0)):
+            if not os.path.isdir(d):
+                continue
+
+            entries: list[os.DirEntry] = [e for e in os.scandir(d) if e.is_file() and not e.name.startswith(".")]
+            entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+
+            total: int = 0
+            for idx, e in enumerate(entries):
+                total += e.stat().st_size
+                if idx >= self.max_entries or (max_size and total > max_size):
+                    try:
+                        os.remove(e.path)
+                    except OSError:
+                        pass
+
+    def clear(self) -> None:
+        """
+        Drop the entire cache
+        """
+        for d in (self._obj_pth, self._mft_pth):
+            if os.path.isdir(d):
+                for e in os.scandir(d):
+                    os.remove(e.path)
+
+    def load(self, pth: str, loader: Loader | None = None) -> str:
+        """
+        Load appliance description through the cache.
+
+        Loader gets its state (derivation, main appliance path and the chain)
+        set as if it would load the description on its own.
+        """
+        loader = loader or Loader()
+        hit: tuple[str, dict[str, Any]] | None = self.get(pth, loader.profile)
+        if hit is not None:
+            log.debug(f"Using cached rendered description for {pth}")
+            out, mft = hit
+            loader.chain = mft["chain"]
+            loader.main_appliance_pth = mft["main"]
+            loader.is_derived = mft["derived"]
+            loader.includes = mft.get("includes", [])
+            return out
+
+        out = loader.load(pth)
+        self.put(
+            pth,
+            [os.path.abspath(p) for p in loader.chain],
+            os.path.abspath(loader.main_appliance_pth),
+            loader.is_derived,
+            out,
+            loader.profile,
+            loader.includes,
+        )
+
+        return out
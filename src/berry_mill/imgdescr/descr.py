@@ -5,9 +5,13 @@ import logging
 import yaml  # type: ignore
 from yaml.scanner import ScannerError as YamlScannerError  # type: ignore
 import os.path
-import xml.dom.minidom
-from typing import Any, Callable
+import io
+import time
+from typing import IO, Any, Callable
 import lxml.etree as ET  # type: ignore
+from berry_mill.imgdescr.index import ElementIndex
+from berry_mill.imgdescr.serializer import PrettySerializer
+from berry_mill.imgdescr.stats import FlattenStats, OpStats
 
 log = logging.getLogger("kiwi")
 
@@ -20,27 +24,71 @@ class ApplianceDescription:
     __P_RP = "replace"
     __P_RA = "remove_any"
     __P_ST = "set"
+    __P_AP = "add_packages"
+    __P_RPK = "remove_packages"
+    __PKGS = "packages"
+    __PKG = "package"
+
+    def __init__(
+        self,
+        descr: str | ET.Element,
+        parent: str | ET.Element | None = None,
+        stats: FlattenStats | None = None,
+        base_dir: str = "",
+    ) -> None:
+        """
+        Description and its parent are either XML strings or already parsed trees.
+        Parsed trees are used as is and the parent tree is modified in place.
+
+        If stats are given, every applied op is recorded there.
+        Relative paths of the description are resolved against base_dir, its directory.
+        """
+        self.s_dom: ET.Element = self.to_dom(descr)
+        self.p_dom: ET.Element = self.to_dom(parent) if parent is not None else None
+        self.stats: FlattenStats | None = stats
+        self.base_dir: str = base_dir
+        self.index: ElementIndex | None = None
+        self._frame: str = ""
 
-    def __init__(self, descr: str, parent: str | None = None) -> None:
-        self.s_dom: ET.Element = ET.fromstring(descr.encode("utf-8"))
-        self.p_dom: ET.Element = ET.fromstring(parent.encode("utf-8")) if parent is not None else None
+        # Files, read by the ops, such as package lists
+        self.includes: list[str] = []
 
         self._resolve()
         self._apply()
 
+    @staticmethod
+    def to_dom(descr: str | ET.Element) -> ET.Element:
+        """
+        Get DOM of an appliance description.
+        """
+        if isinstance(descr, str):
+            return ET.fromstring(descr.encode("utf-8"))
+        return descr
+
+    @staticmethod
+    def resolve_path(pth: str, base_dir: str) -> str:
+        """
+        Resolve a relative path of a description against its directory,
+        falling back to the current directory, if there is no such file.
+        """
+        if not base_dir or os.path.isabs(pth):
+            return pth
+        resolved: str = os.path.join(base_dir, pth)
+        return resolved if os.path.exists(resolved) else pth
+
     def to_str(self, node: ET.Element = None) -> str:
         """
         Export appliance description to an XML string.
         """
-        out = []
-        for l in (
-            xml.dom.minidom.parseString(ET.tostring(node if node is not None else self.p_dom, encoding="utf-8").decode("utf-8"))
-            .toprettyxml(indent="  ")
-            .split("\n")
-        ):
-            if l.strip():
-                out.append(l.rstrip())
-        return "\n".join(out)
+        out: io.StringIO = io.StringIO()
+        self.write(out, node=node)
+        return out.getvalue()
+
+    def write(self, fp: IO[str], node: ET.Element = None) -> None:
+        """
+        Export appliance description as XML straight to a file object.
+        """
+        PrettySerializer().write(node if node is not None else self.p_dom, fp)
 
     def _resolve(self) -> None:
         """
@@ -55,9 +103,10 @@ class ApplianceDescription:
 
         assert self.p_dom is not None, "No inherited descriptions found"
         assert "path" in self.p_dom.attrib, 'Inherited element should contain "path" attribute'
-        assert os.path.exists(self.p_dom.attrib["path"]), "Unable to find inherited description"
+        i_path: str = self.resolve_path(self.p_dom.attrib["path"], self.base_dir)
+        assert os.path.exists(i_path), "Unable to find inherited description"
 
-        with open(self.p_dom.attrib["path"]) as ihf:
+        with open(i_path) as ihf:
             self.p_dom = ET.fromstring(ihf.read().encode("utf-8"))
 
     def _apply(self) -> None:
@@ -69,14 +118,50 @@ class ApplianceDescription:
             self.p_dom = self.s_dom
             return
 
+        self.index = ElementIndex(self.p_dom)
         for op in self.s_dom.findall("*"):
-            if op.tag in [self.__P_AD, self.__P_RM, self.__P_MG, self.__P_RP, self.__P_RA, self.__P_ST]:
-                self.__class__.__dict__[f"_{op.tag}"](self, op)
+            if op.tag in [
+                self.__P_AD,
+                self.__P_RM,
+                self.__P_MG,
+                self.__P_RP,
+                self.__P_RA,
+                self.__P_ST,
+                self.__P_AP,
+                self.__P_RPK,
+            ]:
+                if self.stats is None:
+                    self.__class__.__dict__[f"_{op.tag}"](self, op)
+                else:
+                    self._apply_op_stats(op)
+
+    def _apply_op_stats(self, op: ET.Element) -> None:
+        """
+        Apply an op, recording its statistics
+        """
+        assert self.stats is not None and self.index is not None
+        rec: OpStats = OpStats(self.stats.level, op.tag, op.sourceline)
+        cnt: tuple[int, int, int, int] = self.index.get_counters()
+        start: float = time.perf_counter()
+
+        self.__class__.__dict__[f"_{op.tag}"](self, op)
+
+        rec.time = time.perf_counter() - start
+        rec.visited, rec.added, rec.removed, rec.changed = [a - b for a, b in zip(self.index.get_counters(), cnt)]
+        self.stats.add(rec)
 
     def frame(f) -> Callable[[ApplianceDescription, Any], None]:
+        """
+        Keep the name of the running operation in the instance context,
+        so the instances are safe to be used side by side.
+        """
+
         def w(ref, *a, **kw):
-            f.__globals__["frame"] = f.__code__.co_name[1:]  # type: ignore
-            return f(ref, *a, **kw)  # type: ignore
+            ref._frame = f.__code__.co_name[1:]  # type: ignore
+            try:
+                return f(ref, *a, **kw)  # type: ignore
+            finally:
+                ref._frame = ""
 
         return w
 
@@ -110,10 +195,15 @@ class ApplianceDescription:
 
     @staticmethod
     def get_parent(tree, e) -> ET.Element:
-        for itm in tree.iter():
-            for c in itm:
-                if c == e:
-                    return itm
+        p: ET.Element | None = e.getparent()
+        if p is None:
+            return None
+
+        # Parent should be within the given tree
+        if p is tree or tree in p.iterancestors():
+            return p
+
+        return None
 
     @staticmethod
     def get_xpath(e) -> str:
@@ -145,50 +235,60 @@ class ApplianceDescription:
         """
         Add inherited elements
         """
+        assert self.index is not None
+        tc: ET.Element | None = None
         for c in e:
             # Elements
-            for tc in self.find_all(c.tag, self.p_dom):
-                if c.attrib != tc.attrib:
-                    continue
-                [tc.append(mv_c) for mv_c in c]
+            tcs: list[ET.Element] = self.index.match(c.tag, c.attrib)
+            for tc in tcs:
+                for mv_c in c:
+                    tc.append(mv_c)
+                    self.index.attach(mv_c)
 
             # Aggregates
-            is_new = True
-            for tc in self.find_all(c.tag, self.p_dom):
-                if c.attrib == tc.attrib:
-                    is_new = False
-                    break
+            if tcs:
+                continue
+
+            # New aggregate goes next to the others of its kind
+            tcs = self.index.find_all(c.tag)
+            if tcs:
+                tc = tcs[-1]
 
-            if is_new:
-                p = self.get_parent(self.p_dom, tc)
-                p is not None and p.append(c)
+            p = tc.getparent() if tc is not None else self.p_dom
+            if p is not None:
+                p.append(c)
+                self.index.attach(c)
 
     @frame  # type: ignore [arg-type]
     def _remove(self, e: ET.Element) -> None:
         """
         Remove inherited elements
         """
+        assert self.index is not None
         for s_tag in e:
             if len(s_tag):
                 # Aggregate
-                tgt_aggr: ET.Element = None
-                for tgt_aggr in self.find_all(s_tag.tag, self.p_dom):
-                    if tgt_aggr.attrib == s_tag.attrib and "/".join(
-                        [x for x in self.get_xpath(s_tag).split("/") if x != frame]  # type: ignore [name-defined]
-                    ) == self.get_xpath(tgt_aggr):
-                        [
-                            [
-                                t_tag.attrib == r_tag.attrib and t_tag.getparent().remove(t_tag)
-                                for t_tag in ApplianceDescription.get_last(tgt_aggr)
-                            ]
-                            for r_tag in ApplianceDescription.get_last(s_tag)
-                        ]
+                s_xp: str = "/".join([x for x in self.get_xpath(s_tag).split("/") if x != self._frame])
+                for tgt_aggr in self.index.match(s_tag.tag, s_tag.attrib):
+                    if s_xp != self.get_xpath(tgt_aggr):
+                        continue
+
+                    # Only the last elements are removed, parents are just qualifiers
+                    t_last: dict[tuple, list[ET.Element]] = {}
+                    for t_tag in ApplianceDescription.get_last(tgt_aggr):
+                        t_last.setdefault(ElementIndex._attrs_key(t_tag), []).append(t_tag)
+
+                    for r_tag in ApplianceDescription.get_last(s_tag):
+                        for t_tag in t_last.pop(ElementIndex._attrs_key(r_tag), []):
+                            self.index.detach(t_tag)
+                            t_tag.getparent().remove(t_tag)
             else:
                 # Elements
-                for tc in self.find_all(s_tag.tag, self.p_dom):
-                    if s_tag.attrib == tc.attrib:
-                        p = self.get_parent(self.p_dom, tc)
-                        p is not None and p.remove(tc)
+                for tc in self.index.match(s_tag.tag, s_tag.attrib):
+                    p = tc.getparent()
+                    if p is not None:
+                        self.index.detach(tc)
+                        p.remove(tc)
 
     @frame  # type: ignore [arg-type]
     def _merge(self, e: ET.Element) -> None:
@@ -199,16 +299,16 @@ class ApplianceDescription:
         if s_tag is None:
             return
 
-        e_xp: str = "/".join([x for x in self.get_xpath(s_tag).split("/") if x != frame])  # type: ignore [name-defined]
-        for t_tag in ApplianceDescription.find_all(s_tag.tag, self.p_dom, s_tag.attrib):
+        assert self.index is not None
+        e_xp: str = "/".join([x for x in self.get_xpath(s_tag).split("/") if x != self._frame])
+        for t_tag in self.index.find_all(s_tag.tag, s_tag.attrib):
             if self.get_xpath(t_tag) == e_xp:
+                t_tags: set[Any] = set([tc.tag for tc in t_tag])
                 for sc in s_tag:
-                    is_new = True
-                    for tc in t_tag:
-                        if tc.tag == sc.tag:
-                            is_new = False
-                            break
-                    is_new and t_tag.append(sc)
+                    if sc.tag not in t_tags:
+                        t_tag.append(sc)
+                        self.index.attach(sc)
+                        t_tags.add(sc.tag)
 
     def _replace(self, e: ET.Element) -> None:
         """
@@ -218,11 +318,14 @@ class ApplianceDescription:
         if s_tag is None:
             return
 
-        for tgt_aggr in self.find_all(s_tag.tag, self.p_dom):
-            if tgt_aggr.attrib == s_tag.attrib:
-                p = tgt_aggr.getparent()
-                p.remove(tgt_aggr)
-                p is not None and p.append(s_tag)
+        assert self.index is not None
+        for tgt_aggr in self.index.match(s_tag.tag, s_tag.attrib):
+            p = tgt_aggr.getparent()
+            self.index.detach(tgt_aggr)
+            p.remove(tgt_aggr)
+            if p is not None:
+                p.append(s_tag)
+                self.index.attach(s_tag)
 
     def _remove_any(self, e: ET.Element) -> None:
         """
@@ -235,7 +338,10 @@ class ApplianceDescription:
         if s_tag is None:
             return
 
-        [t.getparent().remove(t) for t in ApplianceDescription.find_any(s_tag.tag, self.p_dom, s_tag.attrib)]
+        assert self.index is not None
+        for t in self.index.find_any(s_tag.tag, s_tag.attrib):
+            self.index.detach(t)
+            t.getparent().remove(t)
 
     def _set(self, e: ET.Element) -> None:
         """
@@ -248,6 +354,71 @@ class ApplianceDescription:
         try:
             # Crude YAML with no de-idents.
             p_attrs: dict[Any, Any] = yaml.safe_load(os.linesep.join(list(filter(None, [l.strip() for l in attrs.split("\n")]))))
-            [list(map(t.set, p_attrs.keys(), p_attrs.values())) for t in self.p_dom.xpath(e.attrib["xpath"])]
+            for t in self.p_dom.xpath(e.attrib["xpath"]):
+                list(map(t.set, p_attrs.keys(), p_attrs.values()))
+                if self.index is not None:
+                    self.index.visited += 1
+                    self.index.update(t)
         except YamlScannerError as yse:
             log.error(f"Unable to parse set of attributes in YAML for XPath {e.attrib['xpath']}")
+
+    def _get_package_names(self, e: ET.Element) -> list[str]:
+        """
+        Get package names of a bulk op: inline and from the list file, if any.
+        Names are separated by whitespace, everything after "#" is a comment.
+        """
+        data: str = e.text or ""
+        if "file" in e.attrib:
+            pth: str = self.resolve_path(e.attrib["file"], self.base_dir)
+            try:
+                with open(pth) as fr:
+                    data += "\n" + fr.read()
+            except OSError as exc:
+                raise IOError(f'Unable to read package list "{e.attrib["file"]}": {exc}')
+            self.includes.append(pth)
+
+        return list(dict.fromkeys([n for line in data.split("\n") for n in line.split("#", 1)[0].split()]))
+
+    def _add_packages(self, e: ET.Element) -> None:
+        """
+        Add a list of packages to the aggregate with the same attributes,
+        skipping those already there. The aggregate is created if missing.
+        """
+        names: list[str] = self._get_package_names(e)
+        if not names:
+            return
+
+        assert self.index is not None
+        attrs: dict[str, str] = {k: v for k, v in e.attrib.items() if k != "file"}
+        tgts: list[ET.Element] = self.index.match(self.__PKGS, attrs)
+        if not tgts:
+            # New aggregate goes next to the others of its kind
+            tcs: list[ET.Element] = self.index.find_all(self.__PKGS)
+            p: ET.Element | None = tcs[-1].getparent() if tcs else self.p_dom
+            if p is None:
+                return
+            tgts = [ET.SubElement(p, self.__PKGS, attrs)]
+            self.index.attach(tgts[0])
+
+        for tgt in tgts:
+            self.index.visited += len(tgt)
+            present: set[str | None] = set([c.get("name") for c in tgt if c.tag == self.__PKG])
+            for n in names:
+                if n not in present:
+                    self.index.attach(ET.SubElement(tgt, self.__PKG, {"name": n}))
+                    present.add(n)
+
+    def _remove_packages(self, e: ET.Element) -> None:
+        """
+        Remove a list of packages from the aggregate with the same attributes
+        """
+        names: set[str] = set(self._get_package_names(e))
+        if not names:
+            return
+
+        assert self.index is not None
+        for tgt in self.index.match(self.__PKGS, {k: v for k, v in e.attrib.items() if k != "file"}):
+            self.index.visited += len(tgt)
+            for c in [c for c in tgt if c.tag == self.__PKG and c.get("name") in names]:
+                self.index.detach(c)
+                tgt.remove(c)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from typing import Any
+import lxml.etree as ET  # type: ignore
+
+
+class ElementIndex:
+    """
+    Tag and attribute keyed index of a DOM subtree.
+
+    All descendants of the root element are indexed (the root itself is not),
+    so lookups are not walking the whole tree every time. The index has to be
+    told about every structural change with `attach()`, `detach()` or `update()`.
+
+    The index also counts looked up, added, removed and changed elements.
+    """
+
+    def __init__(self, root: ET.Element) -> None:
+        self.root: ET.Element = root
+        self.visited: int = 0
+        self.added: int = 0
+        self.removed: int = 0
+        self.changed: int = 0
+
+        # Insertion ordered sets of elements
+        self.__by_tag: dict[Any, dict[ET.Element, None]] = {}
+        self.__by_attr: dict[tuple[Any, tuple], dict[ET.Element, None]] = {}
+        self.__keys: dict[ET.Element, tuple[Any, tuple]] = {}
+
+        for c in root:
+            self.attach(c)
+        self.added = 0
+
+    @staticmethod
+    def _attrs_key(e: ET.Element) -> tuple:
+        return tuple(sorted(e.attrib.items()))
+
+    def __contains__(self, e: ET.Element) -> bool:
+        return e in self.__keys
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def get_counters(self) -> tuple[int, int, int, int]:
+        """
+        Get numbers of visited, added, removed and changed elements so far
+        """
+        return self.visited, self.added, self.removed, self.changed
+
+    def _add(self, e: ET.Element) -> None:
+        key: tuple[Any, tuple] = (e.tag, self._attrs_key(e))
+        self.__keys[e] = key
+        self.__by_tag.setdefault(e.tag, {})[e] = None
+        self.__by_attr.setdefault(key, {})[e] = None
+
+    def _drop(self, e: ET.Element) -> None:
+        key: tuple[Any, tuple] | None = self.__keys.pop(e, None)
+        if key is None:
+            return
+
+        for bucket, k in ((self.__by_tag, key[0]), (self.__by_attr, key)):
+            b: dict[ET.Element, None] | None = bucket.get(k)
+            if b is not None:
+                b.pop(e, None)
+                if not b:
+                    del bucket[k]
+
+    def attach(self, e: ET.Element) -> None:
+        """
+        Index an element and all its descendants.
+        Should be called after the element is inserted to the tree.
+        """
+        for n in e.iter():
+            self._drop(n)
+            self._add(n)
+            self.added += 1
+
+    def detach(self, e: ET.Element) -> None:
+        """
+        Forget an element and all its descendants.
+        """
+        for n in e.iter():
+            self._drop(n)
+            self.removed += 1
+
+    def update(self, e: ET.Element) -> None:
+        """
+        Re-index an element after its attributes were changed.
+        """
+        self.changed += 1
+        if e in self.__keys:
+            self._drop(e)
+            self._add(e)
+
+    def _is_outermost(self, e: ET.Element, name: Any, attrs: dict[str, str] | None) -> bool:
+        """
+        Returns True if no ancestor (below the root) is matching the same criteria.
+        """
+        p: ET.Element | None = e.getparent()
+        while p is not None and p is not self.root:
+            if p.tag == name and (not attrs or p.attrib == attrs):
+                return False
+            p = p.getparent()
+        return True
+
+    def find_all(self, name: Any, attrs: dict[str, str] | None = None) -> list[ET.Element]:
+        """
+        Same as `ApplianceDescription.find_all()` on the root element:
+        nested matches of an already matched element are not returned.
+        """
+        bucket: dict[ET.Element, None] | None
+        if attrs:
+            bucket = self.__by_attr.get((name, tuple(sorted(dict(attrs).items()))))
+        else:
+            bucket = self.__by_tag.get(name)
+
+        if not bucket:
+            return []
+
+        self.visited += len(bucket)
+        return [e for e in bucket if self._is_outermost(e, name, attrs)]
+
+    def match(self, name: Any, attrs: dict[str, str]) -> list[ET.Element]:
+        """
+        Elements from `find_all(name)` which attributes are precisely equal to the given.
+        """
+        bucket: dict[ET.Element, None] = self.__by_attr.get((name, tuple(sorted(dict(attrs).items()))), {})
+        self.visited += len(bucket)
+        return [e for e in bucket if self._is_outermost(e, name, None)]
+
+    def find_any(self, name: Any, attrs: dict[str, str] | None = None) -> set[ET.Element]:
+        """
+        Same as `ApplianceDescription.find_any()` on the root element:
+        elements should contain at least given attributes.
+        """
+        attrs = attrs or {}
+        return set([e for e in self.find_all(name) if all([k in e.attrib and e.attrib[k] == v for k, v in attrs.items()])])
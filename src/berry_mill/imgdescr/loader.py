@@ -1,7 +1,13 @@
 from __future__ import annotations
+import io
+import os
+import copy
 from typing import Any
 import lxml.etree as ET  # type: ignore [import-untyped]
 from berry_mill.imgdescr.descr import ApplianceDescription
+from berry_mill.imgdescr.serializer import PrettySerializer
+from berry_mill.imgdescr.profiles import ProfileFilter
+from berry_mill.imgdescr.stats import FlattenStats
 
 
 class UqList(list):
@@ -16,57 +22,166 @@ class UqList(list):
 
 class Loader:
 
-    def __init__(self) -> None:
+    def __init__(self, memoize: bool = False, profile: str | None = None, stats: FlattenStats | None = None) -> None:
+        """
+        Memoizing loader keeps parsed descriptions and every flattened level
+        of the inheritance chains between the loads, so the descriptions sharing
+        the same bases are not parsing and flattening them again.
+
+        If profile is given, sections of all other profiles are dropped
+        before the inheritance ops are applied.
+
+        If stats are given, all applied inheritance ops are recorded there.
+        """
+        self.profile: str | None = profile
+        self.stats: FlattenStats | None = stats
         self.__i_stack = UqList()
+        self.__i_docs: dict[str, ET.Element] = {}
+        self.__m_docs: dict[str, ET.Element] | None = {} if memoize else None
+        # Flattened levels by their path and the profiles they are pruned to
+        self.__m_flat: dict[tuple[str, frozenset[str] | None], ET.Element] = {}
+        self.__m_deps: dict[tuple[str, frozenset[str] | None], set[str]] = {}  # Files every flattened level is made of
         self.is_derived: bool = False
         self.main_appliance_pth: str = ""
 
-    def _traverse(self, pth: str) -> None:
+        # Inheritance chain of the last loaded description, base first
+        self.chain: list[str] = []
+        # Other files, the last loaded description is made of, such as package lists
+        self.includes: list[str] = []
+        # Flattened tree of the last loaded description
+        self.dom: ET.Element | None = None
+
+    def _parse(self, pth: str) -> ET.Element:
         """
-        Traverse the inheritance path
+        Parse description
         """
-        self.__i_stack.append(pth)
-        doc: ET.Element | None = None
+        if self.__m_docs is not None and os.path.abspath(pth) in self.__m_docs:
+            return self.__m_docs[os.path.abspath(pth)]
+
         try:
             with open(pth) as fp:
-                doc = ET.fromstring(fp.read().encode("utf-8"))
+                doc: ET.Element = ET.fromstring(fp.read().encode("utf-8"))
         except Exception as exc:
             raise IOError(f'Exception while accessing "{pth}": {exc}')
 
+        if self.__m_docs is not None:
+            self.__m_docs[os.path.abspath(pth)] = doc
+
+        return doc
+
+    def _traverse(self, pth: str) -> None:
+        """
+        Traverse the inheritance path
+        """
+        self.__i_stack.append(pth)
+        doc: ET.Element = self._parse(pth)
+        self.__i_docs[pth] = doc
+
         l_iht: list[ET.Element] | None = ApplianceDescription.find_all("inherit", doc)
         if l_iht:
             self.is_derived = True
-            self.__i_stack.append(next(iter(l_iht)).attrib["path"])
+            # Inherited path is relative to the inheriting description
+            self.__i_stack.append(ApplianceDescription.resolve_path(next(iter(l_iht)).attrib["path"], os.path.dirname(pth)))
             self._traverse(self.__i_stack[-1])
         else:
             self.main_appliance_pth = pth
             self.__i_stack.append(pth)
 
-    def _flatten(self) -> str:
+    def _flatten_dom(self) -> ET.Element:
         """
-        Flatten traversal path
+        Flatten traversal path to a DOM.
+
+        Every description is parsed only once while traversing, and the resulting tree
+        is passed on to the next level as is. Memoizing loader starts from the
+        deepest already flattened level and keeps copies of the new ones.
+
+        Used profiles depend on the whole chain, so the levels pruned early
+        are memoized per used profiles and are not shared with other chains.
         """
         self.__i_stack.reverse()
 
-        # init base
-        descr: ApplianceDescription | None = None
-        with open(next(iter(self.__i_stack))) as fd:
-            descr = ApplianceDescription(fd.read())
+        pf: ProfileFilter | None = None
+        pf_early: bool = False
+        pruned: frozenset[str] | None = None  # Profiles the memoized levels are pruned to
+        if self.profile:
+            docs: list[ET.Element] = [self.__i_docs[pth] for pth in self.__i_stack]
+            pf = ProfileFilter(self.profile, docs)
+            pf_early = ProfileFilter.is_safe(docs)
+            if pf_early and pf.profiles is not None:
+                pruned = frozenset(pf.profiles)
 
-        for pth in self.__i_stack[1:]:
-            with open(pth) as fp:
-                descr = ApplianceDescription(fp.read(), descr.to_str())
+        p_dom: ET.Element | None = None
+        start: int = 0
+        deps: set[str] = set()
+        if self.__m_docs is not None:
+            for idx in range(len(self.__i_stack) - 1, -1, -1):
+                key: tuple[str, frozenset[str] | None] = (os.path.abspath(self.__i_stack[idx]), pruned)
+                if key in self.__m_flat:
+                    p_dom = copy.deepcopy(self.__m_flat[key])
+                    deps = set(self.__m_deps[key])
+                    start = idx + 1
+                    break
+
+        for pth in self.__i_stack[start:]:
+            # Memoized documents should stay intact
+            s_dom: ET.Element = self.__i_docs[pth] if self.__m_docs is None else copy.deepcopy(self.__i_docs[pth])
+            if pf is not None and pf_early:
+                pf.prune(s_dom)
+
+            if self.stats is not None:
+                self.stats.begin(pth)
+            descr: ApplianceDescription = ApplianceDescription(s_dom, p_dom, stats=self.stats, base_dir=os.path.dirname(pth))
+            p_dom = descr.p_dom
+            deps.update([os.path.abspath(p) for p in [pth] + descr.includes])
+            if self.__m_docs is not None:
+                self.__m_flat[(os.path.abspath(pth), pruned)] = copy.deepcopy(p_dom)
+                self.__m_deps[(os.path.abspath(pth), pruned)] = set(deps)
 
-        return descr.to_str()
+        if pf is not None and p_dom is not None:
+            pf.prune(p_dom)
+
+        self.includes = sorted(deps.difference([os.path.abspath(p) for p in self.__i_stack]))
+
+        return p_dom
+
+    def _flatten(self) -> str:
+        """
+        Flatten traversal path.
+        Serialisation happens only for the final result.
+        """
+        out: io.StringIO = io.StringIO()
+        self.dom = self._flatten_dom()
+        PrettySerializer().write(self.dom, out)
+        return out.getvalue()
+
+    def invalidate(self, pth: str) -> None:
+        """
+        Forget everything memoized about a changed description:
+        its parsed document and all flattened levels, which are based on it.
+        Unchanged levels below it are reused on the next load.
+        """
+        key: str = os.path.abspath(pth)
+        if self.__m_docs is not None:
+            self.__m_docs.pop(key, None)
+
+        for lvl in [lvl for lvl, deps in self.__m_deps.items() if key in deps]:
+            del self.__m_flat[lvl]
+            del self.__m_deps[lvl]
 
     def load(self, pth: str) -> str:
         """
         Load appliance description
         """
-        self._traverse(pth)
-        out = self._flatten()
-
-        # Reset
-        self.__i_stack.clear()
+        self.is_derived = False
+        self.dom = None
+        self.includes = []
+        try:
+            self._traverse(pth)
+            out = self._flatten()
+            self.chain = list(self.__i_stack)
+        finally:
+            # Reset
+            self.__i_stack.clear()
+            self.__i_docs.clear()
 
         return out
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import logging
+import lxml.etree as ET  # type: ignore
+
+log = logging.getLogger("kiwi")
+
+
+class ProfileFilter:
+    """
+    Drops profile-specific sections, those are not used by the selected profile.
+
+    Profiles are resolved the same way as Kiwi does when a profile is selected:
+    the selected profile and all profiles it requires, recursively.
+    Profiles marked as imported are not used in this case.
+    """
+
+    P_ATTR: str = "profiles"
+
+    def __init__(self, profile: str, docs: list[ET.Element]) -> None:
+        """
+        Profile declarations are looked up in all given documents of the inheritance chain.
+        """
+        self.profile: str = profile
+        self.profiles: set[str] | None = self._resolve(docs)
+
+    def _resolve(self, docs: list[ET.Element]) -> set[str] | None:
+        """
+        Resolve used profiles, None if the selected profile is not declared.
+        """
+        requires: dict[str, list[str]] = {}
+        for doc in docs:
+            for p in doc.iter("profile"):
+                if p.get("name"):
+                    requires.setdefault(p.get("name"), []).extend(
+                        [r.get("profile") for r in p.iter("requires") if r.get("profile")]
+                    )
+
+        if self.profile not in requires:
+            log.warning(f'Profile "{self.profile}" is not declared, nothing is pruned')
+            return None
+
+        used: set[str] = set()
+        pending: list[str] = [self.profile]
+        while pending:
+            p = pending.pop()
+            if p not in used:
+                used.add(p)
+                pending += requires.get(p, [])
+
+        return used
+
+    @staticmethod
+    def is_safe(docs: list[ET.Element]) -> bool:
+        """
+        Sections cannot be dropped before the inheritance ops are applied,
+        if any `<set/>` op might be changing their profiles.
+        """
+        for doc in docs:
+            for s in doc.iter("set"):
+                if ProfileFilter.P_ATTR in (s.text or ""):
+                    return False
+        return True
+
+    def is_used(self, e: ET.Element) -> bool:
+        """
+        Returns True if an element belongs to the used profiles or is not profile-specific.
+        """
+        if self.profiles is None or self.P_ATTR not in e.attrib:
+            return True
+
+        return bool(self.profiles.intersection([p.strip() for p in e.attrib[self.P_ATTR].split(",")]))
+
+    def prune(self, dom: ET.Element) -> int:
+        """
+        Drop sections of unused profiles from the tree.
+        Returns the number of dropped sections.
+        """
+        if self.profiles is None:
+            return 0
+
+        dropped: list[ET.Element] = [e for e in dom.iter() if e is not dom and not self.is_used(e)]
+        for e in dropped:
+            p: ET.Element | None = e.getparent()
+            if p is not None:
+                p.remove(e)
+
+        return len(dropped)
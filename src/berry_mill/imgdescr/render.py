@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import os
+import glob
+import pickle
+import logging
+import threading
+import lxml.etree as ET  # type: ignore
+from berry_mill.imgdescr.descr import ApplianceDescription
+from berry_mill.imgdescr.loader import Loader
+from berry_mill.imgdescr.stats import FlattenStats
+
+log = logging.getLogger("kiwi")
+
+
+class RenderResult:
+    """
+    Result of rendering one appliance description
+    """
+
+    def __init__(self, descr: str, output: str = "", error: Exception | None = None, stats: FlattenStats | None = None) -> None:
+        self.descr: str = descr
+        self.output: str = output
+        self.error: Exception | None = error
+        self.stats: FlattenStats | None = stats
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return "<{} of {} {}>".format(
+            self.__class__.__name__, self.descr, self.ok and "to " + self.output or f"failed: {self.error}"
+        )
+
+
+def _render_group(descr: list[str], output_dir: str, profile: str | None, stats: bool) -> list[RenderResult]:
+    """
+    Render a group of descriptions in a worker process
+    """
+    results: list[RenderResult] = Renderer(output_dir=output_dir, profile=profile, stats=stats).render_many(descr)
+    for r in results:
+        try:
+            pickle.dumps(r.error)
+        except Exception:
+            r.error = Exception(str(r.error))
+    return results
+
+
+class Renderer:
+    """
+    Batch renderer of appliance descriptions.
+
+    All descriptions are rendered in one run with one memoizing loader,
+    so the shared bases of inheritance chains are parsed and flattened only once.
+    Descriptions with independent inheritance chains can be rendered in parallel
+    by a pool of worker processes, each having its own loader.
+
+    With stats, each result has statistics of the inheritance ops,
+    applied while rendering it.
+    """
+
+    def __init__(self, *descr: str, output_dir: str, jobs: int = 1, profile: str | None = None, stats: bool = False) -> None:
+        self.output_dir: str = output_dir
+        self.descriptions: list[str] = self.expand(*descr)
+        self.jobs: int = max(1, jobs)
+        self.profile: str | None = profile
+        self.stats: bool = stats
+        self._loader: Loader = Loader(memoize=True, profile=profile)
+        self._bases: dict[str, str | None] = {}
+        self._chains: dict[str, list[str]] = {}
+
+    @staticmethod
+    def expand(*descr: str) -> list[str]:
+        """
+        Expand globs in description paths, keeping their order and skipping duplicates.
+        """
+        out: list[str] = []
+        for d in descr:
+            for pth in glob.has_magic(d) and sorted(glob.glob(d)) or [d]:
+                if pth not in out:
+                    out.append(pth)
+        return out
+
+    def get_output_path(self, descr: str) -> str:
+        """
+        Get output path of the rendered description
+        """
+        return os.path.join(self.output_dir, os.path.basename(descr))
+
+    def _check_outputs(self) -> None:
+        """
+        Descriptions should not overwrite each other
+        """
+        seen: dict[str, str] = {}
+        for d in self.descriptions:
+            out: str = self.get_output_path(d)
+            if out in seen:
+                raise Exception(f'Descriptions "{seen[out]}" and "{d}" would be both rendered to "{out}"')
+            if os.path.abspath(out) == os.path.abspath(d):
+                raise Exception(f'Description "{d}" would be overwritten by its rendered version')
+            seen[out] = d
+
+    def render_one(self, descr: str) -> RenderResult:
+        """
+        Render one description to the output directory
+        """
+        out: str = self.get_output_path(descr)
+        stats: FlattenStats | None = FlattenStats() if self.stats else None
+        self._loader.stats = stats
+        try:
+            rendered: str = self._loader.load(descr)
+            self._chains[descr] = [os.path.abspath(p) for p in self._loader.chain] + self._loader.includes
+            with open(out, "w") as fw:
+                fw.write(rendered)
+        except Exception as exc:
+            log.error(f'Unable to render "{descr}": {exc}')
+            self._chains.pop(descr, None)
+            return RenderResult(descr, error=exc, stats=stats)
+
+        return RenderResult(descr, output=out, stats=stats)
+
+    def render_many(self, descr: list[str]) -> list[RenderResult]:
+        """
+        Render given descriptions one after another
+        """
+        return [self.render_one(d) for d in descr]
+
+    def _get_inherited(self, pth: str) -> str | None:
+        """
+        Get inherited description path, if any
+        """
+        key: str = os.path.abspath(pth)
+        if key not in self._bases:
+            self._bases[key] = None
+            try:
+                for _, e in ET.iterparse(pth, events=("start",)):
+                    if e.tag == "inherit" and "path" in e.attrib:
+                        self._bases[key] = ApplianceDescription.resolve_path(e.attrib["path"], os.path.dirname(pth))
+                        break
+            except Exception:
+                pass  # Loader will report it
+        return self._bases[key]
+
+    def get_groups(self) -> list[list[str]]:
+        """
+        Group descriptions by the base of their inheritance chains.
+        Groups are split further, if there are less of them than workers.
+        """
+        groups: dict[str, list[str]] = {}
+        for d in self.descriptions:
+            base: str = d
+            seen: set[str] = set()
+            while True:
+                seen.add(os.path.abspath(base))
+                parent: str | None = self._get_inherited(base)
+                if parent is None or os.path.abspath(parent) in seen:
+                    break
+                base = parent
+            groups.setdefault(os.path.abspath(base), []).append(d)
+
+        out: list[list[str]] = list(groups.values())
+        while len(out) < self.jobs:
+            out.sort(key=len)
+            if len(out[-1]) < 2:
+                break
+            g: list[str] = out.pop()
+            out += [g[: len(g) // 2], g[len(g) // 2 :]]
+
+        return out
+
+    def _render_parallel(self) -> list[RenderResult]:
+        """
+        Render independent groups of descriptions in worker processes
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        results: dict[str, RenderResult] = {}
+        groups: list[list[str]] = self.get_groups()
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(groups))) as pool:
+            for g, f in [(g, pool.submit(_render_group, g, self.output_dir, self.profile, self.stats)) for g in groups]:
+                try:
+                    for r in f.result():
+                        results[r.descr] = r
+                except Exception as exc:
+                    log.error(f"Rendering worker failed: {exc}")
+                    for d in g:
+                        results[d] = RenderResult(d, error=exc)
+
+        return [results[d] for d in self.descriptions]
+
+    def render(self) -> list[RenderResult]:
+        """
+        Render all descriptions
+        """
+        self._check_outputs()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        if self.jobs > 1 and len(self.descriptions) > 1:
+            return self._render_parallel()
+
+        return self.render_many(self.descriptions)
+
+    def get_affected(self, changed: set[str]) -> list[str]:
+        """
+        Get descriptions, those inheritance chains or included files have any of the changed files.
+        Descriptions, which were failing to render, are always affected.
+        """
+        return [d for d in self.descriptions if d not in self._chains or changed.intersection(self._chains[d])]
+
+    def watch(self, stop: threading.Event | None = None, timeout: float = 0.5) -> None:
+        """
+        Render all descriptions and keep re-rendering them on every change
+        of any file in their inheritance chains, until stopped.
+
+        Parsed documents and flattened levels stay in memory between the runs,
+        so only the changed levels and those above them are applied again.
+        """
+        from berry_mill.imgdescr.watch import ChangeWatcher
+
+        self._check_outputs()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        watcher: ChangeWatcher = ChangeWatcher()
+        try:
+            self.render_many(self.descriptions)
+            while stop is None or not stop.is_set():
+                for d in self.descriptions:
+                    watcher.watch(d, *self._chains.get(d, []))
+
+                changed: set[str] = watcher.wait(timeout)
+                if not changed:
+                    continue
+
+                for pth in changed:
+                    log.debug(f'Description "{pth}" has changed')
+                    self._loader.invalidate(pth)
+
+                for r in self.render_many(self.get_affected(changed)):
+                    r.ok and log.info(f'Rendered "{r.descr}" to "{r.output}"')  # type: ignore [func-returns-value]
+        finally:
+            watcher.close()
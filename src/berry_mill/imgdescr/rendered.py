@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import io
+import lxml.etree as ET  # type: ignore
+from berry_mill.imgdescr.serializer import PrettySerializer
+
+
+class RenderedDescription:
+    """
+    Rendered appliance description, shared by all stages of one build.
+
+    It is parsed at most once, whatever is given: a tree, an XML string or
+    just a path to the description file. Everything else is taken from the tree.
+    """
+
+    def __init__(self, path: str, dom: ET.Element | None = None, xml: str | None = None) -> None:
+        self.path: str = path
+        self._dom: ET.Element | None = dom
+        self._xml: str | None = xml
+
+    @property
+    def dom(self) -> ET.Element:
+        """
+        Parsed description
+        """
+        if self._dom is None:
+            if self._xml is not None:
+                self._dom = ET.fromstring(self._xml.encode("utf-8"))
+            else:
+                self._dom = ET.parse(self.path).getroot()
+        return self._dom
+
+    @property
+    def profiles(self) -> list[str]:
+        """
+        Names of all declared profiles
+        """
+        return self.dom.xpath("//profile/@name")
+
+    @property
+    def image_name(self) -> str:
+        """
+        Image name
+        """
+        names: list[str] = self.dom.xpath("//image/@name")
+        if not names:
+            raise Exception("Image name is not defined")
+        return names[0]
+
+    def to_str(self) -> str:
+        """
+        Export description to an XML string
+        """
+        if self._xml is None:
+            out: io.StringIO = io.StringIO()
+            PrettySerializer().write(self.dom, out)
+            self._xml = out.getvalue()
+        return self._xml
+
+    def write(self, path: str | None = None) -> None:
+        """
+        Write description to the file, its own path by default.
+        """
+        with open(path or self.path, "w") as fw:
+            fw.write(self.to_str())
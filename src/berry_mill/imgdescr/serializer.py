@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from typing import IO, Any
+import lxml.etree as ET  # type: ignore
+
+
+class _LineWriter:
+    """
+    Writes only non-blank lines, stripped from trailing whitespace.
+    Lines are joined with the newline, no newline at the very end.
+    """
+
+    def __init__(self, fp: IO[str]) -> None:
+        self._fp: IO[str] = fp
+        self._buff: list[str] = []
+        self._started: bool = False
+
+    def _flush_line(self, line: str) -> None:
+        if not line.strip():
+            return
+
+        if self._started:
+            self._fp.write("\n")
+        self._fp.write(line.rstrip())
+        self._started = True
+
+    def write(self, data: str) -> None:
+        if "\n" not in data:
+            self._buff.append(data)
+            return
+
+        lines: list[str] = data.split("\n")
+        self._buff.append(lines[0])
+        self._flush_line("".join(self._buff))
+        for line in lines[1:-1]:
+            self._flush_line(line)
+        self._buff = [lines[-1]]
+
+    def close(self) -> None:
+        self._flush_line("".join(self._buff))
+        self._buff = []
+
+
+class PrettySerializer:
+    """
+    Pretty-printing XML serializer, writing straight from the lxml tree.
+
+    The output is the same as `xml.dom.minidom` pretty-printing of the same tree
+    with all blank lines dropped, but without making any copies of the document.
+    """
+
+    def __init__(self, indent: str = "  ") -> None:
+        self.indent: str = indent
+        self._has_ns: bool = False
+
+    @staticmethod
+    def _escape(data: str) -> str:
+        return data.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(">", "&gt;")
+
+    @staticmethod
+    def _qname(e: ET.Element, name: str) -> str:
+        """
+        Get qualified name of a tag or attribute in Clark's notation
+        """
+        if name[0] != "{":
+            return name
+
+        uri, local = name[1:].split("}", 1)
+        for prefix, ns in e.nsmap.items():
+            if ns == uri and prefix:
+                return f"{prefix}:{local}"
+        return local
+
+    def _children(self, e: ET.Element) -> list[Any]:
+        """
+        Get child nodes, where text nodes are just strings
+        """
+        out: list[Any] = []
+        e.text and out.append(e.text)  # type: ignore [func-returns-value]
+        for c in e:
+            out.append(c)
+            c.tail and out.append(c.tail)  # type: ignore [func-returns-value]
+
+        # Adjacent texts are one text node
+        nodes: list[Any] = []
+        for n in out:
+            if isinstance(n, str) and nodes and isinstance(nodes[-1], str):
+                nodes[-1] += n
+            else:
+                nodes.append(n)
+
+        return nodes
+
+    def _write_node(self, w: _LineWriter, n: Any, indent: str) -> None:
+        if isinstance(n, str):
+            w.write(self._escape(indent + n + "\n"))
+        elif isinstance(n, ET._Comment):
+            w.write(f"{indent}<!--{n.text or ''}-->\n")
+        elif isinstance(n, ET._ProcessingInstruction):
+            w.write(f"{indent}<?{n.target} {n.text or ''}?>\n")
+        elif isinstance(n, ET._Entity):
+            w.write(f"{indent}{n.text}\n")
+        else:
+            self._write_element(w, n, indent)
+
+    def _write_element(self, w: _LineWriter, e: ET.Element, indent: str, top: bool = False) -> None:
+        tag: str = ET.QName(e).localname
+        if e.prefix:
+            tag = f"{e.prefix}:{tag}"
+        w.write(f"{indent}<{tag}")
+
+        # Namespace declarations, those are new at this element
+        if self._has_ns:
+            p_nsmap: dict[Any, str] = {} if top or e.getparent() is None else e.getparent().nsmap
+            for prefix, uri in e.nsmap.items():
+                if p_nsmap.get(prefix) != uri:
+                    w.write(' {}="{}"'.format(prefix and f"xmlns:{prefix}" or "xmlns", self._escape(uri)))
+
+        for k, v in e.attrib.items():
+            w.write(' {}="{}"'.format(self._qname(e, k), self._escape(v)))
+
+        nodes: list[Any] = self._children(e)
+        if not nodes:
+            w.write("/>\n")
+            return
+
+        w.write(">")
+        if len(nodes) == 1 and isinstance(nodes[0], str):
+            w.write(self._escape(nodes[0]))
+        else:
+            w.write("\n")
+            for n in nodes:
+                self._write_node(w, n, indent + self.indent)
+            w.write(indent)
+        w.write(f"</{tag}>\n")
+
+    def write(self, e: ET.Element, fp: IO[str]) -> None:
+        """
+        Write pretty-printed XML document of the element to a file object.
+        """
+        self._has_ns = bool(e.xpath("boolean(//namespace::*[name() != 'xml'])"))
+
+        w: _LineWriter = _LineWriter(fp)
+        w.write('<?xml version="1.0" ?>\n')
+        self._write_element(w, e, "", top=True)
+        w.close()
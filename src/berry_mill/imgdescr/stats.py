@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+class OpStats:
+    """
+    Statistics of one inheritance op block of a description
+    """
+
+    def __init__(
+        self,
+        level: str,
+        op: str,
+        line: int | None = None,
+        time: float = 0.0,
+        visited: int = 0,
+        added: int = 0,
+        removed: int = 0,
+        changed: int = 0,
+    ) -> None:
+        self.level: str = level
+        self.op: str = op
+        self.line: int | None = line
+        self.time: float = time
+        self.visited: int = visited
+        self.added: int = added
+        self.removed: int = removed
+        self.changed: int = changed
+
+    @property
+    def noop(self) -> bool:
+        """
+        Op did not change anything
+        """
+        return not (self.added or self.removed or self.changed)
+
+    def as_dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+    def __repr__(self) -> str:
+        return "<{} of {} at {}:{} {:.6f}s>".format(self.__class__.__name__, self.op, self.level, self.line, self.time)
+
+
+class FlattenStats:
+    """
+    Collector of statistics of all inheritance ops, applied while flattening.
+
+    Each chain level is recorded when it is actually applied: levels reused
+    by a memoizing loader are not applied again and therefore not recorded.
+    """
+
+    def __init__(self) -> None:
+        self.records: list[OpStats] = []
+        self.level: str = ""
+
+    def begin(self, level: str) -> None:
+        """
+        Start recording ops of the next chain level
+        """
+        self.level = level
+
+    def add(self, rec: OpStats) -> None:
+        self.records.append(rec)
+
+    def extend(self, other: FlattenStats | list[OpStats]) -> None:
+        """
+        Add records of other statistics
+        """
+        self.records += other.records if isinstance(other, FlattenStats) else other
+
+    def get_expensive(self, top: int = 0) -> list[OpStats]:
+        """
+        Get records ordered from the slowest, all or only the given top of them
+        """
+        out: list[OpStats] = sorted(self.records, key=lambda r: r.time, reverse=True)
+        return out[:top] if top else out
+
+    def get_noop(self) -> list[OpStats]:
+        """
+        Get records of the ops, which did not change anything
+        """
+        return [r for r in self.records if r.noop]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"ops": [r.as_dict() for r in self.records]}
+
+    def report(self, top: int = 0) -> str:
+        """
+        Human-readable report, slowest ops first
+        """
+        if not self.records:
+            return "No inheritance ops were applied"
+
+        rows: list[tuple[str, ...]] = [("TIME, ms", "VISITED", "ADDED", "REMOVED", "CHANGED", "OP", "LOCATION")]
+        for r in self.get_expensive(top):
+            rows.append(
+                (
+                    "{:.3f}".format(r.time * 1000),
+                    str(r.visited),
+                    str(r.added),
+                    str(r.removed),
+                    str(r.changed),
+                    r.op + (r.noop and " (no-op)" or ""),
+                    f"{r.level}:{r.line}",
+                )
+            )
+
+        widths: list[int] = [max([len(row[i]) for row in rows]) for i in range(len(rows[0]))]
+        out: list[str] = [
+            "  ".join([c.rjust(w) for c, w in zip(row[:5], widths)] + [row[5].ljust(widths[5]), row[6]]) for row in rows
+        ]
+        out.append(
+            "{} ops in {} levels, {:.3f} ms total, {} no-op".format(
+                len(self.records),
+                len(set([r.level for r in self.records])),
+                sum([r.time for r in self.records]) * 1000,
+                len(self.get_noop()),
+            )
+        )
+        return "\n".join(out)
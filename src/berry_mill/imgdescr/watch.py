@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+log = logging.getLogger("kiwi")
+
+
+class _Inotify:
+    """
+    Minimal inotify binding through libc.
+
+    Directories are watched instead of the files themselves, because editors
+    often save a file by writing a new one and renaming it over the old one.
+    """
+
+    IN_CLOSE_WRITE: int = 0x00000008
+    IN_MOVED_TO: int = 0x00000080
+    IN_CREATE: int = 0x00000100
+    IN_CLOEXEC: int = 0o2000000
+    MASK: int = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    _EVENT: struct.Struct = struct.Struct("iIII")
+
+    def __init__(self) -> None:
+        self._libc: ctypes.CDLL = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd: int = self._libc.inotify_init1(self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify is not available")
+        self._wds: dict[int, str] = {}
+
+    def add(self, d: str) -> None:
+        if d in self._wds.values():
+            return
+
+        wd: int = self._libc.inotify_add_watch(self._fd, os.fsencode(d), self.MASK)
+        if wd < 0:
+            log.warning(f'Unable to watch "{d}": {os.strerror(ctypes.get_errno())}')
+        else:
+            self._wds[wd] = d
+
+    def read(self, timeout: float | None) -> set[str]:
+        """
+        Return paths of changed files, waiting for the first change up to the timeout
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+
+        out: set[str] = set()
+        data: bytes = os.read(self._fd, 0x10000)
+        offset: int = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, _, _, size = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name: bytes = data[offset : offset + size].rstrip(b"\0")
+            offset += size
+            if wd in self._wds and name:
+                out.add(os.path.join(self._wds[wd], os.fsdecode(name)))
+        return out
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _Poller:
+    """
+    Fallback for systems without inotify: polls modification times of the files
+    """
+
+    INTERVAL: float = 0.2
+
+    def __init__(self) -> None:
+        self._mtimes: dict[str, float | None] = {}
+
+    @staticmethod
+    def _mtime(pth: str) -> float | None:
+        try:
+            return os.stat(pth).st_mtime_ns
+        except OSError:
+            return None
+
+    def add(self, pth: str) -> None:
+        if pth not in self._mtimes:
+            self._mtimes[pth] = self._mtime(pth)
+
+    def read(self, timeout: float | None) -> set[str]:
+        start: float = time.monotonic()
+        while True:
+            out: set[str] = set()
+            for pth, mtime in list(self._mtimes.items()):
+                self._mtimes[pth] = self._mtime(pth)
+                if self._mtimes[pth] != mtime:
+                    out.add(pth)
+            if out or (timeout is not None and time.monotonic() - start >= timeout):
+                return out
+            time.sleep(self.INTERVAL)
+
+    def close(self) -> None:
+        self._mtimes.clear()
+
+
+class ChangeWatcher:
+    """
+    Watches a set of files for changes.
+    Uses inotify where available, otherwise falls back to polling.
+    """
+
+    # Time to wait for more changes of one save, e.g. a rename after the write
+    SETTLE: float = 0.02
+
+    def __init__(self) -> None:
+        self._files: set[str] = set()
+        self._backend: _Inotify | _Poller
+        try:
+            self._backend = _Inotify()
+        except (OSError, AttributeError) as exc:
+            log.debug(f"Polling for changes, inotify is not available: {exc}")
+            self._backend = _Poller()
+
+    def watch(self, *pth: str) -> None:
+        """
+        Add files to watch
+        """
+        for p in map(os.path.abspath, pth):
+            self._files.add(p)
+            self._backend.add(os.path.dirname(p) if isinstance(self._backend, _Inotify) else p)
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        """
+        Wait for the watched files to change.
+        Returns absolute paths of the changed files, empty set on timeout.
+        """
+        out: set[str] = self._backend.read(timeout) & self._files
+        if out:
+            # Collect the rest of the same save
+            while True:
+                more: set[str] = self._backend.read(self.SETTLE)
+                if not more:
+                    break
+                out |= more & self._files
+        return out
+
+    def close(self) -> None:
+        self._backend.close()
@@ -5,12 +5,19 @@ Interafce Module for Kiwi Tasks (general)
 import os
 import sys
 import pathlib
-from typing import Dict, List
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
 from abc import ABC, abstractmethod
+from berry_mill.tracing import traced
 
-from berry_mill.boxbuild import BoxBuildTask
-from berry_mill.localwrap import LocalBuildTask
-from berry_mill.preparetask import PrepareTask
+# Kiwi tasks are imported by each app on run, so e.g. a local build
+# never imports the boxed plugin
+
+# Kiwi tasks parse sys.argv on construction
+_argv_lock: threading.Lock = threading.Lock()
+
+BOXED_PLUGIN_CFG: str = "/etc/berrymill/kiwi_boxed_plugin.yml"
 
 
 class KiwiApp(ABC):
@@ -22,7 +29,20 @@ class KiwiApp(ABC):
 
     def __init__(self, argv: List[str], repos: Dict[str, Dict[str, str]]):
         self._repos = repos
-        sys.argv = argv
+        self._argv: List[str] = argv
+
+    def _get_task(self, task: Any, *args: Any) -> Any:
+        """
+        Construct kiwi task on the command line of this app.
+        The process command line is set only for that time and restored afterwards.
+        """
+        with _argv_lock:
+            argv: List[str] = sys.argv
+            sys.argv = self._argv
+            try:
+                return task(*args)
+            finally:
+                sys.argv = argv
 
     def _check_gnupg_dir(self) -> None:
         """
@@ -42,12 +62,15 @@ class KiwiAppPrepare(KiwiApp):
     Interface between Berrymill and Kiwi-ng Prepare Wrapper
     """
 
+    @traced("kiwi.system.prepare")
     def run(self) -> None:
         """
         create $HOME/.gnupg if needed and run prepare task
         """
+        from berry_mill.preparetask import PrepareTask
+
         self._check_gnupg_dir()
-        PrepareTask(self._repos).process()
+        self._get_task(PrepareTask, self._repos).process()
 
 
 class KiwiAppLocal(KiwiApp):
@@ -55,12 +78,15 @@ class KiwiAppLocal(KiwiApp):
     Interface between Berrymill and Kiwi-ng build Wrapper
     """
 
+    @traced("kiwi.system.build")
     def run(self) -> None:
         """
         create $HOME/.gnupg if needed and run local build task process
         """
+        from berry_mill.localwrap import LocalBuildTask
+
         self._check_gnupg_dir()
-        LocalBuildTask(self._repos).process()
+        self._get_task(LocalBuildTask, self._repos).process()
 
 
 class KiwiAppBox(KiwiApp):
@@ -68,17 +94,39 @@ class KiwiAppBox(KiwiApp):
     Interface between Berrymill and Kiwi-ng boxbuild Wrapper
     """
 
-    def __init__(self, argv: List[str], repos: Dict[str, Dict[str, str]], args_tmp_dir: str):
+    def __init__(self, argv: List[str], repos: Dict[str, Dict[str, str]], args_tmp_dir: str, plugin_cfg: str = ""):
         super().__init__(argv, repos)
 
+        self._plugin_cfg: str = plugin_cfg or BOXED_PLUGIN_CFG
         self._tmpd = args_tmp_dir
         self._arg_file_name: str = "args.txt"
         self._arg_file_path: str = os.path.join(self._tmpd, self._arg_file_name)
 
+    @traced("kiwi.system.boxbuild")
     def run(self) -> None:
+        from berry_mill.boxbuild import BoxBuildTask
+
         repostring: str = self._generate_repo_string(self._repos)
 
-        BoxBuildTask(repostring).process()
+        with self._plugin_config():
+            self._get_task(BoxBuildTask, repostring).process()
+
+    @contextmanager
+    def _plugin_config(self) -> Iterator[None]:
+        """
+        Point the boxed plugin to its configuration file.
+        The plugin reads it from the environment, when the box is set up by the task process,
+        so the variable is set for the run only and restored afterwards.
+        """
+        prev: str | None = os.environ.get("KIWI_BOXED_PLUGIN_CFG")
+        os.environ["KIWI_BOXED_PLUGIN_CFG"] = self._plugin_cfg
+        try:
+            yield
+        finally:
+            if prev is None:
+                os.environ.pop("KIWI_BOXED_PLUGIN_CFG", None)
+            else:
+                os.environ["KIWI_BOXED_PLUGIN_CFG"] = prev
 
     def _get_relative_path(self) -> str:
         """
@@ -7,15 +7,13 @@ from typing_extensions import Unpack
 import os
 import shutil
 import tempfile
-import requests  # type: ignore
-import inquirer  # type: ignore
-import subprocess
-from http import HTTPStatus
-from lxml import etree  # type: ignore
-from urllib.parse import ParseResult, urljoin, urlparse
+from urllib.parse import ParseResult, urlparse
 from typing import Dict
 
 from berry_mill.params import KiwiParams
+from berry_mill.repokeys import RepoKeys, verify_gpg_key
+from berry_mill.imgdescr.rendered import RenderedDescription
+from berry_mill.tracing import span
 
 log = kiwi.logging.getLogger("kiwi")
 
@@ -27,14 +25,27 @@ class KiwiParent:
     such as repository and global kiwi params handling
     """
 
-    def __init__(self, descr: str, **pkw: Unpack[KiwiParams]):
+    def __init__(self, descr: str | RenderedDescription, **pkw: Unpack[KiwiParams]):
+        """
+        Description is either a path or an already rendered description,
+        which is then shared with all the build stages instead of parsing it again.
+
+        Appliance directory is the one of an absolute description path,
+        otherwise the current directory.
+        """
         self._repos: Dict[str, Dict[str, str]] = {}
-        self._appliance_path: str = os.getcwd()
-        self._appliance_descr: str = descr
+        self._descr: RenderedDescription = descr if isinstance(descr, RenderedDescription) else RenderedDescription(descr)
+        if os.path.isabs(self._descr.path):
+            self._appliance_path: str = os.path.dirname(self._descr.path)
+            self._appliance_descr: str = os.path.basename(self._descr.path)
+        else:
+            self._appliance_path = os.getcwd()
+            self._appliance_descr = self._descr.path
         self._trusted_gpg_d: str = "/etc/apt/trusted.gpg.d"
         self._tmpdir: str = tempfile.mkdtemp(prefix="berrymill-keys-", dir="/tmp")
+        self._keys: RepoKeys = RepoKeys(self._tmpdir, offline=bool(pkw.get("offline")))
         self._kiwiparams: KiwiParams = pkw
-        self._kiwi_options: List[str] = [f"--kiwi-file={descr}"]
+        self._kiwi_options: List[str] = [f"--kiwi-file={self._appliance_descr}"]
         self._initialized: bool = False
 
         if self._kiwiparams.get("debug"):
@@ -42,14 +53,14 @@ class KiwiParent:
 
         log.info('Using appliance "{}" located at "{}"'.format(self._appliance_descr, self._appliance_path))
         try:
-            config_tree = etree.parse(f"{self._appliance_descr}")
+            self._descr.dom
         except Exception as err:
             log.warning("Failure while parsing appliance description", exc_info=err)
             self.cleanup()
             sys.exit(1)
 
         try:
-            profiles = config_tree.xpath("//profile/@name")
+            profiles = self._descr.profiles
         except Exception as err:
             log.warning("Failure while trying to extract profile names", exc_info=err)
             self.cleanup()
@@ -77,13 +88,15 @@ class KiwiParent:
         Add a repository for the builder
         """
         if reponame:
-            key_path: str | None = self._get_repokeys(reponame, repodata)
-            if key_path is not None:
-                repodata.setdefault("key", "file://" + key_path)
-                self._check_repokey(repodata, reponame)
-                self._repos[reponame] = repodata
-            else:
-                log.error(f"Unable to get GPG key for repo {reponame}")
+            with span("repo.add", repo=reponame):
+                # Configured or already resolved keys are not downloaded
+                key_path: str | None = "" if repodata.get("key") else self._get_repokeys(reponame, repodata)
+                if key_path is not None:
+                    repodata.setdefault("key", "file://" + key_path)
+                    self._check_repokey(repodata, reponame)
+                    self._repos[reponame] = repodata
+                else:
+                    log.error(f"Unable to get GPG key for repo {reponame}")
         else:
             log.error("Repository name not defined")
             self.cleanup()
@@ -91,16 +104,21 @@ class KiwiParent:
 
         return self
 
+    def add_repos(self, repos: Dict[str, Dict[str, str]]) -> KiwiParent:
+        """
+        Add repositories for the builder, their keys are downloaded all at once
+        """
+        self._keys.prefetch(repos)
+        for reponame, repodata in repos.items():
+            self.add_repo(reponame, repodata)
+
+        return self
+
     def _verify_gpg_key(self, key_path) -> bool:
         """
         Verify wether the downloaded file is a GPG key
         """
-        try:
-            return bool(subprocess.run(["gpg", "--dearmor", key_path], capture_output=True, text=True).returncode == os.EX_OK)
-
-        except Exception as e:
-            log.warning(f"An error occurred: {e}")
-            return False
+        return verify_gpg_key(key_path)
 
     def _get_repokeys(self, reponame: str, repodata: Dict[str, str]) -> str | None:
         """
@@ -115,31 +133,7 @@ class KiwiParent:
             if not repo_iter:
                 raise Exception(excep_iter)
 
-        url: ParseResult = urlparse(repodata["url"])
-        g_path: str | None = os.path.join(self._tmpdir, f"{reponame}_release.key")
-        s_url: str = ""
-        if repodata.get("components", "/") != "/":
-            s_url = urljoin(f"{url.scheme}://{url.netloc}/{url.path}/dists/{repodata['name']}", "")
-            # TODO: grab standard keys
-            g_path = ""
-            return g_path
-        else:
-            s_url = urljoin(f"{url.scheme}://{url.netloc}/{url.path}/Release.key", "")
-            try:
-                response = requests.get(s_url, allow_redirects=True)
-            except Exception as e:
-                log.warning(f"Unable to download key: {e}")
-                return None
-            # check reponse OK
-            if response.status_code == HTTPStatus.OK and g_path is not None:
-                with open(g_path, "xb") as f_rel:
-                    f_rel.write(response.content)
-            else:
-                log.warning(f"Wrong url defined for repo {reponame}")
-                response.close()
-                return None
-        response.close()
-        return None if not self._verify_gpg_key(g_path) else g_path
+        return self._keys.fetch(reponame, repodata)
 
     def _check_repokey(self, repodata: Dict[str, str], reponame) -> None:
 
@@ -168,6 +162,8 @@ class KiwiParent:
             raise SystemExit(f"Wrong key file path for repository {reponame}")
 
     def _key_selection(self, reponame: str, options: List[str]) -> str | None:
+        import inquirer  # type: ignore
+
         none_of_above = "none of the above"
         question = [
             inquirer.List(
@@ -190,10 +186,14 @@ class KiwiParent:
         """
         log.info("Cleaning up...")
         try:
+            self._keys.close()
             shutil.rmtree(self._tmpdir)
         except Exception as e:
             log.warning(f"Cleanup Failed", exc_info=e)
 
     @abstractmethod
-    def process(self) -> None:
+    def process(self) -> bool:
+        """
+        Run kiwi, returns True on success
+        """
         raise NotImplementedError()
@@ -8,6 +8,7 @@ import re
 from abc import ABCMeta, abstractmethod
 from typing import List, Dict, Tuple, Any
 from urllib.parse import urlparse
+from berry_mill.cfgh import ConfigHandler, Autodict
 
 
 class Repodata:
@@ -189,3 +190,24 @@ class DebianRepofind(BaseRepofind):
                 repos += v
 
         return repos
+
+
+def add_local_repos(cfg: ConfigHandler) -> None:
+    """
+    Add repositories, those are already configured on the local machine,
+    to the loaded configuration, if it allows to use them.
+    """
+    if not cfg.raw_unsafe_config().get("use-global-repos", False):
+        return
+
+    if cfg.raw_unsafe_config()["repos"].get("local") is not None:
+        return
+    else:
+        cfg.raw_unsafe_config()["repos"]["local"] = Autodict()
+
+    for r in DebianRepofind().get_repos():
+        jr = r.to_json()
+        for arch in jr.keys():
+            if not cfg.raw_unsafe_config()["repos"]["local"].get(arch):
+                cfg.raw_unsafe_config()["repos"]["local"][arch] = Autodict()
+            cfg.raw_unsafe_config()["repos"]["local"][arch].update(jr[arch])
@@ -1,24 +1,27 @@
+from __future__ import annotations
 import sys
 import os
 import argparse
-import shutil
-from tempfile import mkdtemp
-from typing import Tuple
+from typing import TYPE_CHECKING, Any, Mapping
 import kiwi.logger  # type: ignore
 import yaml  # type: ignore
 from berry_mill import plugin
 
-from berry_mill.imgdescr.loader import Loader
-from berry_mill.kiwrap import KiwiParent
 from berry_mill.mountpoint import MountManager
 from berry_mill.imagefinder import ImageFinder
 
-from .cfgh import ConfigHandler, Autodict
-from .localrepos import DebianRepofind
+from .cfgh import ConfigHandler
+from .localrepos import add_local_repos
 from .sysinfo import get_local_arch
-from .preparer import KiwiPreparer
-from .builder import KiwiBuilder
 from .sysinfo import has_virtualization, is_vm
+from .tracing import span, tracer
+
+# Description engine and Kiwi wrappers are imported only by the subcommands using them
+if TYPE_CHECKING:
+    from berry_mill.appliance import ApplianceStage
+    from berry_mill.imgdescr.rendered import RenderedDescription
+    from berry_mill.imgdescr.render import RenderResult
+    from berry_mill.kiwrap import KiwiParent
 
 
 log = kiwi.logging.getLogger("kiwi")
@@ -44,9 +47,7 @@ class ImageMill:
         """
         Constructor
         """
-        self._bac_appliance_abspth: str = ""
-        self._tmp_backup_dir: str = ""
-        self._created_syms: list[str] = []
+        self._stage: ApplianceStage | None = None
 
         # Display just help if run alone
         if len(sys.argv) == 1:
@@ -70,9 +71,22 @@ class ImageMill:
         build_p: argparse.ArgumentParser = sub_p.add_parser("build", help="build image")
         self._add_build_args(build_p)
 
+        # render specific arguments
+        render_p: argparse.ArgumentParser = sub_p.add_parser("render", help="render flattened image descriptions")
+        self._add_render_args(render_p)
+
+        # daemon specific arguments
+        serve_p: argparse.ArgumentParser = sub_p.add_parser("serve", help="run resident daemon, accepting jobs of berrymill")
+        self._add_serve_args(serve_p)
+
         # plugin loader
         plugin.plugins_loader(sub_p)
         self.args: argparse.Namespace = p.parse_args()
+        tracer.enable(bool(self.args.trace or self.args.profile_python))
+        if self.args.profile_python:
+            from .profiling import PhaseProfiler
+
+            tracer.hooks.append(PhaseProfiler(self.args.profile_python).phase)
         plugin.plugins_args(self.args)
 
         self.cfg: ConfigHandler = ConfigHandler()
@@ -90,10 +104,31 @@ class ImageMill:
         p.add_argument("-s", "--show-config", action="store_true", help="shows the configuration of repositories")
         p.add_argument("-d", "--debug", action="store_true", help="turns on verbose debugging mode")
         p.add_argument("-a", "--arch", help="specify target arch")
+        p.add_argument(
+            "--offline", action="store_true", help="take repository keys from the key cache only, without network requests"
+        )
+        p.add_argument("--trace", type=str, metavar="FILE", help="write timing of all build phases to the file")
+        p.add_argument(
+            "--trace-format",
+            choices=["chrome", "otlp"],
+            default="chrome",
+            help="format of the trace: Chrome trace events (e.g. for Perfetto) or OTLP JSON",
+        )
+        p.add_argument(
+            "--profile-python",
+            type=str,
+            metavar="DIR",
+            help="write cProfile data and top memory allocations of each build phase to the directory",
+        )
         p.add_argument("-c", "--config", type=str, help="specify configuration other than default")
         p.add_argument("-i", "--image", help="path to the image appliance, if it's not in the current directory")
         p.add_argument("-p", "--profile", help="select profile for images that makes use of it")
         p.add_argument("--clean", action="store_true", help="cleanup previous build results prior build.")
+        p.add_argument(
+            "--prune-profiles",
+            action="store_true",
+            help="drop sections of all other profiles than selected from the rendered image description",
+        )
 
     def _add_prepare_args(self, p: argparse.ArgumentParser) -> None:
         """
@@ -116,79 +151,45 @@ class ImageMill:
         p.add_argument("--target-dir", required=True, type=str, help="store image results in given dirpath")
         p.add_argument("--no-accel", action="store_true", help="disable KVM acceleration for boxbuild")
         p.add_argument("--box-memory", type=str, default="8G", help="specify main memory to use for the QEMU VM (box)")
+        p.add_argument(
+            "--matrix",
+            nargs="+",
+            metavar="AXIS=VALUES",
+            help="build every combination of comma-separated values of the axes: profiles, arch",
+        )
+        p.add_argument("-j", "--jobs", type=int, default=2, help="number of matrix builds to run in parallel")
+        p.add_argument("--no-cache", action="store_true", help="do not use the build cache")
+        p.add_argument("--refresh", action="store_true", help="build even if the image is cached, then update the cache")
 
-    def _get_appliance_path_info(self, image: str) -> Tuple[str, str]:
+    def _add_render_args(self, p: argparse.ArgumentParser) -> None:
         """
-        Return Appliance Dirname, Basename
+        Add Render Specific Arguments to parser accepted after berrymill [default args] render
         """
+        p.add_argument("descriptions", nargs="+", help="paths or glob patterns of image descriptions to render")
+        p.add_argument("-o", "--output-dir", required=True, type=str, help="store rendered descriptions in given dirpath")
+        p.add_argument("-j", "--jobs", type=int, default=1, help="render independent descriptions in parallel processes")
+        p.add_argument(
+            "-w", "--watch", action="store_true", help="keep re-rendering descriptions on changes of their inheritance chains"
+        )
+        p.add_argument(
+            "--stats", action="store_true", help="report time and changes of every applied inheritance op, slowest first"
+        )
 
-        appliance_path: str = os.path.abspath(os.path.dirname(image or "."))
-        if appliance_path == ".":
-            appliance_path = ""
-
-        appliance_descr: str = os.path.basename(image or ".")
-        if appliance_descr == ".":
-            appliance_descr = ""
-
-        if not appliance_path:
-            for pth in os.listdir(appliance_path or "."):
-                if pth.split(".")[-1] in ["kiwi", "xml"]:
-                    appliance_descr = pth
-                    appliance_path = os.path.abspath(os.getcwd())
-                    break
-
-        if not appliance_descr:
-            raise Exception("Appliance description was not found.")
-
-        if not appliance_path:
-            raise Exception("Appliance Path not found")
-
-        return appliance_path, appliance_descr
+    def _add_serve_args(self, p: argparse.ArgumentParser) -> None:
+        """
+        Add Serve Specific Arguments to parser accepted after berrymill [default args] serve
+        """
+        p.add_argument("--socket", type=str, help="path of the daemon socket, if not the default one")
 
     def _init_local_repos(self) -> None:
         """
         Initialise local repositories, those are already configured on the local machine.
         """
 
-        self.cfg.load()
-        if not self.cfg.raw_unsafe_config().get("use-global-repos", False):
-            return
-
-        if self.cfg.raw_unsafe_config()["repos"].get("local") is not None:
-            return
-        else:
-            self.cfg.raw_unsafe_config()["repos"]["local"] = Autodict()
-
-        for r in DebianRepofind().get_repos():
-            jr = r.to_json()
-            for arch in jr.keys():
-                if not self.cfg.raw_unsafe_config()["repos"]["local"].get(arch):
-                    self.cfg.raw_unsafe_config()["repos"]["local"][arch] = Autodict()
-                self.cfg.raw_unsafe_config()["repos"]["local"][arch].update(jr[arch])
-        return
-
-    def _construct_final_build_dir(self) -> None:
-        """
-        Constructs final kiwi appliance which is used by kiwi
-        1. moves the appliance description to a tmp dir, so kiwi wont use this "wrong" one
-        2. Constructs the right appliance and safes it named as the one passed to berrymill orginially
-        """
-        appliance_loader: Loader = Loader()
-        final_rendered_xml_string = appliance_loader.load(self._appliance_abspath)
-        shutil.move(self._appliance_abspath, self._bac_appliance_abspth)
-        with open(self._appliance_abspath, "w") as ma:
-            ma.write(final_rendered_xml_string)
-        if appliance_loader.is_derived:
-            main_appliance_dir = os.path.dirname(os.path.abspath(appliance_loader.main_appliance_pth))
-            log.debug(f"Base Appliance detected under: {main_appliance_dir}")
-            for kiwifile in os.scandir(main_appliance_dir):
-                src = kiwifile.path
-                dst = os.path.join(self._appliance_path, kiwifile.name)
-                if not os.path.exists(dst):
-                    if os.path.isdir(src) and not os.path.basename(src) == "root":
-                        continue
-                    os.symlink(src, dst)
-                    self._created_syms.append(dst)
+        with span("config.load"):
+            self.cfg.load()
+        with span("repos.local"):
+            add_local_repos(self.cfg)
 
     def _check_opts(self) -> bool:
         """
@@ -201,21 +202,147 @@ class ImageMill:
                 return False
         return True
 
-    def _set_appliance_paths(self):
+    def _stage_appliance(self) -> RenderedDescription:
+        """
+        Stage rendered appliance description for kiwi
+        """
+        from .appliance import ApplianceStage
+
+        self._stage = ApplianceStage(
+            self.args.image,
+            profile=self.args.prune_profiles and self.args.profile or None,
+            cache_dir=self.cfg.config.get("cache_dir") or "",
+        )
+        return self._stage.setup()
+
+    def _get_matrix(self) -> dict[str, list[str]]:
+        """
+        Get values of the build matrix axes
+        """
+        matrix: dict[str, list[str]] = {}
+        for spec in self.args.matrix:
+            axis, _, values = spec.partition("=")
+            axis = {"profile": "profiles", "archs": "arch"}.get(axis.strip(), axis.strip())
+            matrix[axis] = [v.strip() for v in values.split(",") if v.strip()]
+            if axis not in ["profiles", "arch"] or not matrix[axis]:
+                raise Exception(f'Wrong matrix axis "{spec}", expected profiles=NAME,... or arch=ARCH,...')
+        return matrix
+
+    def _get_config_params(self) -> dict[str, Any]:
+        """
+        Get build parameters of the configuration: the build cache and the box plugin
+        """
+        from .buildcache import BuildCache, parse_size
+
+        cfg: Mapping[str, Any] = self.cfg.config
+        return {
+            "no_cache": self.args.no_cache,
+            "refresh": self.args.refresh,
+            "cache_dir": cfg.get("cache_dir") or "",
+            "cache_size": parse_size(cfg.get("build_cache_size") or BuildCache.MAX_SIZE),
+            "boxed_plugin_conf": cfg.get("boxed_plugin_conf") or "",
+        }
+
+    def _build_matrix(self) -> None:
+        """
+        Build all combinations of the matrix axes
+        """
+        from .api import BuildResult, build_matrix, report
+
+        matrix: dict[str, list[str]] = self._get_matrix()
+        if not self.args.local and is_vm() and not has_virtualization():
+            log.warning(no_nested_warning)
+
+        results: list[BuildResult] = build_matrix(
+            self.args.image,
+            self.args.target_dir,
+            profiles=matrix.get("profiles") or ([self.args.profile] if self.args.profile else None),
+            archs=matrix.get("arch") or ([self.args.arch] if self.args.arch else None),
+            jobs=self.args.jobs,
+            config=self.cfg,
+            prune_profiles=self.args.prune_profiles,
+            box_memory=self.args.box_memory,
+            debug=self.args.debug,
+            offline=self.args.offline,
+            clean=self.args.clean,
+            cross=self.args.cross,
+            cpu=self.args.cpu,
+            local=self.args.local,
+            no_accel=self.args.no_accel,
+            **self._get_config_params(),
+        )
+        print(report(results))
+
+        failed: list[BuildResult] = [r for r in results if not r.ok]
+        if failed:
+            raise Exception(f"{len(failed)} of {len(results)} builds failed")
+
+    def _render(self) -> None:
         """
-        Set appliance paths
+        Render image descriptions
         """
-        self._appliance_path, self._appliance_descr = self._get_appliance_path_info(self.args.image)
-        os.chdir(self._appliance_path)
+        from berry_mill.imgdescr.render import Renderer
+        from berry_mill.imgdescr.stats import FlattenStats
+
+        renderer: Renderer = Renderer(
+            *self.args.descriptions,
+            output_dir=self.args.output_dir,
+            jobs=self.args.jobs,
+            profile=self.args.prune_profiles and self.args.profile or None,
+            stats=self.args.stats,
+        )
+        if self.args.watch:
+            log.info("Watching descriptions for changes, press Ctrl+C to stop")
+            try:
+                renderer.watch()
+            except KeyboardInterrupt:
+                pass
+            return
 
-        self._tmp_backup_dir = mkdtemp(prefix="berrymill-tmp-", dir="/tmp")
-        self._appliance_abspath: str = os.path.join(os.getcwd(), self._appliance_descr)
-        self._bac_appliance_abspth = os.path.join(self._tmp_backup_dir, self._appliance_descr)
+        with span("render"):
+            results: list[RenderResult] = renderer.render()
+        for r in results:
+            r.ok and log.info(f'Rendered "{r.descr}" to "{r.output}"')  # type: ignore [func-returns-value]
+
+        if self.args.stats:
+            stats: FlattenStats = FlattenStats()
+            for r in results:
+                r.stats is not None and stats.extend(r.stats)  # type: ignore [func-returns-value]
+            print(stats.report())
+
+        failed: list[RenderResult] = [r for r in results if not r.ok]
+        if failed:
+            raise Exception(f"{len(failed)} of {len(results)} descriptions failed to render")
 
     def run(self) -> None:
+        """
+        Run the subcommand, tracing it if asked to
+        """
+        try:
+            with span(" ".join(["berrymill"] + [self.args.subparser_name or ""]).strip()):
+                self._run()
+        finally:
+            if self.args.trace:
+                tracer.write(self.args.trace, self.args.trace_format)
+                log.info(f"Trace of the build phases is written to {self.args.trace}")
+            if self.args.profile_python:
+                log.info(f"Profiles of the build phases are written to {self.args.profile_python}")
+
+    def _run(self) -> None:
         """
         Build an image
         """
+        # Rendering does not need any repositories
+        if self.args.subparser_name == "render":
+            self._render()
+            return
+
+        if self.args.subparser_name == "serve":
+            from .daemon import Daemon
+
+            Daemon(self.args.socket).serve()
+            return
+
         self._init_local_repos()
         if self.args.show_config:
             print(yaml.dump(self.cfg.config))
@@ -226,9 +353,12 @@ class ImageMill:
         if not self._check_opts():
             raise SystemExit()
 
+        if self.args.subparser_name == "build" and self.args.matrix:
+            self._build_matrix()
+            return
+
         if self.args.subparser_name == "build":
-            self._set_appliance_paths()
-            self._construct_final_build_dir()
+            rendered: RenderedDescription = self._stage_appliance()
             # parameter "cross" implies a amd64 host and an arm64 target-arch
             if self.args.cross:
                 self.args.arch = "arm64"
@@ -236,28 +366,31 @@ class ImageMill:
             if not self.args.local and is_vm() and not has_virtualization():
                 log.warning(no_nested_warning)
 
-            os.environ["KIWI_BOXED_PLUGIN_CFG"] = self.cfg.raw_unsafe_config().get(
-                "boxed_plugin_conf", "/etc/berrymill/kiwi_boxed_plugin.yml"
-            )
+            from .builder import KiwiBuilder
+
             kiwip = KiwiBuilder(
-                self._appliance_descr,
+                rendered,
                 box_memory=self.args.box_memory,
                 profile=self.args.profile,
                 debug=self.args.debug,
+                offline=self.args.offline,
                 clean=self.args.clean,
                 cross=self.args.cross,
                 cpu=self.args.cpu,
                 local=self.args.local,
                 target_dir=self.args.target_dir,
                 no_accel=self.args.no_accel,
+                **self._get_config_params(),
             )
         elif self.args.subparser_name == "prepare":
-            self._set_appliance_paths()
-            self._construct_final_build_dir()
+            rendered = self._stage_appliance()
+            from .preparer import KiwiPreparer
+
             kiwip = KiwiPreparer(
-                self._appliance_descr,
+                rendered,
                 root=self.args.root,
                 debug=self.args.debug,
+                offline=self.args.offline,
                 profile=self.args.profile,
                 allow_existing_root=self.args.allow_existing_root,
             )
@@ -283,9 +416,8 @@ class ImageMill:
         else:
             raise argparse.ArgumentError(argument=None, message="No Action defined (build, prepare) or any of available plugins")
 
-        for r in self.cfg.config["repos"]:
-            for rname, repo in (self.cfg.config["repos"][r].get(self.args.arch or get_local_arch()) or {}).items():
-                kiwip.add_repo(rname, repo)
+        with span("repo.setup"):
+            kiwip.add_repos(self.cfg.get_repos(self.args.arch or get_local_arch()))
 
         try:
             kiwip.process()
@@ -297,10 +429,5 @@ class ImageMill:
         """
         Cleanup Temporary directories and files
         """
-        if self._bac_appliance_abspth and (os.path.exists(self._bac_appliance_abspth)):
-            shutil.move(self._bac_appliance_abspth, self._appliance_abspath)
-        if self._tmp_backup_dir:
-            shutil.rmtree(self._tmp_backup_dir, ignore_errors=True)
-        for symlink in self._created_syms:
-            os.remove(symlink)
-        self._created_syms = []
+        if self._stage is not None:
+            self._stage.cleanup()
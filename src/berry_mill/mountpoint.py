@@ -14,6 +14,7 @@ import os
 import tempfile
 import shutil
 from berry_mill.imagefinder import ImagePtr
+from berry_mill.tracing import span, traced
 
 
 log = kiwi.logging.getLogger("kiwi")
@@ -199,14 +200,17 @@ class MountManager:
         """
 
         if img_ptr.img_type == ImagePtr.PARTITION_IMAGE:
-            self.__mount_partition_image(img_ptr)
+            with span("mount", image=img_ptr.path):
+                self.__mount_partition_image(img_ptr)
             return
         elif img_ptr.img_type == ImagePtr.DISK_IMAGE:
-            self.__mount_disk_image(img_ptr)
+            with span("mount", image=img_ptr.path):
+                self.__mount_disk_image(img_ptr)
             return
 
         raise Exception("Unable to mount image: {}".format(repr(img_ptr)))
 
+    @traced("umount")
     def umount(self, pth: str) -> None:
         """
         Un-mount a specific path and cleanup everything.
@@ -293,6 +297,7 @@ class MountManager:
                     return pdir
         return None
 
+    @traced("mount.flush")
     def flush(self):
         """
         Flush all mounts entirely.
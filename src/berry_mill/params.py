@@ -9,33 +9,61 @@ class KiwiParams(TypedDict):
 
         profile (str, Optional): select profile for images that makes use of it.
         debug (bool, Default: False): run in debug mode. This means the box VM stays open and the kiwi log level is set to debug(10).
+        offline (bool, Default: False): take repository keys from the key cache only, without any network requests.
     """
 
     profile: str
     debug: bool
+    offline: bool
 
 
-class KiwiBuildParams(KiwiParams):
+class KiwiBuildOptions(TypedDict):
     """
-    Dictionary for Build specifc Kiwi Parameters
+    Dictionary for Build specific Kiwi Options, all but the profile and the target directory,
+    which are given on their own to the Python API.
 
     Attributes:
 
+        debug (bool, Default: False): run in debug mode, see KiwiParams.
+        offline (bool, Default: False): take repository keys from the key cache only, see KiwiParams.
         box_memory (str, Default: 8G): specify main memory to use for the QEMU VM (box).
         clean (bool, Default: False): cleanup previous build results prior build.
         cross (bool, Default: False): cross image build on x86_64 to aarch64 target.
         cpu (str, Optional): cpu to use for the QEMU VM (box)
         local (bool, Default: False): run build process locally on this machine. Requires sudo setup and installed KIWI toolchain.
-        target_dir (str, Default:/tmp/IMAGE_NAME[.PROFILE_NAME]): store image results in given dirpath.
+        no_accel (bool, Default: False): disable KVM acceleration for the QEMU VM (box).
+        no_cache (bool, Default: False): neither restore the image results from the build cache nor store them there.
+        refresh (bool, Default: False): build even if the image results are cached, then replace the cached ones.
+        cache_dir (str, Optional): berrymill cache directory, $XDG_CACHE_HOME/berrymill by default.
+        cache_size (int, Default: 20G): size limit of the cached image results in bytes.
+        boxed_plugin_conf (str, Default: /etc/berrymill/kiwi_boxed_plugin.yml): kiwi boxed plugin configuration path.
     """
 
+    debug: bool
+    offline: bool
     box_memory: str
     clean: bool
     cross: bool
     cpu: str
     local: bool
-    target_dir: str
     no_accel: bool
+    no_cache: bool
+    refresh: bool
+    cache_dir: str
+    cache_size: int
+    boxed_plugin_conf: str
+
+
+class KiwiBuildParams(KiwiParams, KiwiBuildOptions):
+    """
+    Dictionary for Build specifc Kiwi Parameters: KiwiParams, KiwiBuildOptions and
+
+    Attributes:
+
+        target_dir (str, Default:/tmp/IMAGE_NAME[.PROFILE_NAME]): store image results in given dirpath.
+    """
+
+    target_dir: str
 
 
 class KiwiPrepParams(KiwiParams):
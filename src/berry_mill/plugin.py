@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import sys
+import copy
 import importlib
 import argparse
 import yaml  # type: ignore
@@ -12,19 +13,63 @@ import traceback
 from typing import Any
 from types import ModuleType
 from berry_mill.cfgh import ConfigHandler
+from berry_mill.tracing import span
 
 
 log = kiwi.logging.getLogger("kiwi")
 log.set_color_format()
 
 
+class PluginManifest:
+    """
+    Static plugin description, shipped as "manifest.yaml" in the plugin directory.
+
+    It is enough to build the CLI, so the plugin code is imported
+    only when the plugin is actually called.
+    """
+
+    FILE: str = "manifest.yaml"
+
+    def __init__(self, id: str, title: str, argmap: list[PluginArgs] | None = None, module: str = "") -> None:
+        self.id: str = id
+        self.title: str = title.lower()
+        self.argmap: list[PluginArgs] = argmap or []
+        self.module: str = module
+
+    @staticmethod
+    def load(path: str, module: str = "") -> PluginManifest | None:
+        """
+        Load manifest from the plugin directory, None if there is no manifest
+        """
+        pth: str = os.path.join(path, PluginManifest.FILE)
+        if not os.path.exists(pth):
+            return None
+
+        with open(pth) as fr:
+            data: dict[str, Any] = yaml.load(fr, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+
+        assert data.get("id"), f'Plugin manifest "{pth}" has no ID'
+        return PluginManifest(
+            id=data["id"],
+            title=data.get("title", ""),
+            argmap=[
+                PluginArgs(*a.get("flags", []), **{k: v for k, v in a.items() if k != "flags"}) for a in data.get("args", [])
+            ],
+            module=module,
+        )
+
+
 class PluginRegistry:
     """
-    Plugin registry to keep the references on each plugin
+    Plugin registry to keep the references on each plugin.
+
+    Plugins, declared by their manifests, are imported on first access.
     """
 
     def __init__(self) -> None:
         self.__registry: dict = {}
+        self.__manifests: dict[str, PluginManifest] = {}
+        self.args: argparse.Namespace | None = None
 
     def __call__(self, __object: Any) -> PluginRegistry:
         if issubclass(__object.__class__, PluginIf):
@@ -36,19 +81,59 @@ class PluginRegistry:
             log.error("Plugin {} does not implements the plugin interface, skipping".format(__object.__class__))
         return self
 
+    def declare(self, m: PluginManifest) -> None:
+        """
+        Declare a plugin by its manifest, without importing it
+        """
+        known: PluginManifest | None = self.__manifests.get(m.id)
+        if known is not None and known.module == m.module:
+            return  # Already declared, e.g. in a resident daemon
+        if known is not None or m.id in self.__registry:
+            log.error("Plugin {} should have unique ID, skipping".format(m.module))
+        else:
+            self.__manifests[m.id] = m
+
+    def get_manifest(self, __name: str) -> PluginManifest | None:
+        return self.__manifests.get(__name)
+
+    def is_loaded(self, __name: str) -> bool:
+        return __name in self.__registry
+
+    def _load(self, __name: str) -> None:
+        """
+        Import declared plugin
+        """
+        m: PluginManifest | None = self.__manifests.get(__name)
+        if m is None or __name in self.__registry:
+            return
+
+        try:
+            with span("plugin.load", plugin=__name):
+                importlib.import_module(m.module)
+        except Exception as exc:
+            log.error('Failure to import plugin "{}": {}'.format(m.module, exc))
+            return
+
+        if __name not in self.__registry:
+            log.error("Plugin {} did not register itself as {}".format(m.module, __name))
+        elif self.args is not None:
+            self.__registry[__name].args = self.args
+
     def plugins(self) -> list[str]:
-        return sorted(self.__registry.keys())
+        return sorted(set(self.__registry.keys()).union(self.__manifests.keys()))
 
     def __getitem__(self, __name: str) -> PluginIf | None:
+        self._load(__name)
         return __name in self.__registry and self.__registry[__name] or None
 
     def call(self, cfg: ConfigHandler, pname: str, *args, **kw) -> Any:
-        plugin: Any | None = self.__registry.get(pname)
+        plugin: Any | None = self[pname]
         if plugin is None:
             log.error("Unable to call plugin {}: not loaded".format(pname))
         else:
-            plugin.setup(*args, **kw)
-            plugin.run(cfg)
+            with span(f"plugin {pname}"):
+                plugin.setup(*args, **kw)
+                plugin.run(cfg)
 
 
 registry = PluginRegistry()
@@ -85,8 +170,17 @@ class PluginIf(metaclass=PluginIfDeco):
 
     def __init__(self, title: str = "", argmap: list[PluginArgs] | None = None):
         """
-        Register plugin
+        Register plugin.
+        Title and arguments are taken from the plugin manifest, unless given.
         """
+        if not title or argmap is None:
+            m: PluginManifest | None = registry.get_manifest(self.ID) or PluginManifest.load(
+                os.path.dirname(getattr(sys.modules.get(self.__class__.__module__), "__file__", None) or "")
+            )
+            if m is not None and m.id == self.ID:
+                title = title or m.title
+                argmap = m.argmap if argmap is None else argmap
+
         assert bool(title.strip()), "Cannot register plugin with the unknown title"
 
         self.title: str = title.lower()
@@ -109,12 +203,17 @@ class PluginIf(metaclass=PluginIfDeco):
         """
         Get default config or override it
         """
-        wd: dict[str, Any] = cfg.config.get(self.ID, {})
+        # Shared configuration is read-only, the plugin gets its own plain copy of its section
+        wd: Any = copy.deepcopy(cfg.config.get(self.ID, {}))
         optconf = optname or "{}.conf".format(self.ID)
         if optconf:
             if os.path.exists(optconf):
                 try:
-                    wd += yaml.load(open(optconf), Loader=yaml.SafeLoader)
+                    ext: Any = yaml.load(open(optconf), Loader=yaml.SafeLoader)
+                    if isinstance(wd, list):
+                        wd += ext or []
+                    else:
+                        wd.update(ext or {})
                 except Exception as exc:
                     log.error('Unable to update plugin config from file "{}". Please check the syntax and try again.')
                     raise
@@ -169,11 +268,24 @@ class PluginArgs:
 
 def plugins_loader(sp: argparse._SubParsersAction[argparse.ArgumentParser]):
     """
-    Load plugins and construct their CLI interface
+    Declare plugins by their manifests and construct their CLI interface.
+    Plugins without a manifest are imported right away.
     """
-    for lp in os.listdir(os.path.join(os.path.dirname(__file__), "plugins")):
-        if "." in lp:
+    p_path: str = os.path.join(os.path.dirname(__file__), "plugins")
+    for lp in sorted(os.listdir(p_path)):
+        if "." in lp or lp.startswith("_"):
             continue
+
+        try:
+            m: PluginManifest | None = PluginManifest.load(os.path.join(p_path, lp), "berry_mill.plugins." + lp)
+        except Exception as exc:
+            log.error('Failure to load manifest of plugin "{}": {}'.format(lp, exc))
+            continue
+
+        if m is not None:
+            registry.declare(m)
+            continue
+
         try:
             importlib.import_module("berry_mill.plugins." + lp)
         except Exception as exc:
@@ -181,19 +293,23 @@ def plugins_loader(sp: argparse._SubParsersAction[argparse.ArgumentParser]):
 
     # Add to the CLI as a subcommand on --help
     for n in registry.plugins():
-        p: PluginIf | None = registry[n]
-        if p is None:
+        pm: PluginIf | PluginManifest | None = (
+            registry[n] if registry.is_loaded(n) or registry.get_manifest(n) is None else registry.get_manifest(n)
+        )
+        if pm is None:
             continue
-        argp: argparse.ArgumentParser = sp.add_parser(p.ID, help=p.title)
-        for a in p.argmap:
+        argp: argparse.ArgumentParser = sp.add_parser(n, help=pm.title)
+        for a in pm.argmap:
             argp.add_argument(*a.args, **a.keywords)
 
 
 def plugins_args(ns: argparse.Namespace) -> None:
     """
-    Pass args namespace to each plugin
+    Pass args namespace to each plugin, also to those loaded later
     """
+    registry.args = ns
     for n in registry.plugins():
-        p: PluginIf | None = registry[n]
-        if p is not None:
-            p.args = ns
+        if registry.is_loaded(n):
+            p: PluginIf | None = registry[n]
+            if p is not None:
+                p.args = ns
@@ -1,4 +1,4 @@
-from berry_mill.plugin import PluginIf, PluginArgs, registry
+from berry_mill.plugin import PluginIf, registry
 from berry_mill.cfgh import ConfigHandler
 
 
@@ -19,13 +19,5 @@ class MyPlugin(PluginIf):
         print("Running plugin {}".format(self.title))
 
 
-# Register plugin
-registry(
-    MyPlugin(
-        title="example plugin",
-        argmap=[
-            PluginArgs("-a", "--first", help="first argument"),
-            PluginArgs("-b", "--second", help="some other argument example"),
-        ],
-    )
-)
+# Register plugin, title and arguments are in its manifest
+registry(MyPlugin())
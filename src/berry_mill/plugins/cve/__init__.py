@@ -76,5 +76,5 @@ class CvePlugin(PluginIf):
             self.get_fs_cve(mp, format=cve_data.get("format", "cyclonedx-json"), verbose=cve_data.get("verbose"))
 
 
-# Register plugin
-registry(CvePlugin(title="Intrusion detection and opened CVE scanner", argmap=[]))
+# Register plugin, title and arguments are in its manifest
+registry(CvePlugin())
@@ -40,8 +40,8 @@ class Kernkompozzer(plugin.PluginIf):
         """
         Called by berrymill during the main exec
         """
-        KkzFlow(id=self.ID, cfg=cfg.config[self.ID])()
+        KkzFlow(id=self.ID, cfg=cfg.config[self.ID].to_dict())()
 
 
-# Register plugin
-plugin.registry(Kernkompozzer(title="compose images with Kernkonzept hypervisor"))
+# Register plugin, title and arguments are in its manifest
+plugin.registry(Kernkompozzer())
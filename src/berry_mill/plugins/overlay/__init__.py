@@ -1,11 +1,10 @@
 import os
 from typing import Any
-from berry_mill.plugin import PluginIf, PluginArgs, registry
+from berry_mill.plugin import PluginIf, registry
 from berry_mill.cfgh import ConfigHandler
 from berry_mill.mountpoint import MountManager
 from urllib.parse import ParseResult, urlparse
 
-import copy
 import shutil
 import kiwi.logger  # type: ignore
 
@@ -43,7 +42,7 @@ class RootOverlay(PluginIf):
         """
         log.info(f"Running plugin {self.title}")
 
-        p_cfg: dict[str, Any] = copy.deepcopy(cfg.config[self.ID])
+        p_cfg: dict[str, Any] = cfg.config[self.ID].to_dict()
         if self.args.dir:
             roots: list[str] = []
             for r in self.args.dir.split(","):
@@ -68,10 +67,5 @@ class RootOverlay(PluginIf):
                 shutil.copytree(r, mp, symlinks=True, dirs_exist_ok=True)
 
 
-# Register plugin
-registry(
-    RootOverlay(
-        title="overlay rootfs with specific artifacts",
-        argmap=[PluginArgs("-r", "--dir", help="overlay directories, comma-separated")],
-    )
-)
+# Register plugin, title and arguments are in its manifest
+registry(RootOverlay())
@@ -80,5 +80,5 @@ class SbomPlugin(PluginIf):
             self.get_fs_sbom(mp, format=sbom_data.get("format", "spdx-json"), verbose=sbom_data.get("verbose"))
 
 
-# Register plugin
-registry(SbomPlugin(title="SBOM generator on various filesystems", argmap=[]))
+# Register plugin, title and arguments are in its manifest
+registry(SbomPlugin())
@@ -1,5 +1,5 @@
 from typing import Any
-from berry_mill.plugin import PluginIf, PluginArgs, registry
+from berry_mill.plugin import PluginIf, registry
 from berry_mill.cfgh import ConfigHandler
 import kiwi.logger  # type: ignore
 
@@ -32,12 +32,5 @@ class WorkflowPlugin(PluginIf):
                 registry.call(cfg, p_id, *(p_opts or {}).get("options", ()), **(p_opts or {}).get("args", {}))
 
 
-# Register plugin
-registry(
-    WorkflowPlugin(
-        title="Plugin-based workflow batch caller",
-        argmap=[
-            PluginArgs("-w", "--workflow", help='Override a workflow configuration from a given file, default "workflow.conf"')
-        ],
-    )
-)
+# Register plugin, title and arguments are in its manifest
+registry(WorkflowPlugin())
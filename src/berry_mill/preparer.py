@@ -4,7 +4,9 @@ import kiwi.logger  # type: ignore
 from kiwi.exceptions import KiwiPrivilegesError, KiwiRootDirExists  # type: ignore
 from .kiwiapp import KiwiAppPrepare
 from .kiwrap import KiwiParent
+from .imgdescr.rendered import RenderedDescription
 from .params import KiwiPrepParams
+from .tracing import traced
 
 log = kiwi.logging.getLogger("kiwi")
 
@@ -14,14 +16,18 @@ class KiwiPreparer(KiwiParent):
     Main Class for Berrymill to prepare the "kiwi-ng system prepare" call
     """
 
-    def __init__(self, descr: str, **kw: Unpack[KiwiPrepParams]):
-        super().__init__(descr=descr, profile=kw.get("profile", ""), debug=kw.get("debug", False))
+    def __init__(self, descr: str | RenderedDescription, **kw: Unpack[KiwiPrepParams]):
+        super().__init__(
+            descr=descr, profile=kw.get("profile", ""), debug=kw.get("debug", False), offline=kw.get("offline", False)
+        )
 
         self._params: KiwiPrepParams = kw
 
-    def process(self) -> None:
+    @traced("preparer.process")
+    def process(self) -> bool:
         """
-        Create the arguments for kiwi-ng call and run the Kiwi Prepare Task
+        Create the arguments for kiwi-ng call and run the Kiwi Prepare Task.
+        Returns True on success.
         """
         root: str | None = self._params.get("root")
 
@@ -38,8 +44,11 @@ class KiwiPreparer(KiwiParent):
             KiwiAppPrepare(command, repos=self._repos).run()
         except KiwiPrivilegesError:
             log.error("Operation requires root privileges")
+            return False
         except KiwiRootDirExists as exc:
             log.error(exc.message)
+            return False
+        return True
 
     def cleanup(self) -> None:
         # Nothing to clean up
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+import cProfile
+import itertools
+import contextlib
+import tracemalloc
+from typing import Iterator, List
+import kiwi.logger  # type: ignore
+from berry_mill.tracing import Span
+
+log = kiwi.logging.getLogger("kiwi")
+
+
+class PhaseProfiler:
+    """
+    CPU and memory profiler of the major build phases.
+
+    Hooked into the tracer, it runs cProfile and tracemalloc around each span
+    of a major phase. Every phase gets its own .prof file (for pstats, snakeviz
+    etc.) and a report of its peak memory and top allocations. Phases nested
+    into a profiled one are a part of its profile.
+    """
+
+    PHASES: List[str] = ["render", "description.render", "repo.setup", "kiwi.system", "mount", "plugin"]
+
+    def __init__(self, path: str, top: int = 25, frames: int = 1) -> None:
+        self.path: str = os.path.abspath(path)
+        self.top: int = top
+        self.frames: int = frames
+        self._pid: int = os.getpid()
+        self._seq: Iterator[int] = itertools.count(1)
+        self._active: bool = False
+        os.makedirs(self.path, exist_ok=True)
+
+    def is_phase(self, name: str) -> bool:
+        """
+        Span is one of a major phase
+        """
+        return any([name == p or name.startswith(p + ".") or name.startswith(p + " ") for p in self.PHASES])
+
+    def _get_name(self, span: Span) -> str:
+        # Worker processes of a build matrix profile into the same directory
+        name: str = "{:03d}-{}".format(next(self._seq), re.sub(r"[^\w.-]+", "_", span.name))
+        return name if os.getpid() == self._pid else f"{os.getpid()}-{name}"
+
+    @contextlib.contextmanager
+    def phase(self, span: Span) -> Iterator[None]:
+        """
+        Profile the span, if it is a major phase
+        """
+        if self._active or not self.is_phase(span.name):
+            yield
+            return
+
+        self._active = True
+        started: bool = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        base: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+
+        prof: cProfile.Profile = cProfile.Profile()
+        t0: float = time.perf_counter()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            elapsed: float = time.perf_counter() - t0
+            snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            peak: int = tracemalloc.get_traced_memory()[1]
+            if started:
+                tracemalloc.stop()
+            self._active = False
+            self._write(self._get_name(span), span, prof, base, snapshot, peak, elapsed)
+
+    def _write(
+        self,
+        name: str,
+        span: Span,
+        prof: cProfile.Profile,
+        base: tracemalloc.Snapshot,
+        snapshot: tracemalloc.Snapshot,
+        peak: int,
+        elapsed: float,
+    ) -> None:
+        try:
+            prof.dump_stats(os.path.join(self.path, name + ".prof"))
+            filters: List[tracemalloc.Filter] = [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ]
+            stats: List[tracemalloc.StatisticDiff] = snapshot.filter_traces(filters).compare_to(
+                base.filter_traces(filters), "lineno"
+            )
+            with open(os.path.join(self.path, name + ".alloc.txt"), "w") as fw:
+                fw.write(f"Phase: {span.name}\n")
+                for k, v in span.attrs.items():
+                    fw.write(f"{k}: {v}\n")
+                fw.write("Wall time: {:.3f}s\n".format(elapsed))
+                fw.write("Peak traced memory: {:.1f} KiB\n".format(peak / 1024))
+                fw.write(f"\nTop {self.top} allocations, still held at the end of the phase:\n")
+                for s in stats[: self.top]:
+                    fw.write(f"{s}\n")
+        except OSError as exc:
+            log.warning(f"Unable to write profile of {span.name}: {exc}")
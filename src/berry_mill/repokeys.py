@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from http import HTTPStatus
+from typing import Any, Dict, Tuple
+from urllib.parse import ParseResult, urljoin, urlparse
+import kiwi.logger  # type: ignore
+from berry_mill.cachedir import atomic_write, get_cache_dir
+from berry_mill.tracing import span, traced
+
+log = kiwi.logging.getLogger("kiwi")
+
+
+@traced("key.verify")
+def verify_gpg_key(key_path: str | None) -> bool:
+    """
+    Verify wether the downloaded file is a GPG key
+    """
+    try:
+        return bool(
+            subprocess.run(["gpg", "--dearmor", key_path], capture_output=True, text=True).returncode == os.EX_OK  # type: ignore
+        )
+
+    except Exception as e:
+        log.warning(f"An error occurred: {e}")
+        return False
+
+
+class KeyCache:
+    """
+    Persistent cache of repository keys by their URLs.
+
+    Keys are stored by their content, so identical keys of many URLs (e.g. of
+    several architectures) are stored once. ETag and Last-Modified of each
+    URL are kept to revalidate the key with a conditional request.
+    """
+
+    def __init__(self, path: str = "") -> None:
+        self.path: str = path or get_cache_dir("keys")
+
+    def _get_meta_path(self, url: str) -> str:
+        return os.path.join(self.path, "urls", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Tuple[str, Dict[str, str]] | None:
+        """
+        Get path of the cached key and its metadata, None if not cached
+        """
+        try:
+            with open(self._get_meta_path(url)) as fr:
+                meta: Dict[str, str] = json.load(fr)
+        except (OSError, ValueError):
+            return None
+
+        key_path: str = os.path.join(self.path, "objects", meta.get("digest", "") + ".key")
+        if meta.get("url") != url or not os.path.isfile(key_path):
+            return None
+        return key_path, meta
+
+    @staticmethod
+    def get_headers(meta: Dict[str, str]) -> Dict[str, str]:
+        """
+        Get headers of a conditional request for the cached key
+        """
+        headers: Dict[str, str] = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def put(self, url: str, content: bytes, etag: str = "", last_modified: str = "") -> str:
+        """
+        Store the key of the URL, returns path of the cached key
+        """
+        digest: str = hashlib.sha256(content).hexdigest()
+        key_path: str = os.path.join(self.path, "objects", digest + ".key")
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        os.makedirs(os.path.join(self.path, "urls"), exist_ok=True)
+        if not os.path.isfile(key_path):
+            atomic_write(key_path, content)
+        atomic_write(
+            self._get_meta_path(url),
+            json.dumps({"url": url, "digest": digest, "etag": etag, "last_modified": last_modified}).encode("utf-8"),
+        )
+        return key_path
+
+
+class RepoKeys:
+    """
+    Signing keys of repositories, downloaded to a directory.
+
+    Each key is downloaded and verified only once, also if the same
+    repository is used by many builds, e.g. for several profiles.
+    Keys of many repositories are prefetched concurrently over pooled connections.
+    Keys in the persistent cache are only revalidated, or taken as they are if offline.
+    """
+
+    # Parallel downloads
+    JOBS: int = 8
+    # Connect and read timeouts of each request, seconds
+    TIMEOUT: Tuple[float, float] = (10, 60)
+
+    def __init__(self, path: str = "", jobs: int = JOBS, offline: bool = False, cache: KeyCache | None = None) -> None:
+        self.path: str = path or tempfile.mkdtemp(prefix="berrymill-keys-", dir="/tmp")
+        self.jobs: int = max(jobs, 1)
+        self.offline: bool = offline
+        self.cache: KeyCache = cache or KeyCache()
+        self._keys: Dict[str, str | None] = {}
+        self._session: Any = None
+
+    def _get_session(self) -> Any:
+        """
+        HTTP session, pooling the connections of all downloads
+        """
+        if self._session is None:
+            import requests  # type: ignore
+            from requests.adapters import HTTPAdapter  # type: ignore
+
+            self._session = requests.Session()
+            adapter: HTTPAdapter = HTTPAdapter(pool_connections=self.jobs, pool_maxsize=self.jobs)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    @staticmethod
+    def get_url(repodata: Dict[str, str]) -> str:
+        """
+        Get URL of the repository key, empty if not known
+        """
+        if repodata.get("components", "/") != "/":
+            # TODO: grab standard keys
+            return ""
+
+        url: ParseResult = urlparse(repodata["url"])
+        return urljoin(f"{url.scheme}://{url.netloc}/{url.path}/Release.key", "")
+
+    def fetch(self, reponame: str, repodata: Dict[str, str]) -> str | None:
+        """
+        Get path of the repository key: empty if its URL is not known, None on failure.
+        """
+        s_url: str = self.get_url(repodata)
+        if not s_url:
+            return ""
+
+        if s_url not in self._keys:
+            self._keys[s_url] = self._download(reponame, s_url)
+        return self._keys[s_url]
+
+    def prefetch(self, repos: Dict[str, Dict[str, str]]) -> None:
+        """
+        Download keys of all the repositories concurrently, unless they have ones.
+        Keys are then taken by fetch() without waiting.
+        """
+        urls: Dict[str, str] = {}
+        for reponame, repodata in repos.items():
+            if repodata.get("url") and not repodata.get("key"):
+                s_url: str = self.get_url(repodata)
+                if s_url and s_url not in self._keys:
+                    urls.setdefault(s_url, reponame)
+        if not urls:
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with span("key.prefetch", keys=len(urls)):
+            with ThreadPoolExecutor(max_workers=min(self.jobs, len(urls)), thread_name_prefix="berrymill-keys") as pool:
+                for s_url, key_path in zip(urls, pool.map(lambda u: self._download(urls[u], u), urls)):
+                    self._keys[s_url] = key_path
+
+    def _download(self, reponame: str, s_url: str) -> str | None:
+        g_path: str = os.path.join(self.path, "{}_release.key".format(hashlib.sha256(s_url.encode("utf-8")).hexdigest()[:16]))
+        cached: Tuple[str, Dict[str, str]] | None = self.cache.get(s_url)
+        if self.offline:
+            if cached is None:
+                log.warning(f"Key of repo {reponame} is not cached, unable to download it offline")
+                return None
+            return self._copy_cached(cached[0], g_path)
+
+        try:
+            with span("key.download", repo=reponame, url=s_url, revalidate=cached is not None):
+                response = self._get_session().get(
+                    s_url,
+                    allow_redirects=True,
+                    timeout=self.TIMEOUT,
+                    headers=self.cache.get_headers(cached[1]) if cached is not None else {},
+                )
+        except Exception as e:
+            if cached is not None:
+                log.warning(f"Unable to revalidate key of repo {reponame}, using the cached one: {e}")
+                return self._copy_cached(cached[0], g_path)
+            log.warning(f"Unable to download key: {e}")
+            return None
+
+        try:
+            if response.status_code == HTTPStatus.NOT_MODIFIED and cached is not None:
+                return self._copy_cached(cached[0], g_path)
+
+            # check reponse OK
+            if response.status_code != HTTPStatus.OK:
+                if cached is not None:
+                    log.warning(f"Unable to revalidate key of repo {reponame}, using the cached one: HTTP {response.status_code}")
+                    return self._copy_cached(cached[0], g_path)
+                log.warning(f"Wrong url defined for repo {reponame}")
+                return None
+            content: bytes = response.content
+            etag: Any = response.headers.get("ETag")
+            last_modified: Any = response.headers.get("Last-Modified")
+        finally:
+            response.close()
+
+        with open(g_path, "xb") as f_rel:
+            f_rel.write(content)
+        if not verify_gpg_key(g_path):
+            return None
+
+        try:
+            self.cache.put(
+                s_url,
+                content,
+                etag=etag if isinstance(etag, str) else "",
+                last_modified=last_modified if isinstance(last_modified, str) else "",
+            )
+        except OSError as exc:
+            log.debug(f"Unable to cache key of repo {reponame}: {exc}")
+        return g_path
+
+    @staticmethod
+    def _copy_cached(key_path: str, g_path: str) -> str | None:
+        # Builds get their own copies, the cached keys are shared by all of them
+        try:
+            shutil.copyfile(key_path, g_path)
+        except OSError as exc:
+            log.warning(f"Unable to copy cached key {key_path}: {exc}")
+            return None
+        return g_path
+
+    def resolve(self, repos: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+        """
+        Get copies of the repositories with their keys set, unless they have ones.
+        Repositories without a key are skipped.
+        """
+        self.prefetch(repos)
+        out: Dict[str, Dict[str, str]] = {}
+        for reponame, repodata in repos.items():
+            repodata = dict(repodata)
+            if not repodata.get("key"):
+                key_path: str | None = self.fetch(reponame, repodata)
+                if key_path is None:
+                    log.error(f"Unable to get GPG key for repo {reponame}")
+                    continue
+                if key_path:
+                    repodata["key"] = "file://" + key_path
+            out[reponame] = repodata
+        return out
+
+    def close(self) -> None:
+        """
+        Close pooled connections, keys stay
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def cleanup(self) -> None:
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
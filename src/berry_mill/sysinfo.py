@@ -1,5 +1,6 @@
 import platform
 import os
+import functools
 from typing import Dict  # type: ignore
 import kiwi.logger  # type: ignore
 
@@ -11,17 +12,21 @@ archfix: Dict[str, str] = {
 log = kiwi.logging.getLogger("kiwi")
 
 
+@functools.lru_cache(maxsize=None)
 def get_local_arch() -> str:
     """
     Return the local arch for Debian
     """
-    p = platform.processor()
+    # Processor is unknown on many Linux hosts
+    p = platform.processor() or platform.machine()
     return archfix.get(p) or p
 
 
+@functools.lru_cache(maxsize=None)
 def has_virtualization() -> bool:
     """
     Returns True if a nested virtualization checks passed.
+    Host does not change while running, so it is probed only once.
     """
 
     # CPU supports VM
@@ -57,6 +62,7 @@ def has_virtualization() -> bool:
     return True
 
 
+@functools.lru_cache(maxsize=None)
 def is_vm() -> bool:
     """
     Detect if the current machine is a VM
@@ -0,0 +1,195 @@
+"""
+Tracing of the build phases.
+
+Spans are nested per thread and recorded only when the tracer is enabled,
+otherwise they cost a single check. Recorded spans are exported as Chrome
+trace events (for Perfetto or chrome://tracing) or as OTLP JSON. Hooks are
+entered around each span, e.g. to profile the phases.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import functools
+import itertools
+import threading
+import contextlib
+from typing import Any, Callable, ContextManager, Iterator, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    """
+    One timed phase
+    """
+
+    _ids: Iterator[int] = itertools.count(1)
+
+    def __init__(self, name: str, parent: Span | None = None, **attrs: Any) -> None:
+        self.name: str = name
+        self.attrs: dict[str, Any] = attrs
+        self.span_id: str = "{:08x}{:08x}".format(os.getpid() & 0xFFFFFFFF, next(self._ids) & 0xFFFFFFFF)
+        self.parent_id: str = parent.span_id if parent is not None else ""
+        self.pid: int = os.getpid()
+        self.tid: int = threading.get_ident()
+        self.start: int = time.time_ns()
+        self.duration: int = 0
+        self.error: str = ""
+        self._t0: int = time.perf_counter_ns()
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter_ns() - self._t0
+
+    def __repr__(self) -> str:
+        return "<{} {} {:.6f}s>".format(self.__class__.__name__, self.name, self.duration / 1e9)
+
+
+class Tracer:
+    """
+    Collector of spans of this process
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.spans: list[Span] = []
+        self.trace_id: str = os.urandom(16).hex()
+        # Context managers entered around each span
+        self.hooks: list[Callable[[Span], ContextManager]] = []
+        self._local: threading.local = threading.local()
+        self._lock: threading.Lock = threading.Lock()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        """
+        Drop all recorded spans
+        """
+        with self._lock:
+            self.spans = []
+
+    def extend(self, spans: list[Span]) -> None:
+        """
+        Add spans, recorded elsewhere, e.g. by worker processes
+        """
+        with self._lock:
+            self.spans += spans
+
+    @contextlib.contextmanager
+    def _span(self, name: str, **attrs: Any) -> Iterator[Span]:
+        stack: list[Span] = self._local.__dict__.setdefault("stack", [])
+        span: Span = Span(name, stack[-1] if stack else None, **attrs)
+        stack.append(span)
+        try:
+            with contextlib.ExitStack() as hooks:
+                for hook in self.hooks:
+                    hooks.enter_context(hook(span))
+                yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            span.finish()
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+
+    def span(self, name: str, **attrs: Any) -> contextlib.AbstractContextManager:
+        """
+        Context of a span, nested into the current one of the thread
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._span(name, **attrs)
+
+    def traced(self, name: str) -> Callable[[F], F]:
+        """
+        Decorator, tracing each call of the function as a span
+        """
+
+        def deco(f: F) -> F:
+            @functools.wraps(f)
+            def w(*args: Any, **kw: Any) -> Any:
+                with self.span(name):
+                    return f(*args, **kw)
+
+            return w  # type: ignore [return-value]
+
+        return deco
+
+    def to_chrome(self) -> dict[str, Any]:
+        """
+        Export spans as Chrome trace events
+        """
+        events: list[dict[str, Any]] = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            args: dict[str, Any] = {k: str(v) for k, v in s.attrs.items()}
+            if s.error:
+                args["error"] = s.error
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.name.split(" ")[0].split(".")[0],
+                    "ph": "X",
+                    "ts": s.start / 1000,
+                    "dur": s.duration / 1000,
+                    "pid": s.pid,
+                    "tid": s.tid,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp(self) -> dict[str, Any]:
+        """
+        Export spans as OTLP JSON (ExportTraceServiceRequest)
+        """
+        import berry_mill
+
+        def attrs(d: dict[str, Any]) -> list[dict[str, Any]]:
+            return [{"key": k, "value": {"stringValue": str(v)}} for k, v in d.items()]
+
+        spans: list[dict[str, Any]] = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            spans.append(
+                {
+                    "traceId": self.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id,
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(s.start),
+                    "endTimeUnixNano": str(s.start + s.duration),
+                    "attributes": attrs(dict(s.attrs, **{"process.pid": s.pid, "thread.id": s.tid})),
+                    "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                }
+            )
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": attrs({"service.name": "berrymill"})},
+                    "scopeSpans": [
+                        {"scope": {"name": "berry_mill", "version": getattr(berry_mill, "version", "")}, "spans": spans}
+                    ],
+                }
+            ]
+        }
+
+    def write(self, pth: str, fmt: str = "chrome") -> None:
+        """
+        Write spans to a file in the given format: chrome or otlp
+        """
+        if fmt not in ["chrome", "otlp"]:
+            raise Exception(f'Unknown trace format "{fmt}"')
+        with open(pth, "w") as fw:
+            json.dump(self.to_chrome() if fmt == "chrome" else self.to_otlp(), fw)
+
+
+# Tracer of the process
+tracer: Tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
@@ -0,0 +1,202 @@
+"""
+Benchmarks of the description engine on synthetic large appliances.
+
+Run with:
+
+    python -m pytest test/bench/bench_imgdescr.py
+
+Results are stored to "results.json" next to this file (or BERRYMILL_BENCH_RESULTS)
+and compared to "baseline.json": a benchmark fails if it became slower or takes more
+memory than the baseline times BERRYMILL_BENCH_TOLERANCE (1.5 by default).
+Set BERRYMILL_BENCH_UPDATE=1 to store the results as a new baseline.
+
+Absolute timings vary too much between runs, even on the same machine, so the time
+of a benchmark is divided by the time of a calibration run (deep copy of the flat
+description), measured right before it, and only that relative time is compared.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import gc
+import copy
+import json
+import time
+import platform
+from typing import Any, Callable
+import pytest
+import lxml.etree as ET
+from berry_mill.imgdescr import ApplianceDescription, Loader
+from synth import generate_chain, generate_op
+
+BENCH_DIR: str = os.path.dirname(os.path.abspath(__file__))
+BASELINE: str = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS: str = os.environ.get("BERRYMILL_BENCH_RESULTS", os.path.join(BENCH_DIR, "results.json"))
+TOLERANCE: float = float(os.environ.get("BERRYMILL_BENCH_TOLERANCE", "1.5"))
+TIME_SLACK: float = 0.01  # Short runs are noisy
+MEM_SLACK: int = 0x100000  # Memory is measured in pages and kilobytes
+REPEAT: int = 7
+
+DEPTH: int = 12
+PACKAGES: int = 3000
+PROFILES: int = 30
+OPS: list[str] = ["add", "remove", "remove_any", "merge", "replace", "set", "add_packages", "remove_packages"]
+
+
+def _read_status(key: str) -> int:
+    """
+    Read memory size in bytes from the process status
+    """
+    with open("/proc/self/status") as fr:
+        for line in fr:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def measure_time(setup: Callable[[], Any], run: Callable[[Any], Any]) -> float:
+    """
+    Best time of several runs, setup is not measured
+    """
+    best: float = float("inf")
+    for _ in range(REPEAT):
+        arg: Any = setup()
+        gc.collect()
+        gc.disable()  # Same as timeit does
+        try:
+            start: float = time.perf_counter()
+            run(arg)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def measure_memory(setup: Callable[[], Any], run: Callable[[Any], Any]) -> int:
+    """
+    Peak memory growth of one run, measured in a forked process,
+    so the memory of everything else is not counted and is not left behind.
+    """
+    r, w = os.pipe()
+    pid: int = os.fork()
+    if not pid:
+        peak: int = -1
+        try:
+            os.close(r)
+            arg: Any = setup()
+            gc.collect()
+            with open("/proc/self/clear_refs", "w") as fw:
+                fw.write("5")  # Reset the peak
+            rss: int = _read_status("VmRSS")
+            run(arg)
+            peak = max(0, _read_status("VmHWM") - rss)
+        finally:
+            os.write(w, str(peak).encode())
+            os._exit(0)
+
+    os.close(w)
+    with os.fdopen(r) as fr:
+        out: int = int(fr.read() or -1)
+    os.waitpid(pid, 0)
+    return out
+
+
+class Workload:
+    """
+    Synthetic appliances and the inputs of every benchmark
+    """
+
+    def __init__(self, dst: str) -> None:
+        self.chain: list[str] = generate_chain(dst, depth=DEPTH, packages=PACKAGES, profiles=PROFILES)
+        ldr: Loader = Loader()
+        ldr.load(self.chain[-1])
+        assert ldr.dom is not None
+        self.flat: ET.Element = ldr.dom
+        self.ops: dict[str, ET.Element] = {op: ET.fromstring(generate_op(op, packages=PACKAGES).encode("utf-8")) for op in OPS}
+
+    def get_benchmarks(self) -> dict[str, tuple[Callable[[], Any], Callable[[Any], Any]]]:
+        """
+        Benchmarks by their names: setup and the measured run
+        """
+        b: dict[str, tuple[Callable[[], Any], Callable[[Any], Any]]] = {
+            "loader.load": (lambda: self.chain[-1], lambda pth: Loader().load(pth)),
+            "loader.load.memoized": (
+                lambda: Loader(memoize=True),
+                lambda ldr: [ldr.load(pth) for pth in self.chain],
+            ),
+            "descr.to_str": (lambda: ApplianceDescription(copy.deepcopy(self.flat)), lambda d: d.to_str()),
+        }
+        for op in OPS:
+            b[f"descr.{op}"] = (
+                lambda op=op: (copy.deepcopy(self.ops[op]), copy.deepcopy(self.flat)),
+                lambda a: ApplianceDescription(*a),
+            )
+        return b
+
+    def calibrate(self) -> float:
+        """
+        Time of the reference run that benchmark times are relative to
+        """
+        return measure_time(lambda: self.flat, copy.deepcopy)
+
+
+NAMES: list[str] = ["loader.load", "loader.load.memoized", "descr.to_str"] + [f"descr.{op}" for op in OPS]
+
+
+@pytest.fixture(scope="module")
+def workload(tmp_path_factory) -> Workload:
+    return Workload(str(tmp_path_factory.mktemp("synth")))
+
+
+@pytest.fixture(scope="module")
+def results():
+    out: dict[str, dict[str, float | int]] = {}
+    yield out
+
+    data: dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "lxml": ".".join(map(str, ET.LXML_VERSION)),
+            "machine": platform.machine(),
+            "depth": DEPTH,
+            "packages": PACKAGES,
+            "profiles": PROFILES,
+        },
+        "results": out,
+    }
+    for pth in [RESULTS] + (os.environ.get("BERRYMILL_BENCH_UPDATE") and [BASELINE] or []):
+        with open(pth, "w") as fw:
+            json.dump(data, fw, indent=2, sort_keys=True)
+            fw.write("\n")
+
+
+def _get_baseline(name: str) -> dict[str, float | int] | None:
+    if os.environ.get("BERRYMILL_BENCH_UPDATE") or not os.path.exists(BASELINE):
+        return None
+
+    with open(BASELINE) as fr:
+        return json.load(fr).get("results", {}).get(name)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Memory is measured via procfs")
+@pytest.mark.parametrize("name", NAMES)
+def test_bench(name: str, workload: Workload, results: dict[str, dict[str, float | int]]):
+    """
+    Measure time and peak memory, compare to the baseline
+    """
+    setup, run = workload.get_benchmarks()[name]
+    ref: float = workload.calibrate()
+    tm: float = measure_time(setup, run)
+    results[name] = {"time": tm, "relative": tm / ref, "memory": measure_memory(setup, run)}
+
+    base: dict[str, float | int] | None = _get_baseline(name)
+    if base is None:
+        return
+
+    assert (
+        results[name]["relative"] <= base["relative"] * TOLERANCE + TIME_SLACK / ref
+    ), "{} is slower: {:.2f} times the calibration run, baseline {:.2f}".format(name, results[name]["relative"], base["relative"])
+    assert results[name]["memory"] <= base["memory"] * TOLERANCE + MEM_SLACK, "{} takes more memory: {}, baseline {}".format(
+        name, results[name]["memory"], base["memory"]
+    )
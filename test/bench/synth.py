@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import random
+
+HEAD: str = '<?xml version="1.0" encoding="utf-8"?>\n<image schemaversion="7.4" name="synth">'
+PKG_TYPES: list[str] = ["image", "bootstrap", "iso", "oem"]
+
+
+def _packages(names: list[str], **attrs: str) -> str:
+    return "<packages {}>{}</packages>".format(
+        " ".join(f'{k}="{v}"' for k, v in attrs.items()), "".join(f'<package name="{n}"/>' for n in names)
+    )
+
+
+def get_package_names(packages: int) -> list[str]:
+    return [f"pkg-{i}" for i in range(packages)]
+
+
+def generate_base(packages: int = 3000, profiles: int = 30, seed: int = 0) -> str:
+    """
+    Base appliance with packages spread over all package types and profiles
+    """
+    rnd: random.Random = random.Random(seed)
+    names: list[str] = get_package_names(packages)
+    out: list[str] = [
+        HEAD,
+        "<description type='system'><author>Bench</author><contact>bench@localhost</contact></description>",
+        "<profiles>" + "".join(f'<profile name="P{i}" description="Profile {i}"/>' for i in range(profiles)) + "</profiles>",
+        "<preferences><version>1.0.0</version><packagemanager>apt</packagemanager><locale>en_US</locale></preferences>",
+    ]
+    for i in range(profiles):
+        out.append(f'<preferences profiles="P{i}"><type image="oem" filesystem="ext4" firmware="efi"/></preferences>')
+    out.append('<users><user name="root" groups="root" password="x" home="/root"/></users>')
+    for i in range(profiles):
+        out.append(
+            f'<repository type="apt-deb" alias="repo-{i}" profiles="P{i}"><source path="http://localhost/{i}"/></repository>'
+        )
+
+    for t in PKG_TYPES:
+        out.append(_packages(rnd.sample(names, packages // 4), type=t))
+    per_profile: int = max(1, packages // profiles)
+    for i in range(profiles):
+        out.append(_packages(names[i * per_profile : (i + 1) * per_profile], type="image", profiles=f"P{i}"))
+
+    out.append("</image>")
+    return "\n".join(out)
+
+
+def generate_level(parent: str, level: int, packages: int = 3000, seed: int = 0) -> str:
+    """
+    Derived level of an inheritance chain, using every inheritance op
+    """
+    rnd: random.Random = random.Random(seed * 1000 + level)
+    names: list[str] = get_package_names(packages)
+    out: list[str] = [
+        HEAD,
+        f'<inherit path="{parent}"/>',
+        "<add>"
+        + _packages([f"lvl{level}-{n}" for n in rnd.sample(names, 100)], type="image")
+        + _packages([f"lvl{level}-new"], type="delete")
+        + "</add>",
+        "<remove>" + _packages(rnd.sample(names, 100), type="bootstrap") + "</remove>",
+        f'<remove_any><package name="{rnd.choice(names)}"/></remove_any>',
+        f"<merge><description type='system'><license>L{level}</license></description></merge>",
+        f'<replace>{_packages([f"lvl{level}-oem"], type="oem")}</replace>',
+        f"<set xpath=\"//user[@name='root']\">\n  password: p{level}\n</set>",
+        "</image>",
+    ]
+    return "\n".join(out)
+
+
+def generate_op(op: str, count: int = 100, packages: int = 3000, seed: int = 0) -> str:
+    """
+    Derived description with many instances of one inheritance op only
+    """
+    rnd: random.Random = random.Random(seed)
+    names: list[str] = get_package_names(packages)
+    out: list[str] = [HEAD]
+    for i in range(count):
+        if op == "add":
+            out.append("<add>" + _packages([f"op-{i}-{n}" for n in rnd.sample(names, 10)], type="image") + "</add>")
+        elif op == "remove":
+            out.append("<remove>" + _packages(rnd.sample(names, 10), type=rnd.choice(PKG_TYPES)) + "</remove>")
+        elif op == "remove_any":
+            out.append(f'<remove_any><package name="{rnd.choice(names)}"/></remove_any>')
+        elif op == "merge":
+            out.append(f"<merge><description type='system'><op-{i}>x</op-{i}></description></merge>")
+        elif op == "replace":
+            out.append(f'<replace>{_packages([f"op-{i}"], type=rnd.choice(PKG_TYPES))}</replace>')
+        elif op == "add_packages":
+            out.append(
+                '<add_packages type="image">{}</add_packages>'.format(" ".join(f"op-{i}-{n}" for n in rnd.sample(names, 10)))
+            )
+        elif op == "remove_packages":
+            out.append(
+                '<remove_packages type="{}">{}</remove_packages>'.format(rnd.choice(PKG_TYPES), " ".join(rnd.sample(names, 10)))
+            )
+        elif op == "set":
+            out.append(f"<set xpath=\"//package[@name='{rnd.choice(names)}']\">\n  arch: x86_64\n</set>")
+        else:
+            raise ValueError(f"Unknown op: {op}")
+    out.append("</image>")
+    return "\n".join(out)
+
+
+def generate_chain(dst: str, depth: int = 12, packages: int = 3000, profiles: int = 30, seed: int = 0) -> list[str]:
+    """
+    Write an inheritance chain of the given depth to a directory.
+    Returns paths of all descriptions, base first.
+    """
+    chain: list[str] = [os.path.join(dst, "base.xml")]
+    with open(chain[0], "w") as fw:
+        fw.write(generate_base(packages, profiles, seed))
+
+    for level in range(depth):
+        chain.append(os.path.join(dst, f"level-{level}.xml"))
+        with open(chain[-1], "w") as fw:
+            fw.write(generate_level(chain[-2], level, packages, seed))
+
+    return chain
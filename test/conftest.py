@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from typing import Iterator
+import pytest
+
+
+@pytest.fixture
+def tmp_dir(monkeypatch) -> Iterator[str]:
+    """
+    Private temporary directory of the test, also holding the berrymill caches.
+
+    Some builder tests clean up the whole /tmp, which takes the base directory
+    of pytest's tmp_path away, so each test makes a directory on its own.
+    """
+    pth: str = os.path.realpath(tempfile.mkdtemp(prefix="berrymill-test-"))
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join(pth, "cache"))
+    try:
+        yield pth
+    finally:
+        shutil.rmtree(pth, ignore_errors=True)
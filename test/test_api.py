@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import os
+import sys
+import shutil
+import unittest.mock
+import pytest
+from berry_mill import api
+from berry_mill.api import BuildResult
+from berry_mill.kiwiapp import KiwiAppBox, KiwiAppLocal
+
+
+class TestApi:
+    """
+    Unit tests suite for the Python build API
+    """
+
+    def get_descr(self, tmp_dir) -> str:
+        pth: str = os.path.join(tmp_dir, "descr", "test_appliance.xml")
+        os.makedirs(os.path.dirname(pth))
+        shutil.copy("test/descr/test_appliance.xml", pth)
+        return pth
+
+    def test_build(self, tmp_dir, monkeypatch):
+        """
+        Build runs on the given description without changing the process state
+        """
+        descr: str = self.get_descr(tmp_dir)
+        monkeypatch.setattr(api, "get_local_arch", lambda: "amd64")
+        with open(descr) as fr:
+            orig: str = fr.read()
+        argv: list[str] = list(sys.argv)
+        cwd: str = os.getcwd()
+
+        with unittest.mock.patch("berry_mill.kiwiapp.KiwiAppLocal.run") as run:
+            res: BuildResult = api.build(
+                descr, os.path.join(tmp_dir, "out"), profile="Live", arch="amd64", repos={}, local=True
+            )
+            run.assert_called_once()
+
+        assert res.ok, res.error
+        assert res.target_dir == os.path.join(tmp_dir, "out", "Ubuntu-22.04_appliance", "Live")
+        assert (res.profile, res.arch) == ("Live", "amd64")
+        assert sys.argv == argv and os.getcwd() == cwd
+
+        # Original description is back
+        with open(descr) as fr:
+            assert fr.read() == orig
+        assert os.listdir(os.path.dirname(descr)) == ["test_appliance.xml"]
+
+    def test_build_failure(self, tmp_dir):
+        """
+        Failure is returned as a result, instead of exiting the process
+        """
+        descr: str = self.get_descr(tmp_dir)
+        with unittest.mock.patch("berry_mill.kiwiapp.KiwiAppLocal.run") as run:
+            res: BuildResult = api.build(descr, os.path.join(tmp_dir, "out"), profile="Nonexistent", repos={}, local=True)
+            run.assert_not_called()
+
+        assert not res.ok and res.error
+        assert not res.artifacts
+        assert os.listdir(os.path.dirname(descr)) == ["test_appliance.xml"]
+
+    def test_build_arch(self, tmp_dir, monkeypatch):
+        """
+        Foreign architecture is cross built or fails, but never built natively
+        """
+        descr: str = self.get_descr(tmp_dir)
+        monkeypatch.setattr(api, "get_local_arch", lambda: "amd64")
+        with unittest.mock.patch("berry_mill.api._build", side_effect=lambda res, *args: res) as build:
+            assert api.build(descr, tmp_dir, arch="arm64", repos={}).arch == "arm64"
+            assert build.call_args.args[3]["cross"]
+
+            assert not api.build(descr, tmp_dir, arch="amd64", repos={}).error
+            assert not build.call_args.args[3]["cross"]
+
+            for kw in [{"local": True}, {"cross": True, "arch": "amd64"}, {"arch": "riscv64"}]:
+                res: BuildResult = api.build(descr, tmp_dir, **dict({"arch": "arm64"}, **kw), repos={})
+                assert not res.ok and res.error
+            assert build.call_count == 2
+
+    def test_kiwi_argv(self):
+        """
+        Kiwi task gets the app command line, which is restored afterwards
+        """
+        argv: list[str] = list(sys.argv)
+        seen: list[list[str]] = []
+
+        def task(*args):
+            seen.append(list(sys.argv))
+            return unittest.mock.MagicMock()
+
+        with unittest.mock.patch("berry_mill.localwrap.LocalBuildTask", task):
+            KiwiAppLocal(["kiwi-ng", "system", "build"], repos={}).run()
+
+        assert seen == [["kiwi-ng", "system", "build"]]
+        assert sys.argv == argv
+
+    def test_build_plugin_config(self, tmp_dir):
+        """
+        Box builds of the API get the boxed plugin configuration of the berrymill configuration
+        """
+        descr: str = self.get_descr(tmp_dir)
+        cfg = unittest.mock.MagicMock(config={"boxed_plugin_conf": "/spam/box.yml"})
+        with unittest.mock.patch("berry_mill.api._build", side_effect=lambda res, tgt, setup, kw: setup() and res) as build:
+            api.build(descr, tmp_dir, config=cfg)
+            assert build.call_args.args[3]["boxed_plugin_conf"] == "/spam/box.yml"
+
+            api.build(descr, tmp_dir, config=cfg, boxed_plugin_conf="/eggs/box.yml")
+            assert build.call_args.args[3]["boxed_plugin_conf"] == "/eggs/box.yml"
+
+    def test_box_plugin_config(self, tmp_dir, monkeypatch):
+        """
+        Boxed plugin sees its configuration while the task runs, the environment is restored afterwards
+        """
+        monkeypatch.delenv("KIWI_BOXED_PLUGIN_CFG", raising=False)
+        seen: list[str | None] = []
+        task = unittest.mock.MagicMock()
+        task.return_value.process.side_effect = lambda: seen.append(os.environ.get("KIWI_BOXED_PLUGIN_CFG"))
+
+        with unittest.mock.patch("berry_mill.boxbuild.BoxBuildTask", task):
+            KiwiAppBox(["kiwi-ng", "system", "boxbuild"], repos={}, args_tmp_dir=tmp_dir, plugin_cfg="/spam/box.yml").run()
+
+        assert seen == ["/spam/box.yml"]
+        assert "KIWI_BOXED_PLUGIN_CFG" not in os.environ
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_build_matrix(self, tmp_dir, jobs: int):
+        """
+        Every cell of the matrix gets a result, foreign architectures fail without building
+        """
+        descr: str = self.get_descr(tmp_dir)
+        host: str = api.get_local_arch()
+        with unittest.mock.patch("berry_mill.kiwiapp.KiwiAppLocal.run") as run:
+            results: list[BuildResult] = api.build_matrix(
+                descr,
+                os.path.join(tmp_dir, "out"),
+                profiles=["Live", "Disk"],
+                archs=[host, "riscv64"],
+                jobs=jobs,
+                repos={},
+                prune_profiles=True,
+                local=True,
+            )
+            if jobs == 1:
+                assert run.call_count == 2
+
+        assert [(r.profile, r.arch, r.ok) for r in results] == [
+            ("Live", host, True),
+            ("Live", "riscv64", False),
+            ("Disk", host, True),
+            ("Disk", "riscv64", False),
+        ]
+        assert results[0].target_dir == os.path.join(tmp_dir, "out", host, "Ubuntu-22.04_appliance", "Live")
+        assert results[2].target_dir == os.path.join(tmp_dir, "out", host, "Ubuntu-22.04_appliance", "Disk")
+        assert "riscv64" in results[1].error
+        assert "FAILED" in api.report(results)
+        assert os.listdir(os.path.dirname(descr)) == ["test_appliance.xml"]
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import os
+import shutil
+import pytest
+from berry_mill.appliance import ApplianceStage
+
+DERIVED: str = """<?xml version="1.0" encoding="utf-8"?>
+<image schemaversion="6.8" name="derived">
+    <inherit path="{}"/>
+    <add><packages type="image"><package name="mc"/></packages></add>
+</image>
+"""
+
+REFS: str = """<?xml version="1.0" encoding="utf-8"?>
+<image schemaversion="6.8" name="refs">
+    <inherit path="{}"/>
+    <add><packages type="image"><archive name="overlay.tar.gz"/></packages></add>
+    <add><repository type="rpm-md"><source path="this://repo"/></repository></add>
+</image>
+"""
+
+
+@pytest.fixture
+def appliance(tmp_dir: str) -> str:
+    base: str = os.path.join(tmp_dir, "base")
+    os.makedirs(os.path.join(base, "root", "etc"))
+    os.makedirs(os.path.join(base, "other"))
+    shutil.copy("test/descr/test_appliance.xml", os.path.join(base, "config.xml"))
+    for f in [os.path.join(base, "config.sh"), os.path.join(base, "root", "etc", "motd")]:
+        with open(f, "w") as fw:
+            fw.write("x")
+    os.symlink("../usr/share/zoneinfo/UTC", os.path.join(base, "root", "etc", "localtime"))
+
+    derived: str = os.path.join(tmp_dir, "derived")
+    os.makedirs(derived)
+    with open(os.path.join(derived, "derived.kiwi"), "w") as fw:
+        fw.write(DERIVED.format(os.path.join(base, "config.xml")))
+    with open(os.path.join(derived, "config.sh"), "w") as fw:
+        fw.write("y")
+
+    return tmp_dir
+
+
+class TestApplianceStage:
+    """
+    Unit tests suite for staging of the appliance for kiwi
+    """
+
+    def test_stage(self, appliance: str):
+        """
+        Rendered description and links to the appliance are staged in a private directory
+        """
+        derived: str = os.path.join(appliance, "derived")
+        stage: ApplianceStage = ApplianceStage(os.path.join(derived, "derived.kiwi"))
+        rendered = stage.setup()
+        try:
+            assert os.path.dirname(rendered.path) == stage.work_dir
+            assert os.path.dirname(stage.work_dir) == derived
+            assert sorted(os.listdir(stage.work_dir)) == ["config.sh", "derived.kiwi", "root"]
+            with open(rendered.path) as fr:
+                assert "<inherit" not in fr.read() and "mc" in rendered.to_str()
+
+            # Own files win over the base ones, files are hard-linked
+            assert os.path.samefile(os.path.join(stage.work_dir, "config.sh"), os.path.join(derived, "config.sh"))
+            # Trees are hard-linked as well, there are no links to the host paths for the box VM
+            assert not os.path.islink(os.path.join(stage.work_dir, "root"))
+            assert os.path.samefile(
+                os.path.join(stage.work_dir, "root", "etc", "motd"), os.path.join(appliance, "base", "root", "etc", "motd")
+            )
+            assert os.readlink(os.path.join(stage.work_dir, "root", "etc", "localtime")) == "../usr/share/zoneinfo/UTC"
+        finally:
+            stage.cleanup()
+
+        assert sorted(os.listdir(derived)) == ["config.sh", "derived.kiwi"]
+        assert os.path.exists(os.path.join(appliance, "base", "root", "etc", "motd"))
+
+    def test_concurrent(self, appliance: str):
+        """
+        Builds of the same description do not see each other
+        """
+        pth: str = os.path.join(appliance, "base", "config.xml")
+        with open(pth) as fr:
+            orig: str = fr.read()
+
+        stages: list[ApplianceStage] = [ApplianceStage(pth, profile=p) for p in ["Live", "Disk"]]
+        rendered = [s.setup() for s in stages]
+        try:
+            assert stages[0].work_dir != stages[1].work_dir
+            assert rendered[0].to_str() != rendered[1].to_str()
+            for s in stages:
+                assert sorted(os.listdir(s.work_dir)) == ["config.sh", "config.xml", "root"]
+            with open(pth) as fr:
+                assert fr.read() == orig
+        finally:
+            for s in stages:
+                s.cleanup()
+
+        assert sorted(os.listdir(os.path.join(appliance, "base"))) == ["config.sh", "config.xml", "other", "root"]
+
+    def test_stage_entries(self, appliance: str):
+        """
+        Only entries kiwi reads are staged: own ones, profile overlays and files the description refers to
+        """
+        derived: str = os.path.join(appliance, "derived")
+        for d in ["repo", "Live", "build", ".git", ApplianceStage.PREFIX + "old"]:
+            os.makedirs(os.path.join(derived, d))
+        for f in ["overlay.tar.gz", "config-cdroot.tar.xz", "notes.txt"]:
+            with open(os.path.join(derived, f), "w") as fw:
+                fw.write("x")
+        with open(os.path.join(derived, "refs.kiwi"), "w") as fw:
+            fw.write(REFS.format(os.path.join(appliance, "base", "config.xml")))
+
+        stage: ApplianceStage = ApplianceStage(os.path.join(derived, "refs.kiwi"))
+        stage.setup()
+        try:
+            assert sorted(os.listdir(stage.work_dir)) == [
+                "Live",
+                "config-cdroot.tar.xz",
+                "config.sh",
+                "overlay.tar.gz",
+                "refs.kiwi",
+                "repo",
+                "root",
+            ]
+        finally:
+            stage.cleanup()
+
+    def test_stage_links(self, appliance: str):
+        """
+        Relative links of the appliance entries still resolve from the work directory
+        """
+        derived: str = os.path.join(appliance, "derived")
+        os.makedirs(os.path.join(appliance, "shared", "root"))
+        with open(os.path.join(appliance, "shared", "images.sh"), "w") as fw:
+            fw.write("z")
+        os.symlink("../shared/images.sh", os.path.join(derived, "images.sh"))
+        os.symlink("../shared/root", os.path.join(derived, "root"))
+
+        stage: ApplianceStage = ApplianceStage(os.path.join(derived, "derived.kiwi"))
+        stage.setup()
+        try:
+            assert not os.path.islink(os.path.join(stage.work_dir, "images.sh"))
+            assert os.path.samefile(os.path.join(stage.work_dir, "images.sh"), os.path.join(appliance, "shared", "images.sh"))
+            assert not os.path.islink(os.path.join(stage.work_dir, "root"))
+            assert os.listdir(os.path.join(stage.work_dir, "root")) == []
+        finally:
+            stage.cleanup()
+
+    def test_relative_inherit(self, appliance: str, monkeypatch):
+        """
+        Relative inherited path is resolved against the inheriting description, not the current directory
+        """
+        derived: str = os.path.join(appliance, "derived")
+        with open(os.path.join(derived, "relative.kiwi"), "w") as fw:
+            fw.write(DERIVED.format("../base/config.xml"))
+        shutil.copy(os.path.join(appliance, "base", "config.xml"), os.path.join(derived, "description.xml"))
+        with open(os.path.join(derived, "sibling.kiwi"), "w") as fw:
+            fw.write(DERIVED.format("description.xml"))
+
+        monkeypatch.chdir(appliance)
+        for descr in ["derived/relative.kiwi", "derived/sibling.kiwi"]:
+            stage: ApplianceStage = ApplianceStage(descr)
+            try:
+                assert "mc" in stage.setup().to_str()
+            finally:
+                stage.cleanup()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+import shutil
+import unittest.mock
+import pytest
+from berry_mill import api
+from berry_mill.api import BuildResult
+from berry_mill.buildcache import BuildCache, BuildDigest, parse_size
+
+
+def write(pth: str, data: str) -> str:
+    os.makedirs(os.path.dirname(pth), exist_ok=True)
+    with open(pth, "w") as fw:
+        fw.write(data)
+    return pth
+
+
+class TestBuildCache:
+    """
+    Unit tests suite for the build results cache
+    """
+
+    def test_parse_size(self):
+        assert parse_size("20G") == 20 << 30
+        assert parse_size("512 MiB") == 512 << 20
+        assert parse_size(100) == 100
+        with pytest.raises(Exception):
+            parse_size("big")
+
+    def test_digest(self, tmp_dir: str):
+        """
+        Digest follows the content of the overlay tree
+        """
+        root: str = os.path.join(tmp_dir, "root")
+        write(os.path.join(root, "etc", "motd"), "x")
+        first: str = BuildDigest().add_tree("root", root).hexdigest()
+        assert first == BuildDigest().add_tree("root", root).hexdigest()
+
+        write(os.path.join(root, "etc", "motd"), "y")
+        assert first != BuildDigest().add_tree("root", root).hexdigest()
+
+    def test_store_restore_evict(self, tmp_dir: str):
+        """
+        Image files are restored, least recently used entries are evicted
+        """
+        cache: BuildCache = BuildCache(os.path.join(tmp_dir, "builds"), max_size=10)
+        write(os.path.join(tmp_dir, "a", "image.raw"), "123456")
+        write(os.path.join(tmp_dir, "a", "build", "image-root", "bin"), "ignored")
+        cache.store("a", os.path.join(tmp_dir, "a"))
+        assert not cache.restore("b", os.path.join(tmp_dir, "out"))
+        assert cache.restore("a", os.path.join(tmp_dir, "out"))
+        assert os.listdir(os.path.join(tmp_dir, "out")) == ["image.raw"]
+
+        write(os.path.join(tmp_dir, "b", "image.raw"), "123456")
+        cache.store("b", os.path.join(tmp_dir, "b"))
+        assert [e["digest"] for e in cache.get_entries()] == ["b"]
+
+    def test_build(self, tmp_dir: str):
+        """
+        Unchanged build is restored from the cache, unless refreshed
+        """
+        descr: str = os.path.join(tmp_dir, "descr", "test_appliance.xml")
+        os.makedirs(os.path.dirname(descr))
+        shutil.copy("test/descr/test_appliance.xml", descr)
+        target_dir: str = os.path.join(tmp_dir, "out")
+        image: str = os.path.join(target_dir, "Ubuntu-22.04_appliance", "Live", "image.raw")
+
+        def build(**kw) -> BuildResult:
+            return api.build(descr, target_dir, profile="Live", repos={}, local=True, clean=True, **kw)
+
+        with unittest.mock.patch("berry_mill.kiwiapp.KiwiAppLocal.run", side_effect=lambda: write(image, "v1")) as run:
+            assert not build().cached
+            res: BuildResult = build()
+            assert res.ok and res.cached and run.call_count == 1
+            assert res.artifacts == [image]
+
+            assert not build(refresh=True).cached
+            assert not build(no_cache=True).cached
+            assert run.call_count == 3
+
+            write(os.path.join(os.path.dirname(descr), "config.sh"), "echo")
+            assert not build().cached
+            assert run.call_count == 4
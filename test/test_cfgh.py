@@ -3,7 +3,8 @@ from pytest import LogCaptureFixture
 import yaml
 import os
 import tempfile
-from berry_mill.cfgh import ConfigHandler, Autodict
+import unittest.mock
+from berry_mill.cfgh import ConfigHandler, ConfigSnapshots, ConfigView, Autodict, merge
 import pytest
 import kiwi.logger
 
@@ -145,3 +146,95 @@ class TestCollectionConfigHandler:
             assert "ERROR: unable to load configuration" in captured.out
         except SystemExit as e:
             assert e.code == 1
+
+
+"""
+Test class for ConfigView
+"""
+
+
+class TestCollectionConfigView:
+
+    @pytest.fixture
+    def config_handler(self):
+        config_handler: ConfigHandler = ConfigHandler()
+        config_handler._parse_config('./config/berrymill.conf.example')
+        return config_handler
+
+    def test_config_is_shared(self, config_handler: ConfigHandler):
+        # Views are not copies of the configuration
+        config_handler.raw_unsafe_config()["cache_dir"] = "/var/cache/test"
+        assert config_handler.config["cache_dir"] == "/var/cache/test"
+        raw: dict = config_handler.raw_unsafe_config()
+        assert config_handler.config["repos"]["release"]["amd64"] == raw["repos"]["release"]["amd64"]
+
+    def test_config_is_read_only(self, config_handler: ConfigHandler):
+        view: ConfigView = config_handler.config
+        with pytest.raises(TypeError):
+            view["cache_dir"] = "/tmp"
+        with pytest.raises(AttributeError):
+            view["repos"].update({})
+
+        # Reading never creates missing sections
+        assert not view["no-such-section"] and view.get("no-such-section") is None
+        assert "no-such-section" not in config_handler.raw_unsafe_config()
+
+    def test_config_copy_on_write(self, config_handler: ConfigHandler):
+        repos: dict = config_handler.config["repos"].to_dict()
+        repos["release"]["amd64"].clear()
+        assert config_handler.config["repos"]["release"]["amd64"]
+
+        # Repositories are given to the builders as their own copies
+        config_handler.get_repos("amd64")["Ubuntu-Jammy"]["key"] = "file:///tmp/key"
+        assert config_handler.config["repos"]["release"]["amd64"]["Ubuntu-Jammy"].get("key") is None
+
+    def test_config_dump(self, config_handler: ConfigHandler):
+        assert yaml.safe_load(yaml.dump(config_handler.config)) == config_handler.config
+
+
+"""
+Test class for layered configuration
+"""
+
+
+class TestCollectionConfigLayers:
+
+    @pytest.fixture
+    def layers(self, tmp_dir: str) -> str:
+        pth: str = tmp_dir
+        with open(os.path.join(pth, "base.conf"), "w") as fw:
+            fw.write("cache_dir: /var/cache/base\nrepos:\n  release:\n    amd64:\n")
+            fw.write("      main: {url: http://base, type: apt-deb}\n")
+        with open(os.path.join(pth, "project.conf"), "w") as fw:
+            fw.write("repos:\n  release:\n    amd64:\n      extra: {url: http://extra, type: apt-deb}\n")
+        return pth
+
+    def get_handler(self, pth: str) -> ConfigHandler:
+        snapshots: ConfigSnapshots = ConfigSnapshots(os.path.join(pth, "cache"))
+        config_handler: ConfigHandler = ConfigHandler(os.path.join(pth, "base.conf"), snapshots=snapshots)
+        config_handler.add_config(os.path.join(pth, "base.conf"))
+        config_handler.add_config(os.path.join(pth, "project.conf"))
+        return config_handler
+
+    def test_deep_merge(self, layers: str):
+        config_handler: ConfigHandler = self.get_handler(layers)
+        config_handler.load()
+        # Overlay adds repositories instead of replacing the whole section
+        assert sorted(config_handler.get_repos("amd64")) == ["extra", "main"]
+        assert config_handler.config["cache_dir"] == "/var/cache/base"
+        assert merge({"a": {"b": 1, "c": [1]}}, {"a": {"c": [2]}, "d": 3}) == {"a": {"b": 1, "c": [2]}, "d": 3}
+
+    def test_snapshot(self, layers: str):
+        self.get_handler(layers).load()
+
+        # Unchanged configuration is not parsed again
+        config_handler: ConfigHandler = self.get_handler(layers)
+        with unittest.mock.patch("yaml.load", side_effect=AssertionError("parsed")):
+            config_handler.load()
+        assert sorted(config_handler.get_repos("amd64")) == ["extra", "main"]
+
+        with open(os.path.join(layers, "project.conf"), "a") as fw:
+            fw.write("cache_dir: /var/cache/project\n")
+        config_handler = self.get_handler(layers)
+        config_handler.load()
+        assert config_handler.config["cache_dir"] == "/var/cache/project"
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+import pytest
+from berry_mill import daemon
+
+SRC: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+@pytest.fixture
+def sock_path(tmp_dir, monkeypatch) -> str:
+    pth: str = os.path.join(tmp_dir, "berrymill.sock")
+    monkeypatch.setenv(daemon.ENV_SOCKET, pth)
+    monkeypatch.delenv(daemon.ENV_NO_DAEMON, raising=False)
+    return pth
+
+
+@pytest.fixture
+def server(sock_path: str):
+    env: dict[str, str] = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([SRC] + [p for p in [env.get("PYTHONPATH")] if p])
+    p: subprocess.Popen = subprocess.Popen(
+        [sys.executable, "-c", "from berry_mill.daemon import Daemon; Daemon().serve()"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(300):
+            if os.path.exists(sock_path) or p.poll() is not None:
+                break
+            time.sleep(0.05)
+        assert os.path.exists(sock_path), "Daemon did not start"
+        yield p
+    finally:
+        p.send_signal(signal.SIGTERM)
+        p.wait(timeout=30)
+
+
+class TestDaemon:
+    """
+    Unit tests suite for the resident daemon
+    """
+
+    def test_no_daemon(self, sock_path: str):
+        """
+        Client runs the job on its own, if there is no daemon
+        """
+        assert daemon.forward(["berrymill", "--help"]) is None
+
+        # Stale socket of a killed daemon
+        s: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.bind(sock_path)
+        s.close()
+        assert daemon.forward(["berrymill", "--help"]) is None
+
+    def test_disabled(self, server: subprocess.Popen, monkeypatch):
+        """
+        Daemon is not used, if disabled in the environment
+        """
+        monkeypatch.setenv(daemon.ENV_NO_DAEMON, "1")
+        assert daemon.forward(["berrymill", "--help"]) is None
+
+    def test_forward(self, server: subprocess.Popen, tmp_dir, capfd):
+        """
+        Job runs in the working directory of the client and writes to its streams
+        """
+        out: str = os.path.join(tmp_dir, "out")
+        assert daemon.forward(["berrymill", "render", "test/descr/chain_d.xml", "-o", out]) == 0
+        assert os.path.exists(os.path.join(out, "chain_d.xml"))
+        assert "Rendered" in capfd.readouterr().out
+
+        # Exit code of the job is returned
+        assert daemon.forward(["berrymill", "nonexistent-command"]) == 2
+        assert "invalid choice" in capfd.readouterr().err
+
+    def test_stop(self, server: subprocess.Popen, sock_path: str):
+        """
+        Daemon removes its socket on stop
+        """
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
+        assert not os.path.exists(sock_path)
+        assert daemon.forward(["berrymill", "--help"]) is None
+
+    def test_already_running(self, server: subprocess.Popen, sock_path: str):
+        """
+        Second daemon does not steal the socket
+        """
+        with pytest.raises(Exception, match="already running"):
+            daemon.Daemon(sock_path)._bind()
+        assert os.path.exists(sock_path)
@@ -133,3 +133,88 @@ class TestImgDescr_Packages:
         u_tag = self.ad.p_dom.xpath("//user")[0]
         assert u_tag.attrib["password"] == "linux", "Password should be default set to 'linux'"
         assert u_tag.attrib["pwdformat"] == "plain", "Password should be in plain format"
+
+
+class TestImgDescr_Reentrant:
+    """
+    Unit test suite for running descriptions side by side
+    """
+
+    def test_id_threads(self):
+        """
+        Descriptions are flattened in threads with the same result
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with open("test/descr/appliance_add_packages.xml") as fr:
+            descr: str = fr.read()
+        expected: str = ApplianceDescription(descr).to_str()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: ApplianceDescription(descr).to_str(), range(32)))
+
+        assert results == [expected] * 32, "All results should be the same"
+
+
+class TestImgDescr_BulkPackages:
+    """
+    Unit test suite for `<add_packages/>` and `<remove_packages/>` bulk ops.
+    """
+
+    def setup_method(self, method):
+        """
+        Setup test method
+        """
+        self.ad = ApplianceDescription(open("test/descr/appliance_bulk_packages.xml").read())
+
+    def get_names(self, pkg_type: str) -> list:
+        return [
+            [p.attrib["name"] for p in aggr.findall("package")]
+            for aggr in self.ad.p_dom.findall("packages")
+            if aggr.attrib.get("type") == pkg_type
+        ]
+
+    def test_id_bulk_add(self):
+        """
+        Packages are added once, after the existing ones, in order of the list
+        """
+        names = self.get_names("image")
+        assert len(names) == 1, "Packages should be added to the existing aggregate"
+        assert names[0][-4:] == ["mc", "vim", "emacs-nox", "nano"], "Inline list goes first, then the file"
+        assert names[0].count("plymouth") == 1, "Already present package is added again"
+
+    def test_id_bulk_add_aggregate(self):
+        """
+        Missing aggregate is created
+        """
+        assert self.get_names("delete") == [["dracula-kiwi-salad"]]
+
+    def test_id_bulk_remove(self):
+        """
+        Only listed packages are removed
+        """
+        names = self.get_names("image")[0]
+        assert "grub-common" not in names and "grub-efi-amd64" not in names
+        assert "grub2-themes-ubuntu-mate" in names
+
+    def test_id_bulk_includes(self):
+        """
+        Package list files are tracked
+        """
+        assert self.ad.includes == ["test/descr/packages.txt"]
+
+    def test_id_bulk_same_as_single(self):
+        """
+        Bulk ops render the same as the single package ops
+        """
+        single = ApplianceDescription(
+            """<image><inherit path="test/descr/test_appliance.xml"/>
+            <add><packages type="image"><package name="vim"/><package name="mc"/></packages></add>
+            <remove><packages type="image"><package name="plymouth"/></packages></remove></image>"""
+        )
+        bulk = ApplianceDescription(
+            """<image><inherit path="test/descr/test_appliance.xml"/>
+            <add_packages type="image">vim mc vim</add_packages>
+            <remove_packages type="image">plymouth</remove_packages></image>"""
+        )
+        assert single.to_str() == bulk.to_str()
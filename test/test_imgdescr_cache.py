@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os
+import unittest.mock
+from berry_mill.imgdescr import DescriptionCache, Loader
+
+
+class TestImgDescr_DescriptionCache:
+    """
+    Unit tests suite for rendered descriptions cache
+    """
+
+    def _derive(self, tmp_dir, name: str = "derived.xml") -> str:
+        """
+        Write a derived description, inheriting the test appliance
+        """
+        pth: str = os.path.join(tmp_dir, name)
+        with open(pth, "w") as fw:
+            fw.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<image schemaversion="6.8" name="Ubuntu-22.04_appliance">\n'
+                '    <inherit path="{}"/>\n'
+                '    <add><packages type="image"><package name="humperdoo"/></packages></add>\n'
+                "</image>\n".format(os.path.abspath("test/descr/test_appliance.xml"))
+            )
+        return pth
+
+    def test_cache_miss_renders(self, tmp_dir):
+        """
+        First load renders the description as usual
+        """
+        pth: str = self._derive(tmp_dir)
+        assert DescriptionCache(os.path.join(tmp_dir, "cache")).load(pth) == Loader().load(pth), "Rendered description mismatch"
+
+    def test_cache_hit_skips_loader(self, tmp_dir):
+        """
+        Second load should not touch the loader
+        """
+        pth: str = self._derive(tmp_dir)
+        cache: DescriptionCache = DescriptionCache(os.path.join(tmp_dir, "cache"))
+        out: str = cache.load(pth)
+
+        with unittest.mock.patch.object(Loader, "load", side_effect=AssertionError("Loader called")):
+            ldr: Loader = Loader()
+            assert cache.load(pth, ldr) == out, "Cached description mismatch"
+
+        assert ldr.is_derived, "Loader state should be restored from the cache"
+        assert ldr.main_appliance_pth == os.path.abspath("test/descr/test_appliance.xml"), "Wrong main appliance"
+
+    def test_cache_invalidated_on_change(self, tmp_dir):
+        """
+        Changing any file in the chain invalidates the entry
+        """
+        pth: str = self._derive(tmp_dir)
+        cache: DescriptionCache = DescriptionCache(os.path.join(tmp_dir, "cache"))
+        cache.load(pth)
+
+        with open(pth) as fr:
+            data: str = fr.read()
+        with open(pth, "w") as fw:
+            fw.write(data.replace("humperdoo", "dumperhoo"))
+
+        assert cache.get(pth) is None, "Entry should be invalid"
+        assert "dumperhoo" in cache.load(pth), "Changes were not rendered"
+
+    def test_cache_eviction(self, tmp_dir):
+        """
+        Entries above the limit are evicted
+        """
+        cache: DescriptionCache = DescriptionCache(os.path.join(tmp_dir, "cache"), max_entries=2)
+        for i in range(4):
+            cache.load(self._derive(tmp_dir, f"derived-{i}.xml"))
+
+        assert len(os.listdir(os.path.join(tmp_dir, "cache", "manifests"))) == 2, "Only two manifests should stay"
+
+    def test_cache_invalidated_on_package_list_change(self, tmp_dir):
+        """
+        Changing a package list file invalidates the entry
+        """
+        lst: str = os.path.join(tmp_dir, "packages.txt")
+        with open(lst, "w") as fw:
+            fw.write("vim\n")
+
+        pth: str = os.path.join(tmp_dir, "derived.xml")
+        with open(pth, "w") as fw:
+            fw.write(
+                '<image schemaversion="6.8" name="Ubuntu-22.04_appliance">\n'
+                '    <inherit path="{}"/>\n'
+                '    <add_packages type="image" file="{}"/>\n'
+                "</image>\n".format(os.path.abspath("test/descr/test_appliance.xml"), lst)
+            )
+
+        cache: DescriptionCache = DescriptionCache(os.path.join(tmp_dir, "cache"))
+        assert '"vim"' in cache.load(pth)
+
+        with open(lst, "w") as fw:
+            fw.write("emacs\n")
+        out: str = cache.load(pth)
+        assert '"emacs"' in out and '"vim"' not in out, "Stale cached description"
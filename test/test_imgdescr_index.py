@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from typing import Any
+from berry_mill.imgdescr import ApplianceDescription
+from berry_mill.imgdescr.index import ElementIndex
+import lxml.etree as ET
+
+
+class TestImgDescr_ElementIndex:
+    """
+    Unit tests suite for the element index
+    """
+
+    def setup_method(self, m):
+        """
+        Setup test method
+        """
+        with open("test/descr/test_appliance.xml") as x_files:
+            self.dom = ET.fromstring(x_files.read().encode("utf-8"))
+        self.idx = ElementIndex(self.dom)
+
+    def teardown_method(self, m):
+        """
+        Teardown test results from a method
+        """
+        del self.idx
+        del self.dom
+
+    def test_index_find_all_same_as_static(self):
+        """
+        Index lookup should match recursive lookup
+        """
+        for tag in ["package", "packages", "repository", "user", "type", "profile"]:
+            assert set(self.idx.find_all(tag)) == set(ApplianceDescription.find_all(tag, self.dom)), f"Mismatch on {tag}"
+
+    def test_index_find_all_attrs(self):
+        """
+        Index lookup by precise attributes
+        """
+        out: list[ET.Element] = self.idx.find_all("packages", {"type": "oem"})
+        assert len(out) == 1, "Only one OEM packages aggregate expected"
+        assert out == ApplianceDescription.find_all("packages", self.dom, {"type": "oem"}), "Lookup mismatch"
+
+    def test_index_find_all_no_root(self):
+        """
+        Root element is not indexed
+        """
+        assert self.idx.find_all("image") == [], "Root element should not be found"
+
+    def test_index_find_any(self):
+        """
+        Lookup by partial attributes
+        """
+        attrs: dict[str, str] = {"components": "main multiverse restricted universe"}
+        assert self.idx.find_any("repository", attrs) == ApplianceDescription.find_any("repository", self.dom, attrs)
+        assert len(self.idx.find_any("repository", attrs)) == 3, "Three repositories expected"
+
+    def test_index_attach(self):
+        """
+        Attached elements are found
+        """
+        pkgs: ET.Element = self.idx.find_all("packages", {"type": "image"})[0]
+        pkg: ET.Element = ET.SubElement(pkgs, "package", name="humperdoo")
+        assert self.idx.match("package", {"name": "humperdoo"}) == [], "Element should not be indexed yet"
+
+        self.idx.attach(pkg)
+        assert self.idx.match("package", {"name": "humperdoo"}) == [pkg], "Humperdoo ran away"
+
+    def test_index_detach(self):
+        """
+        Detached elements are gone, including their children
+        """
+        pkgs: ET.Element = self.idx.find_all("packages", {"type": "oem"})[0]
+        size: int = len(self.idx)
+        self.idx.detach(pkgs)
+        pkgs.getparent().remove(pkgs)
+
+        assert self.idx.find_all("packages", {"type": "oem"}) == [], "Aggregate should be removed"
+        assert self.idx.match("package", {"name": "dracut-kiwi-oem-dump"}) == [], "Children should be removed"
+        assert len(self.idx) == size - 3, "Wrong amount of removed elements"
+
+    def test_index_update(self):
+        """
+        Changed attributes are re-indexed
+        """
+        user: Any = self.idx.find_all("user")[0]
+        user.set("pwdformat", "plain")
+        self.idx.update(user)
+
+        assert self.idx.match("user", dict(user.attrib)) == [user], "User should be found by new attributes"
+        assert self.idx.find_any("user", {"pwdformat": "plain"}) == {user}, "User should be found by partial attributes"
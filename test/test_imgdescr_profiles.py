@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import lxml.etree as ET
+from berry_mill.imgdescr import Loader
+from berry_mill.imgdescr.profiles import ProfileFilter
+
+
+class TestImgDescr_ProfileFilter:
+    """
+    Unit tests suite for profile-pruned flattening
+    """
+
+    def _profiled(self, dom: ET.Element) -> list[str]:
+        return sorted([e.attrib["profiles"] for e in dom.iter() if "profiles" in e.attrib])
+
+    def test_profile_resolve_requires(self):
+        """
+        Required profiles are used as well
+        """
+        dom: ET.Element = ET.fromstring(
+            b'<image><profiles><profile name="a"><requires profile="b"/></profile>'
+            b'<profile name="b"><requires profile="c"/></profile><profile name="c"/><profile name="d"/></profiles></image>'
+        )
+        assert ProfileFilter("a", [dom]).profiles == {"a", "b", "c"}, "Wrong required profiles"
+
+    def test_profile_resolve_unknown(self):
+        """
+        Unknown profile does not prune anything
+        """
+        with open("test/descr/test_appliance.xml", "rb") as fr:
+            dom: ET.Element = ET.fromstring(fr.read())
+        assert ProfileFilter("Spam", [dom]).prune(dom) == 0, "Nothing should be pruned"
+
+    def test_profile_loader_pruned(self):
+        """
+        Only sections of the selected profile are left
+        """
+        dom: ET.Element = ET.fromstring(Loader(profile="Virtual").load("test/descr/test_appliance.xml").encode("utf-8"))
+
+        assert self._profiled(dom) == ["Virtual"], "Only Virtual profile sections should stay"
+        assert len(dom.findall("preferences")) == 2, "Common preferences should stay"
+        assert len(dom.xpath("//profile")) == 3, "Profile declarations should stay"
+
+    def test_profile_loader_derived(self, tmp_dir):
+        """
+        Derived descriptions do not bring sections of other profiles back
+        """
+        pth: str = os.path.join(tmp_dir, "derived.xml")
+        with open(pth, "w") as fw:
+            fw.write(
+                '<image schemaversion="6.8" name="derived"><inherit path="test/descr/test_appliance.xml"/>'
+                '<add><preferences profiles="Live"><type image="iso" flags="overlay" hybridpersistent_filesystem="ext4" '
+                'hybridpersistent="true" firmware="efi"><size>42</size></type></preferences>'
+                '<packages type="image" profiles="Virtual"><package name="humperdoo"/></packages></add></image>'
+            )
+
+        dom: ET.Element = ET.fromstring(Loader(profile="Virtual").load(pth).encode("utf-8"))
+        assert self._profiled(dom) == ["Virtual", "Virtual"], "Only Virtual profile sections should stay"
+        assert dom.xpath("//package[@name='humperdoo']"), "Humperdoo should be added"
+        assert not dom.xpath("//size"), "Live profile section should not come back"
+
+    def test_profile_loader_set(self, tmp_dir):
+        """
+        Profiles changed by the set op are taken into account
+        """
+        pth: str = os.path.join(tmp_dir, "derived.xml")
+        with open(pth, "w") as fw:
+            fw.write(
+                '<image schemaversion="6.8" name="derived"><inherit path="test/descr/test_appliance.xml"/>'
+                "<set xpath=\"//preferences[@profiles='Live']\">profiles: Virtual</set></image>"
+            )
+
+        dom: ET.Element = ET.fromstring(Loader(profile="Virtual").load(pth).encode("utf-8"))
+        assert self._profiled(dom) == ["Virtual", "Virtual"], "Live section should become Virtual"
+
+    def test_profile_loader_memoized(self, tmp_dir):
+        """
+        Memoized levels pruned for one chain are not reused by a chain requiring more profiles
+        """
+        with open(os.path.join(tmp_dir, "base.xml"), "w") as fw:
+            fw.write(
+                '<image schemaversion="6.8" name="base"><profiles><profile name="P" description="P"/>'
+                '<profile name="Q" description="Q"/></profiles>'
+                '<packages type="image" profiles="P"><package name="p-pkg"/></packages>'
+                '<packages type="image" profiles="Q"><package name="q-pkg"/></packages></image>'
+            )
+        with open(os.path.join(tmp_dir, "a.xml"), "w") as fw:
+            fw.write('<image schemaversion="6.8" name="a"><inherit path="base.xml"/></image>')
+        with open(os.path.join(tmp_dir, "b.xml"), "w") as fw:
+            fw.write(
+                '<image schemaversion="6.8" name="b"><inherit path="base.xml"/>'
+                '<add><profile name="P"><requires profile="Q"/></profile></add></image>'
+            )
+
+        b: str = os.path.join(tmp_dir, "b.xml")
+        single: str = Loader(profile="P").load(b)
+        ldr: Loader = Loader(memoize=True, profile="P")
+        assert "q-pkg" not in ldr.load(os.path.join(tmp_dir, "a.xml")), "Q packages should be pruned for a.xml"
+        assert ldr.load(b) == single, "Memoized loader should flatten b.xml the same way"
+        assert "q-pkg" in single, "Q packages are required by b.xml"
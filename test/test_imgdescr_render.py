@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import unittest.mock
+import lxml.etree as ET
+from berry_mill.imgdescr import Loader, Renderer, RenderResult
+
+
+class TestImgDescr_Renderer:
+    """
+    Unit tests suite for batch rendering
+    """
+
+    chain: list[str] = ["test/descr/chain_a.xml", "test/descr/chain_b.xml", "test/descr/chain_c.xml", "test/descr/chain_d.xml"]
+
+    def test_memoized_loader_output(self):
+        """
+        Memoizing loader should render the same as the plain one
+        """
+        ldr: Loader = Loader(memoize=True)
+        for pth in self.chain + ["test/descr/appliance_add_packages.xml"] + list(reversed(self.chain)):
+            assert ldr.load(pth) == Loader().load(pth), f"Rendering mismatch of {pth}"
+
+    def test_memoized_loader_state(self):
+        """
+        Memoizing loader should keep the state of the last load
+        """
+        ldr: Loader = Loader(memoize=True)
+        ldr.load("test/descr/chain_d.xml")
+        ldr.load("test/descr/test_appliance.xml")
+
+        assert not ldr.is_derived, "Base appliance is not derived"
+        assert ldr.chain == ["test/descr/test_appliance.xml"], "Wrong chain"
+
+    def test_memoized_loader_single_parse(self):
+        """
+        Shared bases are parsed only once
+        """
+        with unittest.mock.patch.object(ET, "fromstring", wraps=ET.fromstring) as fromstring:
+            ldr: Loader = Loader(memoize=True)
+            for pth in self.chain:
+                ldr.load(pth)
+
+        assert fromstring.call_count == 5, "Every description should be parsed exactly once"
+
+    def test_renderer_expand(self):
+        """
+        Globs are expanded, duplicates are skipped
+        """
+        assert Renderer.expand("test/descr/chain_*.xml", "test/descr/chain_a.xml") == self.chain, "Wrong expansion"
+
+    def test_renderer_render(self, tmp_dir):
+        """
+        All descriptions are rendered to the output directory
+        """
+        results: list[RenderResult] = Renderer("test/descr/chain_*.xml", output_dir=tmp_dir).render()
+
+        assert [r.ok for r in results] == [True] * 4, "All descriptions should be rendered"
+        for r in results:
+            with open(r.output) as fr:
+                assert fr.read() == Loader().load(r.descr), f"Rendering mismatch of {r.descr}"
+
+    def test_renderer_render_error(self, tmp_dir):
+        """
+        Errors are collected per description
+        """
+        results: list[RenderResult] = Renderer(
+            "test/descr/chain_a.xml", "test/descr/nonexistent.xml", output_dir=tmp_dir
+        ).render()
+
+        assert results[0].ok, "First description should be rendered"
+        assert not results[1].ok and isinstance(results[1].error, IOError), "Second description should fail"
+        assert not os.path.exists(os.path.join(tmp_dir, "nonexistent.xml")), "Failed description should not be written"
+
+    def test_renderer_groups(self):
+        """
+        Descriptions are grouped by their base and split for the workers
+        """
+        r: Renderer = Renderer("test/descr/chain_*.xml", "test/descr/appliance_add_packages.xml", output_dir="")
+        assert r.get_groups() == [self.chain + ["test/descr/appliance_add_packages.xml"]], "All share the same base"
+
+        r.jobs = 2
+        assert sorted(map(len, r.get_groups())) == [2, 3], "Group should be split for two workers"
+
+    def test_renderer_render_parallel(self, tmp_dir):
+        """
+        Parallel rendering keeps the order and collects errors per description
+        """
+        results: list[RenderResult] = Renderer(
+            "test/descr/chain_*.xml", "test/descr/nonexistent.xml", output_dir=tmp_dir, jobs=3
+        ).render()
+
+        assert [r.descr for r in results] == self.chain + ["test/descr/nonexistent.xml"], "Order should be kept"
+        assert [r.ok for r in results] == [True] * 4 + [False], "Only the last description should fail"
+        for r in results[:-1]:
+            with open(r.output) as fr:
+                assert fr.read() == Loader().load(r.descr), f"Rendering mismatch of {r.descr}"
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import io
+import xml.dom.minidom
+import lxml.etree as ET
+import pytest
+from berry_mill.imgdescr import ApplianceDescription, Loader
+from berry_mill.imgdescr.serializer import PrettySerializer
+
+
+def minidom_pretty(node: ET.Element) -> str:
+    """
+    Reference pretty-printer, used by the earlier versions
+    """
+    out = []
+    for l in (
+        xml.dom.minidom.parseString(ET.tostring(node, encoding="utf-8").decode("utf-8")).toprettyxml(indent="  ").split("\n")
+    ):
+        if l.strip():
+            out.append(l.rstrip())
+    return "\n".join(out)
+
+
+class TestImgDescr_PrettySerializer:
+    """
+    Unit tests suite for pretty serializer
+    """
+
+    @pytest.mark.parametrize(
+        "pth",
+        [
+            "test/descr/test_appliance.xml",
+            "test/descr/appliance_add_packages.xml",
+            "test/descr/chain_d.xml",
+        ],
+    )
+    def test_serializer_same_as_minidom(self, pth: str):
+        """
+        Output should be byte-identical to minidom pretty-printing
+        """
+        dom: ET.Element = ET.fromstring(Loader().load(pth).encode("utf-8"))
+        assert ApplianceDescription(dom).to_str() == minidom_pretty(dom), "Output mismatch"
+
+    @pytest.mark.parametrize(
+        "xml",
+        [
+            '<a x="1&amp;2 &lt;&gt; &quot;q&quot;" y="&#10;t&#9;ab"><b>text &amp; more</b><!-- c1 --><?pi data?>tail <c/>mid</a>',
+            "<a><d>  </d><e>\n   multi\n   line  \n</e>    </a>",
+            '<r xmlns="urn:d" xmlns:k="urn:k"><k:x k:attr="v" plain="p"><y xmlns:z="urn:z" z:q="1"/></k:x></r>',
+            "<a>only text</a>",
+            "<a>t<b/></a>",
+        ],
+    )
+    def test_serializer_markup(self, xml: str):
+        """
+        Output should be byte-identical to minidom pretty-printing on mixed content
+        """
+        dom: ET.Element = ET.fromstring(xml.encode("utf-8"))
+        out: io.StringIO = io.StringIO()
+        PrettySerializer().write(dom, out)
+
+        assert out.getvalue() == minidom_pretty(dom), "Output mismatch"
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import os
+from berry_mill.imgdescr import ApplianceDescription, FlattenStats, Loader, Renderer, RenderResult
+
+
+class TestImgDescr_Stats:
+    """
+    Unit tests suite for statistics of inheritance ops
+    """
+
+    def test_stats_ops(self):
+        """
+        Every applied op is recorded with its location and changes
+        """
+        stats: FlattenStats = FlattenStats()
+        Loader(stats=stats).load("test/descr/appliance_add_packages.xml")
+
+        assert [r.op for r in stats.records] == ["remove", "remove_any", "add", "merge", "replace", "set"]
+        assert set([r.level for r in stats.records]) == {"test/descr/appliance_add_packages.xml"}
+        assert [r.line for r in stats.records] == [11, 30, 36, 53, 62, 68]
+
+        ops = {r.op: r for r in stats.records}
+        assert ops["remove"].removed == 1 + 1 + 2, "One package and the whole aggregate with its package"
+        assert ops["add"].added == 1 + 2 + 1, "One package, a new aggregate with its package and a comment"
+        assert ops["merge"].added == 1 + 1, "Only license is merged, with the comment next to it"
+        assert ops["set"].changed == 1
+        assert not stats.get_noop()
+
+    def test_stats_noop(self):
+        """
+        Ops, which do not change anything, are reported
+        """
+        stats: FlattenStats = FlattenStats()
+        ApplianceDescription(
+            "<image><remove><package name='nonexistent'/></remove><add><packages type='image'/></add>"
+            "<add><packages type='image'><package name='mc'/></packages></add></image>",
+            "<image><packages type='image'><package name='vim'/></packages></image>",
+            stats=stats,
+        )
+
+        assert [r.op for r in stats.get_noop()] == ["remove", "add"]
+        assert [r.visited for r in stats.records] == [0, 1, 1]
+        assert stats.records[-1].added == 1
+
+    def test_stats_disabled(self):
+        """
+        Nothing is recorded by default
+        """
+        ldr: Loader = Loader()
+        ldr.load("test/descr/appliance_add_packages.xml")
+        assert ldr.stats is None
+
+    def test_stats_report(self):
+        """
+        Report lists all ops, slowest first
+        """
+        stats: FlattenStats = FlattenStats()
+        Loader(stats=stats).load("test/descr/chain_d.xml")
+        report: list[str] = stats.report().split("\n")
+
+        assert len(report) == len(stats.records) + 2
+        assert "test/descr/chain_c.xml:5" in report[1]
+        assert report[-1].startswith("1 ops in 1 levels")
+        assert FlattenStats().report() == "No inheritance ops were applied"
+
+    def test_stats_renderer(self, tmp_dir):
+        """
+        Each rendered description has statistics of its own ops,
+        also when rendered in worker processes
+        """
+        for jobs in [1, 2]:
+            results: list[RenderResult] = Renderer(
+                "test/descr/chain_a.xml",
+                "test/descr/appliance_add_packages.xml",
+                output_dir=os.path.join(tmp_dir, str(jobs)),
+                jobs=jobs,
+                stats=True,
+            ).render()
+            assert [len(r.stats.records) for r in results] == [0, 6]
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+import time
+import threading
+import unittest.mock
+import lxml.etree as ET
+from berry_mill.imgdescr import Loader, Renderer
+from berry_mill.imgdescr.watch import ChangeWatcher
+
+DERIVED: str = """<?xml version="1.0" encoding="utf-8"?>
+<image schemaversion="6.8" name="Ubuntu-22.04_appliance">
+    <inherit path="test/descr/chain_c.xml"/>
+    <add>
+        <packages type="image">
+            <package name="{}"/>
+        </packages>
+    </add>
+</image>
+"""
+
+
+def _wait_for(cond, timeout: float = 5.0) -> bool:
+    start: float = time.monotonic()
+    while not cond():
+        if time.monotonic() - start > timeout:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestImgDescr_Watch:
+    """
+    Unit tests suite for incremental re-rendering
+    """
+
+    def test_loader_invalidate(self, tmp_dir):
+        """
+        Only the changed description is parsed again, its unchanged bases are reused
+        """
+        pth: str = os.path.join(tmp_dir, "derived.xml")
+        with open(pth, "w") as fw:
+            fw.write(DERIVED.format("vim"))
+
+        ldr: Loader = Loader(memoize=True)
+        assert "vim" in ldr.load(pth)
+
+        with open(pth, "w") as fw:
+            fw.write(DERIVED.format("emacs"))
+        ldr.invalidate(pth)
+
+        with unittest.mock.patch.object(ET, "fromstring", wraps=ET.fromstring) as fromstring:
+            out: str = ldr.load(pth)
+            assert fromstring.call_count == 1, "Bases should not be parsed again"
+
+        assert "emacs" in out and "vim" not in out
+        assert out == Loader().load(pth), "Incremental rendering mismatch"
+
+    def test_loader_invalidate_base(self):
+        """
+        Change of a base drops all flattened levels above it
+        """
+        ldr: Loader = Loader(memoize=True)
+        ldr.load("test/descr/chain_d.xml")
+        ldr.invalidate("test/descr/chain_b.xml")
+
+        with unittest.mock.patch.object(ET, "fromstring", wraps=ET.fromstring) as fromstring:
+            out: str = ldr.load("test/descr/chain_d.xml")
+            assert fromstring.call_count == 1, "Only the changed base should be parsed again"
+
+        assert out == Loader().load("test/descr/chain_d.xml"), "Incremental rendering mismatch"
+
+    def test_watcher(self, tmp_dir):
+        """
+        Watcher reports saved files, also those replaced by rename
+        """
+        pth: str = os.path.join(tmp_dir, "derived.xml")
+        with open(pth, "w") as fw:
+            fw.write("")
+
+        w: ChangeWatcher = ChangeWatcher()
+        try:
+            w.watch(pth)
+            assert w.wait(0.05) == set()
+
+            with open(pth + ".new", "w") as fw:
+                fw.write("changed")
+            os.replace(pth + ".new", pth)
+            assert w.wait(5) == {os.path.abspath(pth)}
+        finally:
+            w.close()
+
+    def test_renderer_watch(self, tmp_dir):
+        """
+        Saved description is rendered again
+        """
+        pth: str = os.path.join(tmp_dir, "derived.xml")
+        out: str = os.path.join(tmp_dir, "out", "derived.xml")
+        with open(pth, "w") as fw:
+            fw.write(DERIVED.format("vim"))
+
+        stop: threading.Event = threading.Event()
+        t: threading.Thread = threading.Thread(
+            target=Renderer(pth, output_dir=os.path.join(tmp_dir, "out")).watch, kwargs={"stop": stop, "timeout": 0.05}
+        )
+        t.start()
+        try:
+            assert _wait_for(lambda: os.path.exists(out))
+            with open(out) as fr:
+                assert "vim" in fr.read()
+
+            time.sleep(0.1)
+            with open(pth, "w") as fw:
+                fw.write(DERIVED.format("emacs"))
+
+            def _rendered() -> bool:
+                with open(out) as fr:
+                    return "emacs" in fr.read()
+
+            assert _wait_for(_rendered), "Description was not rendered again"
+        finally:
+            stop.set()
+            t.join()
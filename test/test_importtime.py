@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import sys
+import subprocess
+import pytest
+
+SRC: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+BUDGET: float = float(os.environ.get("BERRYMILL_IMPORT_BUDGET", "200"))  # ms
+MARK: str = "--- berrymill entry point ---"
+
+# Modules, which are needed only by some subcommands
+HEAVY: list[str] = ["kiwi_boxed_plugin", "requests", "inquirer", "berry_mill.plugins."]
+
+ENTRY_POINTS: dict[str, tuple[str, list[str]]] = {
+    "import": ("import berry_mill", HEAVY + ["lxml", "kiwi"]),
+    "help": (
+        "import sys, berry_mill\nsys.argv = ['berrymill', '--help']\ntry:\n    berry_mill.main()\nexcept SystemExit:\n    pass",
+        HEAVY + ["lxml"],
+    ),
+    "imgdescr": ("import berry_mill.imgdescr", HEAVY + ["kiwi"]),
+    "local": ("import berry_mill.builder", HEAVY),
+    "plugin": ("import berry_mill.plugins.overlay", ["kiwi_boxed_plugin", "requests", "inquirer", "lxml"]),
+}
+
+
+def get_imports(code: str) -> list[tuple[str, float]]:
+    """
+    Run the code with "-X importtime" in a fresh interpreter.
+    Returns top-level imports of the code with their cumulative time in ms.
+    """
+    env: dict[str, str] = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([SRC] + [p for p in [env.get("PYTHONPATH")] if p])
+    err: str = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys\nsys.stderr.write({MARK!r} + '\\n')\n{code}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        text=True,
+        check=True,
+    ).stderr
+    assert MARK in err, err
+
+    out: list[tuple[str, float]] = []
+    for line in err.split(MARK, 1)[1].splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            out.append((name[1:].rstrip(), int(cumulative) / 1000))
+    return out
+
+
+class TestImportTime:
+    """
+    Import-time budget of the CLI entry points
+    """
+
+    @pytest.mark.parametrize("name", ENTRY_POINTS)
+    def test_import_budget(self, name: str):
+        """
+        Entry point does not import what it does not need and stays within the budget
+        """
+        code, denied = ENTRY_POINTS[name]
+        imports: list[tuple[str, float]] = get_imports(code)
+        assert imports, "No imports were measured"
+
+        modules: list[str] = [m.strip() for m, _ in imports]
+        for d in denied:
+            assert not [m for m in modules if m == d or m.startswith(d if d.endswith(".") else d + ".")], (
+                f"Entry point '{name}' imports {d}"
+            )
+
+        top: list[tuple[str, float]] = sorted([i for i in imports if not i[0].startswith(" ")], key=lambda i: i[1], reverse=True)
+        total: float = sum([t for _, t in top])
+        assert total <= BUDGET, "Entry point '{}' takes {:.1f} ms to import, budget is {:.1f} ms, slowest: {}".format(
+            name, total, BUDGET, ", ".join(["{} {:.1f} ms".format(m, t) for m, t in top[:5]])
+        )
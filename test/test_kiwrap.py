@@ -4,6 +4,8 @@ import unittest.mock
 import pytest
 from pytest import LogCaptureFixture
 from berry_mill.kiwrap import KiwiParent
+from berry_mill.imgdescr.rendered import RenderedDescription
+from lxml import etree
 import requests
 
 log = kiwi.logging.getLogger('kiwi')
@@ -236,3 +238,18 @@ class TestCollectionKiwiParent:
         key_test_paths: list = ["wrong/path", None]
         for key in key_test_paths:
             assert not KiwiParent("test/descr/test_appliance.xml", profile="Virtual" )._verify_gpg_key(key), "Result should be false"
+
+    def test_kiwrap_rendered_descr_is_not_parsed_again(self):
+        """
+        Test: KiwiParent is constructed with an already rendered description
+        Expected: its tree is used as is, the file is never parsed
+        """
+        dom = etree.parse("test/descr/test_appliance.xml").getroot()
+        descr: RenderedDescription = RenderedDescription("test/descr/test_appliance.xml", dom=dom)
+        with unittest.mock.patch("lxml.etree.parse") as mock_parse:
+            KiwiParent_instance: KiwiParent = KiwiParent(descr, profile="Virtual")
+            mock_parse.assert_not_called()
+
+        assert KiwiParent_instance._descr.dom is dom
+        assert KiwiParent_instance._appliance_descr == "test/descr/test_appliance.xml"
+        assert "--kiwi-file=test/descr/test_appliance.xml" in KiwiParent_instance._kiwi_options
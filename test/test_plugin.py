@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import sys
+import argparse
+import importlib
+import unittest.mock
+import pytest
+from berry_mill import plugin
+from berry_mill.plugin import PluginManifest, PluginRegistry
+
+P_PATH: str = os.path.join(os.path.dirname(plugin.__file__), "plugins")
+PLUGINS: list[str] = sorted([p for p in os.listdir(P_PATH) if "." not in p and not p.startswith("_")])
+
+
+class TestPluginLoader:
+    """
+    Unit tests suite for manifest-driven plugin loading
+    """
+
+    def get_parser(self) -> tuple[argparse.ArgumentParser, argparse._SubParsersAction]:
+        p: argparse.ArgumentParser = argparse.ArgumentParser()
+        return p, p.add_subparsers(dest="subparser_name")
+
+    @pytest.mark.parametrize("name", PLUGINS)
+    def test_manifest(self, name: str):
+        """
+        Every internal plugin has a manifest
+        """
+        m: PluginManifest | None = PluginManifest.load(os.path.join(P_PATH, name))
+        assert m is not None, f"Plugin {name} has no manifest"
+        assert m.id and m.title
+
+    def test_cli_without_import(self):
+        """
+        CLI is constructed without importing any plugin
+        """
+        with unittest.mock.patch.object(plugin, "registry", PluginRegistry()), unittest.mock.patch.object(
+            importlib, "import_module", side_effect=AssertionError("Plugin imported")
+        ):
+            p, sp = self.get_parser()
+            plugin.plugins_loader(sp)
+            ns: argparse.Namespace = p.parse_args(["workflow", "-w", "test.conf"])
+            plugin.plugins_args(ns)
+
+            assert ns.workflow == "test.conf"
+            assert "overlay" in plugin.registry.plugins()
+            assert not [n for n in plugin.registry.plugins() if plugin.registry.is_loaded(n)]
+
+    def test_lazy_import(self):
+        """
+        Plugin is imported on the first access and gets the args
+        """
+        with unittest.mock.patch.object(plugin, "registry", PluginRegistry()):
+            p, sp = self.get_parser()
+            plugin.plugins_loader(sp)
+            ns: argparse.Namespace = p.parse_args(["overlay", "-r", "root"])
+            plugin.plugins_args(ns)
+
+            # Already imported modules are not registering again
+            with unittest.mock.patch.dict(sys.modules):
+                for m in [m for m in list(sys.modules) if m.startswith("berry_mill.plugins.overlay")]:
+                    del sys.modules[m]
+                with unittest.mock.patch.object(importlib, "import_module", wraps=importlib.import_module) as imp:
+                    ovl = plugin.registry["overlay"]
+                imp.assert_called_once_with("berry_mill.plugins.overlay")
+
+            assert ovl is not None and plugin.registry.is_loaded("overlay")
+            assert not plugin.registry.is_loaded("workflow")
+            assert ovl.args.dir == "root"
+
+    @pytest.mark.parametrize("name", ["bogusplugin", "cve", "overlay", "sbom", "workflow"])
+    def test_manifest_matches_plugin(self, name: str):
+        """
+        Plugin gets its title and arguments from the manifest
+        """
+        m: PluginManifest | None = PluginManifest.load(os.path.join(P_PATH, name), "berry_mill.plugins." + name)
+        assert m is not None
+
+        reg: PluginRegistry = PluginRegistry()
+        with unittest.mock.patch.object(plugin, "registry", reg), unittest.mock.patch.dict(sys.modules):
+            for mod in [mod for mod in list(sys.modules) if mod.startswith(m.module)]:
+                del sys.modules[mod]
+            reg.declare(m)
+            p = reg[m.id]
+
+        assert p is not None, f"Plugin {name} was not registered as {m.id}"
+        assert p.title == m.title
+        assert [(a.args, a.keywords) for a in p.argmap] == [(a.args, a.keywords) for a in m.argmap]
+
+    def test_workflow(self):
+        """
+        Workflow calls the plugins of its configuration with their arguments
+        """
+        from berry_mill.cfgh import ConfigHandler
+
+        cfg: ConfigHandler = ConfigHandler()
+        cfg._parse_config("./config/berrymill.conf.example")
+        cfg.raw_unsafe_config()["workflow"] = [{"sbom": {"args": {"output": "sbom.json"}}}, {"cve": None}]
+
+        m: PluginManifest | None = PluginManifest.load(os.path.join(P_PATH, "workflow"), "berry_mill.plugins.workflow")
+        assert m is not None
+        reg: PluginRegistry = PluginRegistry()
+        with unittest.mock.patch.object(plugin, "registry", reg), unittest.mock.patch.dict(sys.modules):
+            for mod in [mod for mod in list(sys.modules) if mod.startswith(m.module)]:
+                del sys.modules[mod]
+            reg.declare(m)
+            wf = reg["workflow"]
+            assert wf is not None
+            wf.args = argparse.Namespace(workflow=None)
+            with unittest.mock.patch.object(reg, "call") as call:
+                wf.run(cfg)
+
+        assert call.call_args_list == [
+            unittest.mock.call(cfg, "sbom", output="sbom.json"),
+            unittest.mock.call(cfg, "cve"),
+        ]
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+import pstats
+from berry_mill.profiling import PhaseProfiler
+from berry_mill.tracing import Tracer
+
+
+class TestPhaseProfiler:
+    """
+    Unit tests suite for profiling of the build phases
+    """
+
+    def test_phases(self, tmp_dir: str):
+        """
+        Each major phase gets its CPU profile and allocations report, nested ones are a part of it
+        """
+        tracer: Tracer = Tracer()
+        tracer.enable()
+        tracer.hooks.append(PhaseProfiler(tmp_dir).phase)
+
+        held: list[list[int]] = []
+        with tracer.span("config.load"):
+            with tracer.span("plugin overlay"):
+                with tracer.span("mount", image="test.raw"):
+                    held.append(list(range(10000)))
+            with tracer.span("kiwi.system.build"):
+                pass
+
+        assert sorted(os.listdir(tmp_dir)) == [
+            "001-plugin_overlay.alloc.txt",
+            "001-plugin_overlay.prof",
+            "002-kiwi.system.build.alloc.txt",
+            "002-kiwi.system.build.prof",
+        ]
+        assert pstats.Stats(os.path.join(tmp_dir, "001-plugin_overlay.prof")).total_calls > 0
+        with open(os.path.join(tmp_dir, "001-plugin_overlay.alloc.txt")) as fr:
+            report: str = fr.read()
+        assert "Phase: plugin overlay" in report and "test_profiling.py" in report
+
+    def test_is_phase(self, tmp_dir: str):
+        profiler: PhaseProfiler = PhaseProfiler(tmp_dir)
+        assert profiler.is_phase("render") and profiler.is_phase("mount.flush") and profiler.is_phase("plugin.load")
+        assert not profiler.is_phase("repo.add") and not profiler.is_phase("mountpoint")
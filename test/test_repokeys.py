@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import os
+import threading
+import unittest.mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+import pytest
+from berry_mill.repokeys import KeyCache, RepoKeys
+
+
+@pytest.fixture(autouse=True)
+def key_cache(tmp_dir: str) -> str:
+    # Keys of the tests never get to the user's cache
+    return os.path.join(tmp_dir, "cache")
+
+
+class KeyServer(ThreadingHTTPServer):
+    """
+    Local stand-in of repositories, serving the same key on all paths
+    """
+
+    def __init__(self) -> None:
+        self.key: bytes = b"key"
+        self.requests: list[tuple[str, int]] = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler) -> None:
+                etag: str = '"{}"'.format(self.key.hex())
+                status: int = 304 if handler.headers.get("If-None-Match") == etag else 200
+                self.requests.append((handler.path, status))
+                handler.send_response(status)
+                handler.send_header("ETag", etag)
+                handler.send_header("Content-Length", str(len(self.key) if status == 200 else 0))
+                handler.end_headers()
+                if status == 200:
+                    handler.wfile.write(self.key)
+
+            def log_message(handler, *args) -> None:
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def get_url(self, path: str) -> str:
+        return "http://127.0.0.1:{}/{}".format(self.server_address[1], path)
+
+
+@pytest.fixture
+def key_server() -> Iterator[KeyServer]:
+    server: KeyServer = KeyServer()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class TestRepoKeys:
+    """
+    Unit tests suite for repository keys
+    """
+
+    def test_resolve(self):
+        """
+        Each key is downloaded once for all repositories and builds using it
+        """
+        keys: RepoKeys = RepoKeys()
+        repos: dict[str, dict[str, str]] = {
+            "main": {"url": "http://example.com/repo"},
+            "same": {"url": "http://example.com/repo"},
+            "keyed": {"url": "http://example.com/other", "key": "file:///etc/key.gpg"},
+            "components": {"url": "http://example.com/debian", "components": "main", "name": "jammy"},
+        }
+        response: unittest.mock.MagicMock = unittest.mock.MagicMock(status_code=200, content=b"key")
+        try:
+            with unittest.mock.patch("requests.Session.get", return_value=response) as get, unittest.mock.patch(
+                "berry_mill.repokeys.verify_gpg_key", return_value=True
+            ):
+                first: dict[str, dict[str, str]] = keys.resolve(repos)
+                second: dict[str, dict[str, str]] = keys.resolve(repos)
+                get.assert_called_once()
+
+            assert first == second
+            assert first["main"]["key"] == first["same"]["key"]
+            assert os.path.exists(first["main"]["key"][len("file://"):])
+            assert first["keyed"]["key"] == "file:///etc/key.gpg"
+            assert "key" not in first["components"] and "key" not in repos["main"]
+        finally:
+            keys.cleanup()
+
+    def test_resolve_failure(self):
+        """
+        Repositories without a key are skipped
+        """
+        keys: RepoKeys = RepoKeys()
+        try:
+            with unittest.mock.patch("requests.Session.get", return_value=unittest.mock.MagicMock(status_code=404)):
+                assert keys.resolve({"main": {"url": "http://example.com/repo"}}) == {}
+        finally:
+            keys.cleanup()
+
+    def test_prefetch(self):
+        """
+        Keys are downloaded concurrently over one session, with timeouts
+        """
+        keys: RepoKeys = RepoKeys(jobs=4)
+        repos: dict[str, dict[str, str]] = {f"repo{i}": {"url": f"http://example.com/repo{i}"} for i in range(4)}
+        # Serial downloads would never pass the barrier
+        barrier: threading.Barrier = threading.Barrier(4, timeout=5)
+        sessions: set[int] = set()
+
+        def get(session, url: str, **kw):
+            sessions.add(id(session))
+            assert kw["timeout"] == RepoKeys.TIMEOUT
+            barrier.wait()
+            return unittest.mock.MagicMock(status_code=200, content=url.encode("utf-8"))
+
+        try:
+            with unittest.mock.patch("requests.Session.get", get), unittest.mock.patch(
+                "berry_mill.repokeys.verify_gpg_key", return_value=True
+            ):
+                keys.prefetch(repos)
+                resolved: dict[str, dict[str, str]] = keys.resolve(repos)
+
+            assert sorted(resolved) == sorted(repos) and len(sessions) == 1
+            for name, repo in resolved.items():
+                with open(repo["key"][len("file://"):]) as fr:
+                    assert fr.read() == RepoKeys.get_url(repos[name])
+        finally:
+            keys.cleanup()
+
+    def resolve(self, repos: dict[str, dict[str, str]], **kw) -> dict[str, str]:
+        keys: RepoKeys = RepoKeys(**kw)
+        try:
+            with unittest.mock.patch("berry_mill.repokeys.verify_gpg_key", return_value=True):
+                out: dict[str, str] = {}
+                for name, repo in keys.resolve(repos).items():
+                    with open(repo["key"][len("file://"):]) as fr:
+                        out[name] = fr.read()
+                return out
+        finally:
+            keys.cleanup()
+
+    def test_revalidate(self, key_server: KeyServer):
+        """
+        Cached keys are revalidated by their ETags and downloaded only if changed
+        """
+        repos: dict[str, dict[str, str]] = {"main": {"url": key_server.get_url("repo"), "components": "/"}}
+        assert self.resolve(repos) == {"main": "key"}
+        assert self.resolve(repos) == {"main": "key"}
+        assert [s for _, s in key_server.requests] == [200, 304]
+
+        key_server.key = b"new key"
+        assert self.resolve(repos) == {"main": "new key"}
+        assert [s for _, s in key_server.requests] == [200, 304, 200]
+
+    def test_offline(self, key_server: KeyServer):
+        """
+        Offline, cached keys are taken without any requests, others are missing
+        """
+        repos: dict[str, dict[str, str]] = {"main": {"url": key_server.get_url("repo"), "components": "/"}}
+        assert self.resolve(repos, offline=True) == {}
+        assert self.resolve(repos) == {"main": "key"}
+        assert self.resolve(dict(repos, other={"url": key_server.get_url("other"), "components": "/"}), offline=True) == {
+            "main": "key"
+        }
+        assert len(key_server.requests) == 1
+
+    def test_stale_if_error(self, key_server: KeyServer):
+        """
+        Cached key is used, if it can not be revalidated
+        """
+        repos: dict[str, dict[str, str]] = {"main": {"url": key_server.get_url("repo"), "components": "/"}}
+        assert self.resolve(repos) == {"main": "key"}
+        key_server.shutdown()
+        key_server.server_close()
+        assert self.resolve(repos) == {"main": "key"}
+
+    def test_stale_if_unavailable(self, key_server: KeyServer):
+        """
+        Cached key is used, if the server does not answer with the key, e.g. being unavailable
+        """
+        repos: dict[str, dict[str, str]] = {"main": {"url": key_server.get_url("repo"), "components": "/"}}
+        assert self.resolve(repos) == {"main": "key"}
+        with unittest.mock.patch("requests.Session.get", return_value=unittest.mock.MagicMock(status_code=503)) as get:
+            assert self.resolve(repos) == {"main": "key"}
+            get.assert_called_once()
+            assert self.resolve(dict(repos, other={"url": key_server.get_url("other"), "components": "/"})) == {"main": "key"}
+
+    def test_dedupe(self, key_server: KeyServer, key_cache: str):
+        """
+        Same key of several URLs, e.g. of all architectures, is stored once
+        """
+        repos: dict[str, dict[str, str]] = {
+            arch: {"url": key_server.get_url(arch), "components": "/"} for arch in ["amd64", "arm64"]
+        }
+        assert self.resolve(repos) == {"amd64": "key", "arm64": "key"}
+
+        cache: KeyCache = KeyCache()
+        assert cache.path.startswith(key_cache)
+        assert len(os.listdir(os.path.join(cache.path, "urls"))) == 2
+        assert len(os.listdir(os.path.join(cache.path, "objects"))) == 1
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import unittest.mock
+import pytest
+from berry_mill.mill import ImageMill
+from berry_mill.tracing import Tracer, tracer
+
+
+class TestTracing:
+    """
+    Unit tests suite for tracing of the build phases
+    """
+
+    def test_disabled(self):
+        t: Tracer = Tracer()
+        with t.span("phase"):
+            pass
+        assert t.spans == []
+
+    def test_nested(self):
+        """
+        Spans are nested, failures are recorded
+        """
+        t: Tracer = Tracer()
+        t.enable()
+
+        @t.traced("inner")
+        def inner():
+            raise ValueError("broken")
+
+        with t.span("outer", image="test"):
+            with pytest.raises(ValueError):
+                inner()
+
+        assert [s.name for s in t.spans] == ["inner", "outer"]
+        inner_span, outer_span = t.spans
+        assert inner_span.parent_id == outer_span.span_id and not outer_span.parent_id
+        assert inner_span.error == "ValueError: broken"
+        assert outer_span.duration >= inner_span.duration
+
+        events: list[dict] = t.to_chrome()["traceEvents"]
+        assert [(e["name"], e["ph"]) for e in events] == [("outer", "X"), ("inner", "X")]
+        assert events[0]["args"] == {"image": "test"} and events[1]["args"]["error"] == "ValueError: broken"
+
+        spans: list[dict] = t.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [s["status"]["code"] for s in spans] == [1, 2]
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"] and len(spans[0]["traceId"]) == 32
+        assert int(spans[0]["endTimeUnixNano"]) >= int(spans[1]["endTimeUnixNano"])
+
+    @pytest.mark.parametrize("fmt", ["chrome", "otlp"])
+    def test_cli(self, fmt: str, tmp_dir: str):
+        """
+        Trace of the subcommand is written on --trace
+        """
+        pth: str = tmp_dir
+        out: str = os.path.join(pth, "trace.json")
+        argv: list[str] = ["berrymill", "--trace", out, "--trace-format", fmt, "render", "test/descr/test_appliance.xml"]
+        try:
+            with unittest.mock.patch.object(sys, "argv", argv + ["-o", os.path.join(pth, "out")]):
+                mill: ImageMill = ImageMill()
+                mill.run()
+
+            with open(out) as fr:
+                trace: dict = json.load(fr)
+            if fmt == "chrome":
+                assert "berrymill render" in [e["name"] for e in trace["traceEvents"]]
+            else:
+                assert "berrymill render" in [s["name"] for s in trace["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+        finally:
+            tracer.enable(False)
+            tracer.reset()
@@ -1,6 +1,7 @@
 from berry_mill.imgdescr.loader import Loader
 from berry_mill.imgdescr.descr import ApplianceDescription
 import lxml.etree as ET
+import unittest.mock
 
 class TestLoaderTraversal:
     """
@@ -56,3 +57,12 @@ class TestLoaderTraversal:
         assert len(lusers) == 1, "Only one luser expected"
         assert "password" in lusers[0].attrib, "Luser should have a password"
         assert lusers[0].attrib["password"] == "lainooks :-)", "Password mismatch"
+
+    def test_loader_flatten_single_parse(self):
+        """
+        Each description in the chain is parsed only once
+        """
+        with unittest.mock.patch.object(ET, "fromstring", wraps=ET.fromstring) as fromstring:
+            Loader().load("test/descr/chain_d.xml")
+
+        assert fromstring.call_count == 5, "Every description should be parsed exactly once"